@@ -8,6 +8,29 @@
 #version 1.00
 
 #DONE
+# added a survey subcommand, python SonarCoverage.py survey -i "*.xtf", which prints the sonar, channels, nav units, ping count, time span and extents of each file from an index of its packets and a sample of its pings, in parallel, so bad files are found before a batch run
+# added -workers to process many files with an asyncio driver.  Up to -concurrency files have their header and first block read ahead while a process pool computes them, so the latency of slow storage overlaps
+# added -prefetch to read each XTF file ahead in large blocks on a background thread while the pings are decoded, and to move the saved shape files into the output folder in the background
+# the point layer has numeric FILEID, PINGNUM, TIME, ALTITUDE and HEADING fields, and the XTF file names are saved once in a _pt_files lookup table, so the dbf is about 10 times smaller
+# added -npy to save the corrected track of every ping as typed columns in .npy files, with a lookup of the file ids, which numpy can load or memory map
+# added -format gpkg to save the points, polygons, track lines and holidays as layers of a single GeoPackage, with batched inserts and an R-tree index, instead of shape files
+# added -engine utm to compute the polygons of geographic files by projecting the track into its UTM zone, offsetting in the plane and unprojecting the vertices, instead of two vincenty calls per ping
+# the CRS comes from the XTF file header (NavUnits, ProjectionType, SpheroidType) or -epsg, positions are converted with a built in UTM/MGA projection, and the .prj files match
+# the loops which form in the offset lines on tight turns are removed before the nadir and coverage polygons are saved, so they do not bow tie.  -norepair turns it off
+# added -smoothaltitude to smooth the altitude before computing the gap, and -splitpings / -splitdistance so short runs of invalid gaps do not split the nadir polygon
+# added a navigation QC stage which rejects fixes faster than -maxspeed, interpolates duplicate fixes and removes altitude spikes with a rolling median.  -noqc turns it off
+# added a course made good heading, smoothed over -cmgdistance metres with duplicate fixes removed, used wherever the gyro heading is zero or invalid
+# added -heading to use the heading from attitude packets, interpolated onto the ping times, in the polygon geometry
+# pings are read with the pyXTF packet dispatcher, so attitude, notes and other packets interleaved with the pings are skipped
+# replaced the per ping console printing with a time based progress reporter (-progress console, log or none) showing MB read and an ETA
+# added -metrics to write per file and per stage timers and counters as JSON lines, and -profile to run under cProfile
+# added -holidays to find the areas missed within the survey boundary (-boundary shape file, or the convex hull of the coverage) from the coverage grid, saved as polygons with their area
+# added -grid to rasterise the swath and nadir footprints into a coverage count grid, saved as an ASCII grid or GeoTIFF
+# added -dissolve to union the nadir and coverage polygons from all files into a single multipart polygon using a grid accelerated polygon union
+# restructured as a pipeline of stages (points, nadir, coverage, -t track line, -s statistics) which are all computed from a single read of each XTF file
+# added -c to compute swath coverage polygons from the port and starboard channel ranges.  Nadir and coverage are computed from a single read of the XTF file
+# added -gap and -minimumgap to select a nadir gap model (linear factor, altitude band table or slant range) which is evaluated across the whole file in one call
+# added -cache to store the results of each XTF file on disk, so unchanged files are merged from the cache rather than recomputed
 # tried to update teh readme file
 # added -odix to control the output folder
 # create a WGS84 prj file.  Good for ArcMap, but not always correct if we have an east/north XTF FileExistsError
@@ -24,35 +47,37 @@
 
 import math
 import argparse
+import asyncio
+import concurrent.futures
+import array
 import sys
 import shapefile
 import csv
 import pyXTF
 import geodetic
 import os
+import queue
+import shutil
+import tempfile
+import threading
 from glob import glob
 # from pyproj import Proj, transform
 import time
-
-def calcGap(altitude):
-    return (altitude * 0.70) / 2.0
-    
-def isValidGap(altitude, gap):
-    MINIMUMGAP = 50
-    if gap < MINIMUMGAP:
-        return False
-    return True
-
-# from: http://mathforum.org/library/drmath/view/62034.html
-def calculateRangeBearingFromPosition(easting1, northing1, easting2, northing2):
-    """given 2 east, north, pairs, compute the range and bearing"""
-
-    dx = easting2-easting1
-    dy = northing2-northing1
-
-    bearing = 90 - (180/math.pi)*math.atan2(northing2-northing1, easting2-easting1)
-    return (math.sqrt((dx*dx)+(dy*dy)), bearing)
-
+import xtfcache
+import gapmodel
+import dissolve
+import coveragegrid
+import metrics
+import progress
+import heading
+import navqc
+import polyrepair
+import crs
+import geopackage
+import npyfile
+import survey
+import cProfile
+import pstats
 
 # taken frm http://gis.stackexchange.com/questions/76077/how-to-create-points-based-on-the-distance-and-bearing-from-a-survey-point
 def calculatePositionFromRangeBearing(easting, northing, distance, bearing):
@@ -79,13 +104,49 @@ def calculatePositionFromRangeBearing(easting, northing, distance, bearing):
 
 def main():
 
+    if len(sys.argv) > 1 and sys.argv[1] == 'survey':
+        survey.main(sys.argv[2:])
+        return
+
     start_time = time.time() # time the process
     parser = argparse.ArgumentParser(description='Read XTF file and create either a coverage or Nadir gap polygon.')
-    # parser.add_argument('-c', action='store_true', default=False, dest='createCoveragePolygon', help='-c compute a polygon across the entire sonar region, ie COVERAGE')
+    parser.add_argument('-c', action='store_true', default=False, dest='createCoveragePolygon', help='-c compute a polygon across the entire sonar region, ie COVERAGE')
     parser.add_argument('-n', action='store_true', default=False, dest='createNadirPolygon', help='-n compute a polygon across the NADIR region')
+    parser.add_argument('-t', action='store_true', default=False, dest='createTrackLine', help='-t compute a polyline of the sensor track')
+    parser.add_argument('-s', action='store_true', default=False, dest='createStatistics', help='-s compute statistics for each file and save them to a csv file')
+    parser.add_argument('-dissolve', action='store_true', default=False, dest='dissolve', help='-dissolve union the nadir and coverage polygons from all files into a single multipart polygon, saved with a d suffix, eg _pgd')
+    parser.add_argument('-grid', dest='gridCellSize', action='store', type=float, help='-grid <metres> rasterise the coverage into a grid of this cell size, counting how many times each cell was covered outside the nadir gap.  Implies -n and -c')
+    parser.add_argument('-gridformat', dest='gridFormat', action='store', default='asc', choices=['asc', 'tif'], help='-gridformat <asc|tif> save the grid as an ESRI ASCII grid or GeoTIFF [default = asc]')
+    parser.add_argument('-holidays', action='store_true', default=False, dest='findHolidays', help='-holidays find the holidays, areas inside the survey boundary with no usable coverage, and save them as polygons with their area.  Requires -grid')
+    parser.add_argument('-boundary', dest='boundaryFile', action='store', help='-boundary <filename> polygon shape file of the survey boundary used by -holidays [default = convex hull of the coverage]')
+    parser.add_argument('-minholiday', dest='minimumHoliday', action='store', type=float, default=0.0, help='-minholiday <square metres> holidays smaller than this area are ignored [default = 0]')
+    parser.add_argument('-heading', dest='headingSource', action='store', default='attitude', choices=['sensor', 'attitude'], help='-heading <sensor|attitude> use the ping SensorHeading, or the heading from attitude packets interpolated onto the ping times where the file has them [default = attitude]')
+    parser.add_argument('-cmgdistance', dest='cmgDistance', action='store', type=float, default=heading.CMGDISTANCE, help='-cmgdistance <metres> distance along the track used to smooth the course made good, which replaces headings which are zero or invalid [default = 20]')
+    parser.add_argument('-maxspeed', dest='maximumSpeed', action='store', type=float, default=navqc.MAXIMUMSPEED, help='-maxspeed <metres/second> fixes implying a faster speed than this are rejected [default = 10]')
+    parser.add_argument('-noqc', action='store_true', default=False, dest='noQC', help='-noqc do not check the navigation and altitude before computing the products')
+    parser.add_argument('-engine', dest='engine', action='store', default='vincenty', choices=['vincenty', 'utm'], help='-engine <vincenty|utm> compute the polygon sides of geographic files with vincenty on the ellipsoid, or by projecting the track into its UTM zone, offsetting in the plane and unprojecting, which is faster [default = vincenty]')
+    parser.add_argument('-norepair', action='store_true', default=False, dest='noRepair', help='-norepair do not remove the loops which form in the polygon sides on tight turns')
+    parser.add_argument('-epsg', dest='epsg', action='store', type=int, help='-epsg <code> coordinate reference system of the output.  Positions are converted into it, eg 4326 for WGS84 or 32755 for UTM zone 55 south [default = from the XTF file header]')
+    parser.add_argument('-format', dest='outputFormat', action='store', default='shp', choices=['shp', 'gpkg'], help='-format <shp|gpkg> save the vector products as shape files, or as layers of a single GeoPackage, which has no 2 GB limit [default = shp]')
+    parser.add_argument('-npy', action='store_true', default=False, dest='createTrackArrays', help='-npy save the ping number, time, position, altitude, heading and file id of every ping as columns of .npy files in a _track folder, which numpy can load or memory map')
+    parser.add_argument('-nopoints', action='store_true', default=False, dest='noPoints', help='-nopoints do not create the shape file of ping positions')
     parser.add_argument('-i', dest='inputFile', action='store', help='-i <filename> input sonar XTF filename')
     parser.add_argument('-o', dest='outputFile', action='store', help='-o <filename> output shape filename. Do not provide file extension. It will be added for you  [default = Nadir_pg]')
     parser.add_argument('-odix', dest='outputFolder', action='store', help='-odix <folder> output folder to store shape files.  If not specified, the files will be alongside the input XTF file')
+    parser.add_argument('-gap', dest='gapModel', action='store', help='-gap <model> nadir gap model.  linear:<factor> gap = altitude * factor / 2, table:<csvfile> factor from a csv table of altitude,factor bands, slant:<factor> gap = slant range * factor, 0.10 if no factor is given  [default = linear:0.70]')
+    parser.add_argument('-minimumgap', dest='minimumGap', action='store', type=float, default=gapmodel.MINIMUMGAP, help='-minimumgap <metres> gaps smaller than this are not valid and the polygon is split [default = 50]')
+    parser.add_argument('-smoothaltitude', dest='smoothAltitude', action='store', type=int, default=1, help='-smoothaltitude <pings> smooth the altitude with a moving average over this many pings before computing the gap [default = 1, no smoothing]')
+    parser.add_argument('-splitpings', dest='splitPings', action='store', type=int, default=1, help='-splitpings <pings> only split the nadir polygon when the gap stays below the minimum for this many pings [default = 1]')
+    parser.add_argument('-splitdistance', dest='splitDistance', action='store', type=float, default=0.0, help='-splitdistance <metres> only split the nadir polygon when the gap stays below the minimum for this distance along the track [default = 0]')
+    parser.add_argument('-prefetch', action='store_true', default=False, dest='prefetch', help='-prefetch read each XTF file ahead in 4 MB blocks on a background thread, and copy the shape files to the output folder in the background.  Helps on network shares')
+    parser.add_argument('-workers', dest='workers', action='store', type=int, default=0, help='-workers <count> compute the files in this many worker processes, with an asyncio driver which opens and reads ahead the next files while the workers compute [default = 0, one file at a time]')
+    parser.add_argument('-concurrency', dest='concurrency', action='store', type=int, default=8, help='-concurrency <count> files in flight at once with -workers, being opened, read ahead or computed [default = 8]')
+    parser.add_argument('-cache', dest='cacheFolder', action='store', help='-cache <folder> folder to cache the results of each XTF file.  Unchanged files are merged from the cache instead of being recomputed')
+    parser.add_argument('-progress', dest='progress', action='store', default='console', choices=['console', 'log', 'none'], help='-progress <console|log|none> report reading progress to the console, the python logging module, or not at all [default = console]')
+    parser.add_argument('-progressinterval', dest='progressInterval', action='store', type=float, default=progress.INTERVAL, help='-progressinterval <seconds> time between progress reports [default = 5]')
+    parser.add_argument('-metrics', dest='metricsFile', action='store', help='-metrics <filename> write timers and counters for each file and stage as JSON lines.  Use - for the console')
+    parser.add_argument('-profile', '--profile', action='store_true', default=False, dest='profile', help='-profile run under cProfile, print the slowest functions and save the statistics alongside the output, eg _profile.prof')
+    parser.add_argument('-cachesize', dest='cacheSize', action='store', type=int, default=1024, help='-cachesize <MB> maximum size of the cache folder before the least recently used results are evicted [default = 1024]')
     
     if len(sys.argv)==1:
         parser.print_help()
@@ -93,70 +154,226 @@ def main():
     
     args = parser.parse_args()
    
+    if not args.createNadirPolygon and not args.createCoveragePolygon and not args.createTrackLine and not args.createStatistics and not args.createTrackArrays and args.gridCellSize is None:
+        print ("Please select an option.  Try '-n' to compute nadir gaps, '-c' to compute coverage, '-t' for the track line, '-s' for statistics or '-npy' for the track arrays")
+        exit (0)
+
+    if args.findHolidays and args.gridCellSize is None:
+        print ("Holidays are found from the coverage grid.  Please select a grid cell size with '-grid'")
+        exit (0)
+
     if args.outputFolder == None:
         firstFile = glob(args.inputFile)[0]
         args.outputFolder = os.path.abspath(os.path.join(firstFile, os.pardir))
 
-    shp_pt = shapefile.Writer(shapefile.POINT)
-    # for every record there must be a corresponding geometry.
-    shp_pt.autoBalance = 1
-    shp_pt.field('XTFFile', 'C', 255)
-    shp_pt.field('ALTITUDE', 'C',255)
-    
-    shp_pg = shapefile.Writer(shapefile.POLYGON)
-    shp_pg.autBalance = 1 #ensures gemoetry and attributes match
-    shp_pg.field('XTFFile', 'C', 255)
+    if args.outputFile is None:
+        baseName = os.path.basename(os.path.splitext(glob(args.inputFile)[0])[0])
+        outputName = os.path.join(args.outputFolder, baseName)
+    else:
+        outputName = args.outputFile
 
-    for filename in glob(args.inputFile):
-        if args.createNadirPolygon:       
-            computeNadir(filename, shp_pt, shp_pg)
-        else:
-            print ("option not yet implemented!.  Try '-n' to compute nadir gaps")
+    try:
+        gapModel = gapmodel.createGapModel(args.gapModel, args.minimumGap)
+    except (ValueError, OSError) as e:
+        print (e)
+        exit (0)
+
+    # messages go to the console, the python logging module or nowhere, as the user chose
+    reporter = progress.createProgress(args.progress, args.progressInterval)
+
+    # every output file shares one CRS, from the user or the first XTF file
+    if args.epsg is not None:
+        try:
+            outputCRS = crs.fromEPSG(args.epsg)
+        except ValueError as e:
+            print (e)
             exit (0)
+    else:
+        outputCRS = crs.fromXTFFile(glob(args.inputFile)[0])
+    reporter.message("Coordinate reference system: %s" % (outputCRS))
 
-    if args.outputFile is None:
-        baseName = os.path.basename(os.path.splitext(glob(args.inputFile)[0])[0])
-        pointFile = os.path.join(args.outputFolder, baseName + "_pt")
-        # pointFile = args.outputFolder + baseName + "_pt"
-        polyFile = os.path.join(args.outputFolder, baseName + "_pg")
-        # polyFile = baseName + "_pg"
+    profiler = None
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    # build the pipeline of products requested by the user.  Each file is read once, and every stage is computed from that read
+    stages = []
+    # stages which correct the track come first, so every product uses the corrected track
+    if not args.noQC:
+        stages.append(NavigationQCStage(args.maximumSpeed))
+    if args.headingSource == 'attitude':
+        stages.append(HeadingStage())
+    stages.append(CourseMadeGoodStage(args.cmgDistance))
+    if not args.noPoints:
+        stages.append(PointStage())
+    if args.createNadirPolygon or args.gridCellSize is not None:
+        stages.append(NadirStage(gapModel, args.dissolve, args.smoothAltitude, args.splitPings, args.splitDistance, not args.noRepair, args.engine))
+    if args.createCoveragePolygon or args.gridCellSize is not None:
+        stages.append(CoverageStage(args.dissolve, not args.noRepair, args.engine))
+    if args.gridCellSize is not None:
+        holidays = None
+        if args.findHolidays:
+            holidays = HolidayFinder(args.boundaryFile, args.minimumHoliday)
+        stages.append(GridStage(args.gridCellSize, args.gridFormat, findStage(stages, 'nadir'), findStage(stages, 'coverage'), holidays))
+    if args.createTrackArrays:
+        stages.append(TrackArrayStage())
+    if args.createTrackLine:
+        stages.append(TrackLineStage())
+    if args.createStatistics:
+        stages.append(StatisticsStage())
+
+    cache = None
+    if args.cacheFolder is not None:
+        cache = xtfcache.XTFCache(args.cacheFolder, args.cacheSize)
+
+    if args.metricsFile is None:
+        recorder = metrics.NullMetrics()
     else:
-        pointFile = args.outputFile + "_pt"
-        polyFile = args.outputFile + "_pg"
+        recorder = metrics.Metrics(args.metricsFile)
 
-    print("saving shapefile...")
-    #Save shapefiles
-    if len(shp_pt.shapes()) > 0:
-        shp_pt.save(pointFile)
+    if args.workers > 0:
+        asyncio.run(processFilesAsync(glob(args.inputFile), stages, cache, recorder, reporter, outputCRS, args.prefetch, args.workers, args.concurrency))
     else:
-        print ("Nothing to save in points shape file")
-    if len(shp_pg.shapes()) > 0:
-        shp_pg.save(polyFile)
-        print("save complete.")
+        for filename in glob(args.inputFile):
+            processFile(filename, stages, cache, recorder, reporter, outputCRS, args.prefetch)
+
+    if args.outputFormat == 'gpkg':
+        output = GeoPackageOutput(outputName, outputCRS)
     else:
-        print ("Nothing to save in polygon shape file")
+        output = ShapefileOutput(outputCRS, args.prefetch)
+    reporter.message("saving shapefile...")
+    for stage in stages:
+        saveStart = time.perf_counter()
+        stage.save(outputName, output)
+        recorder.save(stage.name, time.perf_counter() - saveStart)
+    output.close()
+    reporter.message("save complete.")
+    recorder.close()
 
-    # now write out the prj file of spatial reference, so we can open in ArcMap
-    prj = open(polyFile + ".prj", "w")
-    prj.write('GEOGCS["GCS_WGS_1984",DATUM["D_WGS_1984",SPHEROID["WGS_1984",6378137.0,298.257223563]],PRIMEM["Greenwich",0.0],UNIT["Degree",0.0174532925199433]]')
-    # epsg = getWKT_PRJ("4326")
-    # prj.write(epsg)
-    prj.close() 
-    prj = open(pointFile + ".prj", "w")
-    prj.write('GEOGCS["GCS_WGS_1984",DATUM["D_WGS_1984",SPHEROID["WGS_1984",6378137.0,298.257223563]],PRIMEM["Greenwich",0.0],UNIT["Degree",0.0174532925199433]]')
-    # epsg = getWKT_PRJ("4326")
-    # prj.write(epsg)
-    prj.close() 
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(outputName + "_profile.prof")
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
     
-    print("--- %s seconds ---" % (time.time() - start_time)) # print the processing time.
+    reporter.message("--- %s seconds ---" % (time.time() - start_time)) # report the processing time.
 
     return (0)
 
-def savePolygon(leftSide, rightSide, shp_pg, shp_pt, fileName):
+def saveShapefile(shp, fileName, description, outputCRS=crs.WGS84):
+    """save the shapefile if there is anything in it, and write a prj file of the spatial reference alongside it so we can open in ArcMap"""
+    if len(shp.shapes()) == 0:
+        progress.message("Nothing to save in %s shape file" % (description))
+        return
+    shp.save(fileName)
+    writePRJ(fileName + ".prj", outputCRS)
+
+def writePRJ(fileName, outputCRS=crs.WGS84):
+    # now write out the prj file of spatial reference, so we can open in ArcMap
+    wkt = outputCRS.wkt()
+    if wkt is None:
+        progress.message("The projection is unknown, so no prj file is written.  Use -epsg to set it")
+        return
+    prj = open(fileName, "w")
+    prj.write(wkt)
+    prj.close() 
+
+class ShapefileOutput:
+    """save each layer as a shape file, with a prj file alongside.  If background is set, the files are saved to a local folder and moved to the output folder by a background thread"""
+    def __init__(self, outputCRS=crs.WGS84, background=False):
+        self.crs = outputCRS
+        self.writer = None
+        if background:
+            self.writer = BackgroundWriter()
+
+    def write(self, shp, fileName, description):
+        if self.writer is None:
+            saveShapefile(shp, fileName, description, self.crs)
+            return
+        localName = self.writer.localName(fileName)
+        saveShapefile(shp, localName, description, self.crs)
+        self.writer.move(localName, fileName, [".shp", ".shx", ".dbf", ".prj"])
+
+    def writeTable(self, shp, fileName, description):
+        """save the records of a shape file, which has no geometry, as a dbf"""
+        if self.writer is None:
+            shp.saveDbf(fileName)
+            return
+        localName = self.writer.localName(fileName)
+        shp.saveDbf(localName)
+        self.writer.move(localName, fileName, [".dbf"])
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+class BackgroundWriter:
+    """move saved files from a local temporary folder to the output folder on a background thread, so a slow network share does not hold up the next save"""
+    def __init__(self, depth=pyXTF.PREFETCHDEPTH):
+        self.folder = tempfile.mkdtemp(prefix="SonarCoverage")
+        self.queue = queue.Queue(depth)
+        self.errors = []
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def localName(self, fileName):
+        return os.path.join(self.folder, os.path.basename(fileName))
+
+    def move(self, localName, fileName, extensions):
+        self.queue.put((localName, fileName, extensions))
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            localName, fileName, extensions = item
+            for extension in extensions:
+                if os.path.exists(localName + extension):
+                    try:
+                        shutil.move(localName + extension, fileName + extension)
+                    except (OSError, shutil.Error) as e:
+                        self.errors.append(e)
+
+    def close(self):
+        """wait for the files to be moved"""
+        self.queue.put(None)
+        self.thread.join()
+        shutil.rmtree(self.folder, ignore_errors=True)
+        for e in self.errors:
+            print ("Failed to save in the background: %s" % (e))
+
+class GeoPackageOutput:
+    """save every layer as a table of a single GeoPackage, named after the shape file it replaces, eg geo2_pt"""
+    def __init__(self, outputName, outputCRS=crs.WGS84):
+        self.crs = outputCRS
+        self.fileName = outputName + ".gpkg"
+        self.package = geopackage.GeoPackage(self.fileName, outputCRS)
+
+    def write(self, shp, fileName, description):
+        if len(shp.shapes()) == 0:
+            progress.message("Nothing to save in %s layer" % (description))
+            return
+        self.package.addLayer(os.path.basename(fileName), shp.shapeType, shp.fields, shp.shapes(), shp.records, description)
+
+    def writeTable(self, shp, fileName, description):
+        self.package.addTable(os.path.basename(fileName), shp.fields, shp.records, description)
+
+    def close(self):
+        self.package.close()
+        progress.message("GeoPackage saved: %s" % (self.fileName))
+
+SHAPEFILES = ShapefileOutput()
+
+def savePolygon(leftSide, rightSide, polygons, maximumLoopSize=None):
     
-    #now build the outline polygon and store to shapefile
+    # remove the loops on the inside of tight turns before the sides are joined
+    if maximumLoopSize is not None:
+        polyrepair.repairLine(leftSide, maximumLoopSize)
+        polyrepair.repairLine(rightSide, maximumLoopSize)
+
+    #now build the outline polygon and store it in the list of polygons for this file
     outline = []
-    print("merging polygon vertices...")
     for pt in leftSide:
         outline.append(pt)
     rightSide.reverse()
@@ -165,94 +382,733 @@ def savePolygon(leftSide, rightSide, shp_pg, shp_pt, fileName):
         
     # print("creating geometry...")
     if len(outline) > 2:    
-        shp_pg.poly(parts=[outline]) #write the geometry
-        shp_pg.record(fileName)              
+        polygons.append(outline)
         leftSide.clear()
         rightSide.clear()
     # else:
         # print("oops, no geometry!!")
-def computeNadir(filename, shp_pt, shp_pg):
 
-    leftSide = [] #storage for the left side of the nadir polygon
-    rightSide = [] #storage for the left side of the nadir polygon.  This will be added to teh right side to close the polygon
-    prevEast = 0 
+def findStage(stages, name):
+    for stage in stages:
+        if stage.name == name:
+            return stage
+    return None
+
+def processFile(filename, stages, cache=None, recorder=None, reporter=None, outputCRS=None, prefetch=False):
+    """read an XTF file once and compute every stage in the pipeline from that read, then merge the results into each stage's output. If a cache is provided, unchanged files are merged from the cache rather than recomputed.  Positions are converted to outputCRS if it is given.  If prefetch is set, the file is read ahead on a background thread"""
+    if recorder is None:
+        recorder = metrics.NullMetrics()
+    if reporter is None:
+        reporter = progress.NullProgress()
+    recorder.startFile(filename)
+
+    params = stageParameters(stages, outputCRS)
+    results = None
+    if cache is not None:
+        results = cache.load(filename, params)
+        if results is not None:
+            reporter.message("Merging from cache: %s" % (filename))
+    cached = results is not None
+    if results is None:
+        try:
+            results = computeFile(filename, stages, recorder, reporter, outputCRS, prefetch)
+        except crs.CRSError as e:
+            reporter.message("Skipping %s: %s" % (filename, e))
+            return
+        if cache is not None:
+            cache.save(filename, params, results)
+    mergeResults(filename, stages, results, recorder, cached)
+
+def stageParameters(stages, outputCRS=None):
+    """the parameters which control the computation. If any of these change, cached results are no longer valid"""
+    params = {'crs': None if outputCRS is None else outputCRS.name}
+    for stage in stages:
+        params[stage.name] = stage.parameters()
+    return params
+
+def computeFile(filename, stages, recorder, reporter, outputCRS=None, prefetch=False):
+    """read an XTF file and compute every stage from the track.  Returns the results of each stage, keyed by the stage name"""
+    with recorder.timer('read'):
+        track = readTrack(filename, reporter, outputCRS, prefetch)
+    results = {'pings': len(track['eastings'])}
+    for stage in stages:
+        with recorder.timer('compute', stage.name):
+            results[stage.name] = stage.compute(track, filename)
+    return results
+
+def mergeResults(filename, stages, results, recorder, cached):
+    """merge the results of a file into each stage's output, in the order of the stages"""
+    for stage in stages:
+        with recorder.timer('merge', stage.name):
+            stage.merge(results[stage.name], filename)
+        recorder.count(stage.name, stage.counters(results[stage.name], results['pings']))
+    recorder.endFile(results['pings'], cached)
+
+# the stages of a worker process, set once when the process starts so they are not sent with every file
+WORKERSTAGES = []
+
+def initialiseWorker(stages):
+    WORKERSTAGES[:] = stages
+
+def computeInWorker(filename, outputCRS, prefetch):
+    """compute a file in a worker process.  Returns the results, the timers and the seconds it took"""
+    start = time.perf_counter()
+    recorder = metrics.Metrics(None)
+    recorder.startFile(filename)
+    results = computeFile(filename, WORKERSTAGES, recorder, progress.NullProgress(), outputCRS, prefetch)
+    return results, recorder.record, time.perf_counter() - start
+
+def readAhead(filename):
+    """open a file and read its header and first block, so they are in the operating system cache by the time a worker reads the file.  Returns the bytes read"""
+    with open(filename, 'rb') as f:
+        return len(f.read(pyXTF.PREFETCHBLOCKSIZE))
+
+async def processFilesAsync(filenames, stages, cache=None, recorder=None, reporter=None, outputCRS=None, prefetch=False, workers=4, concurrency=8):
+    """process many files with a pool of worker processes.  Up to concurrency files are in flight at once: their cache lookup, open and first read run on threads,
+    so the latency of slow storage overlaps rather than adding up, while the workers compute.  The results are merged in the order of the files, so the output
+    is the same as processing them one at a time"""
+    if recorder is None:
+        recorder = metrics.NullMetrics()
+    if reporter is None:
+        reporter = progress.NullProgress()
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    params = stageParameters(stages, outputCRS)
+
+    with concurrent.futures.ThreadPoolExecutor(max(concurrency, 1)) as threads, concurrent.futures.ProcessPoolExecutor(workers, initializer=initialiseWorker, initargs=(stages,)) as processes:
+        async def prepare(filename):
+            async with semaphore:
+                if cache is not None:
+                    results = await loop.run_in_executor(threads, cache.load, filename, params)
+                    if results is not None:
+                        return results, None, 0.0
+                await loop.run_in_executor(threads, readAhead, filename)
+                results, record, seconds = await loop.run_in_executor(processes, computeInWorker, filename, outputCRS, prefetch)
+                if cache is not None:
+                    await loop.run_in_executor(threads, cache.save, filename, params, results)
+                return results, record, seconds
+
+        tasks = [asyncio.ensure_future(prepare(filename)) for filename in filenames]
+        for filename, task in zip(filenames, tasks):
+            try:
+                results, record, seconds = await task
+            except crs.CRSError as e:
+                reporter.message("Skipping %s: %s" % (filename, e))
+                continue
+            recorder.startFile(filename)
+            if record is None:
+                reporter.message("Merging from cache: %s" % (filename))
+            else:
+                reporter.message("Computed %s: %d pings in %.1f seconds" % (filename, results['pings'], seconds))
+                recorder.addTimes(record, seconds)
+            mergeResults(filename, stages, results, recorder, record is None)
+
+class NavigationQCStage:
+    """remove fixes which imply an impossible speed, interpolate duplicated fixes and replace altitude spikes, before any geometry is computed"""
+    name = 'navqc'
+    def __init__(self, maximumSpeed=navqc.MAXIMUMSPEED):
+        self.maximumSpeed = maximumSpeed
+
+    def parameters(self):
+        return {'maximumSpeed': self.maximumSpeed, 'window': navqc.MEDIANWINDOW, 'threshold': navqc.SPIKETHRESHOLD, 'fraction': navqc.SPIKEFRACTION}
+
+    def compute(self, track, filename):
+        eastings = track['eastings']
+        if len(eastings) == 0:
+            return {'rejectedFixes': 0, 'interpolatedFixes': 0, 'altitudeSpikes': 0}
+        geographic = track['crs'].geographic
+        # interpolate the duplicates first, as the jump at the end of a run of duplicates looks like a speed spike
+        track['eastings'], track['northings'], interpolated = navqc.interpolateDuplicates(track['times'], eastings, track['northings'])
+        good = navqc.findSpeedSpikes(track['times'], track['eastings'], track['northings'], geographic, self.maximumSpeed)
+        rejected = good.count(False)
+        if rejected > 0:
+            for key in TRACKPINGKEYS:
+                track[key] = [value for value, keep in zip(track[key], good) if keep]
+        track['altitudes'], spikes = navqc.findAltitudeSpikes(track['altitudes'])
+        return {'rejectedFixes': rejected, 'interpolatedFixes': interpolated, 'altitudeSpikes': spikes}
+
+    def counters(self, result, pings):
+        return result
+
+    def merge(self, result, filename):
+        return
+
+    def save(self, outputName, output=SHAPEFILES):
+        return
+
+class HeadingStage:
+    """replace the ping heading with the heading from the attitude packets, interpolated onto the ping times.  Pings outside the attitude records keep their own heading"""
+    name = 'heading'
+    def parameters(self):
+        return {'maximumGap': heading.MAXIMUMGAP}
+
+    def compute(self, track, filename):
+        if len(track['attitudeTimes']) == 0:
+            return {'attitudeRecords': 0, 'interpolated': 0}
+        interpolated = heading.interpolateAngles(track['attitudeTimes'], track['attitudeHeadings'], track['times'])
+        # the attitude headings are from true north, so they are turned to grid north like the sensor headings
+        track['headings'] = [sensorHeading if attitudeHeading is None else (attitudeHeading - convergence) % 360.0 for sensorHeading, attitudeHeading, convergence in zip(track['headings'], interpolated, track['convergences'])]
+        return {'attitudeRecords': len(track['attitudeTimes']), 'interpolated': len(interpolated) - interpolated.count(None)}
+
+    def counters(self, result, pings):
+        return result
+
+    def merge(self, result, filename):
+        return
+
+    def save(self, outputName, output=SHAPEFILES):
+        return
+
+class CourseMadeGoodStage:
+    """replace headings which are zero or invalid with the smoothed course made good, computed across the whole track in one pass"""
+    name = 'cmg'
+    def __init__(self, distance=heading.CMGDISTANCE):
+        self.distance = distance
+
+    def parameters(self):
+        return {'distance': self.distance}
+
+    def compute(self, track, filename):
+        headings = track['headings']
+        invalid = [i for i, h in enumerate(headings) if not heading.isValidHeading(h)]
+        if len(invalid) == 0:
+            return {'cmgHeadings': 0}
+        cmg = heading.courseMadeGood(track['eastings'], track['northings'], track['crs'].geographic, self.distance)
+        headings = list(headings)
+        count = 0
+        for i in invalid:
+            if cmg[i] is not None:
+                headings[i] = cmg[i]
+                count += 1
+        track['headings'] = headings
+        return {'cmgHeadings': count}
+
+    def counters(self, result, pings):
+        return result
+
+    def merge(self, result, filename):
+        return
+
+    def save(self, outputName, output=SHAPEFILES):
+        return
+
+class PointStage:
+    """ping positions, altitude and heading, for QC purposes.  The XTF file of each ping is a FILEID into a lookup table"""
+    name = 'points'
+    def __init__(self):
+        self.shp = shapefile.Writer(shapefile.POINT)
+        # for every record there must be a corresponding geometry.
+        self.shp.autoBalance = 1
+        self.shp.field('FILEID', 'N', 5)
+        self.shp.field('PINGNUM', 'N', 10)
+        self.shp.field('TIME', 'N', 14, 2) # seconds since 1970
+        self.shp.field('ALTITUDE', 'N', 10, 2)
+        self.shp.field('HEADING', 'N', 7, 2)
+        self.files = []
+
+    def parameters(self):
+        return {}
+
+    def compute(self, track, filename):
+        # the first ping is used to initialise the track.  Values are rounded to the decimals of their fields, so they fit the dbf
+        return list(zip(track['eastings'][1:], track['northings'][1:], track['pingNumbers'][1:], [None if t is None else round(t, 2) for t in track['times'][1:]],
+                        [round(a, 2) for a in track['altitudes'][1:]], [round(h, 2) for h in track['headings'][1:]]))
+
+    def counters(self, result, pings):
+        return {'points': len(result)}
+
+    def merge(self, result, filename):
+        fileId = len(self.files)
+        self.files.append(filename)
+        for currEast, currNorth, pingNumber, pingTime, altitude, pingHeading in result:
+            self.shp.point(currEast,currNorth)
+            self.shp.record(fileId, pingNumber, pingTime, altitude, pingHeading)
+
+    def save(self, outputName, output=SHAPEFILES):
+        output.write(self.shp, outputName + "_pt", "points")
+        if len(self.shp.shapes()) > 0:
+            files = shapefile.Writer(shapefile.NULL)
+            files.field('FILEID', 'N', 5)
+            files.field('XTFFile', 'C', 254)
+            for fileId, filename in enumerate(self.files):
+                files.null()
+                files.record(fileId, filename)
+            output.writeTable(files, outputName + "_pt_files", "point files")
+
+class PolygonStage:
+    """base class for stages which create a polygon shape file"""
+    suffix = "_pg"
+    def __init__(self, dissolve=False, repair=True, engine='vincenty'):
+        self.dissolve = dissolve
+        self.repair = repair
+        self.engine = engine
+        self.shp = shapefile.Writer(shapefile.POLYGON)
+        self.shp.autoBalance = 1 #ensures geometry and attributes match
+        self.shp.field('XTFFile', 'C', 255)
+
+    def parameters(self):
+        return {'repair': self.repair, 'engine': self.engine}
+
+    def counters(self, result, pings):
+        # each ping adds a vertex to both sides of a polygon, so any pings not in a polygon were skipped
+        vertices = sum(len(outline) for outline in result)
+        return {'polygons': len(result), 'vertices': vertices, 'skippedPings': pings - (vertices // 2)}
+
+    def merge(self, result, filename):
+        for outline in result:
+            self.shp.poly(parts=[[list(pt) for pt in outline]]) #write a copy, as pyshp closes the ring and pads the points in place, which would change the counters
+            self.shp.record(filename)              
+
+    def save(self, outputName, output=SHAPEFILES):
+        output.write(self.shp, outputName + self.suffix, self.name)
+        if self.dissolve and len(self.shp.shapes()) > 0:
+            self.saveDissolved(outputName + self.suffix + "d", output)
+
+    def saveDissolved(self, fileName, output=SHAPEFILES):
+        """union all the polygons from every file into a single multipart polygon"""
+        progress.message("dissolving %d %s polygons..." % (len(self.shp.shapes()), self.name))
+        rings = dissolve.dissolvePolygons([shape.points for shape in self.shp.shapes()])
+        shp = shapefile.Writer(shapefile.POLYGON)
+        shp.autoBalance = 1 #ensures geometry and attributes match
+        shp.field('FILES', 'N', 10)
+        if len(rings) > 0:
+            shp.poly(parts=rings)
+            shp.record(len(set(record[0] for record in self.shp.records)))
+        output.write(shp, fileName, "dissolved " + self.name)
+
+class NadirStage(PolygonStage):
+    """nadir gap polygons, using the gap model to define the width of the gap"""
+    name = 'nadir'
+    suffix = "_pg"
+    def __init__(self, gapModel, dissolve=False, smoothing=1, splitPings=1, splitDistance=0.0, repair=True, engine='vincenty'):
+        PolygonStage.__init__(self, dissolve, repair, engine)
+        self.gapModel = gapModel
+        self.smoothing = smoothing
+        self.splitPings = splitPings
+        self.splitDistance = splitDistance
+
+    def parameters(self):
+        return {'gapModel': self.gapModel.describe(), 'smoothing': self.smoothing, 'splitPings': self.splitPings, 'splitDistance': self.splitDistance, 'repair': self.repair, 'engine': self.engine}
+
+    def compute(self, track, filename):
+        # compute the range based on the user requesting either coverage polygons or nadir gap polygins
+        altitudes = gapmodel.smoothAltitudes(track['altitudes'], self.smoothing)
+        gaps = self.gapModel.gaps(altitudes, track['slantRanges'])
+        along = None
+        if self.splitDistance > 0 and len(track['eastings']) > 0:
+            along = navqc.alongTrack(track['eastings'], track['northings'], track['crs'].geographic)
+        valid = gapmodel.applyHysteresis(self.gapModel.isValid(gaps), along, self.splitPings, self.splitDistance)
+        return computeOutline(track, gaps, gaps, valid, self.repair, self.engine)
+
+class CoverageStage(PolygonStage):
+    """swath coverage polygons, using the port and starboard ranges of the sonar"""
+    name = 'coverage'
+    suffix = "_cv"
+    def compute(self, track, filename):
+        portRanges, starboardRanges, validRanges = calcCoverageRanges(track)
+        return computeOutline(track, portRanges, starboardRanges, validRanges, self.repair, self.engine)
+
+class GridStage:
+    """a raster grid of how many times each cell was covered by a swath outside its nadir gap.  The footprints are taken from the coverage and nadir stages at the end of the run"""
+    name = 'grid'
+    def __init__(self, cellSize, format, nadirStage, coverageStage, holidays=None):
+        self.cellSize = cellSize
+        self.format = format
+        self.nadirStage = nadirStage
+        self.coverageStage = coverageStage
+        self.holidays = holidays
+
+    def parameters(self):
+        return {}
+
+    def compute(self, track, filename):
+        return None
+
+    def counters(self, result, pings):
+        return {}
+
+    def merge(self, result, filename):
+        return
+
+    def save(self, outputName, output=SHAPEFILES):
+        swath = footprintsByFile(self.coverageStage.shp)
+        nadir = footprintsByFile(self.nadirStage.shp)
+        if len(swath) == 0:
+            progress.message("Nothing to save in coverage grid")
+            return
+
+        xs = [pt[0] for outlines in swath.values() for outline in outlines for pt in outline]
+        ys = [pt[1] for outlines in swath.values() for outline in outlines for pt in outline]
+        geographic = output.crs.geographic
+        if self.holidays is not None:
+            # the grid must cover the whole boundary, so holidays beyond the coverage are found too
+            boundary = self.holidays.boundary(swath)
+            xs.extend(pt[0] for pt in boundary)
+            ys.extend(pt[1] for pt in boundary)
+        if geographic:
+            # convert the cell size from metres to degrees at the middle of the survey
+            midLatitude = math.radians((min(ys) + max(ys)) / 2.0)
+            cellSizeX = self.cellSize / (111320.0 * math.cos(midLatitude))
+            cellSizeY = self.cellSize / 110574.0
+        else:
+            cellSizeX = self.cellSize
+            cellSizeY = self.cellSize
+
+        grid = coveragegrid.CoverageGrid(min(xs), min(ys), max(xs), max(ys), cellSizeX, cellSizeY, os.path.dirname(os.path.abspath(outputName)))
+        progress.message("rasterising coverage into a %d x %d grid..." % (grid.cols, grid.rows))
+        for filename, outlines in swath.items():
+            grid.addLine(outlines, nadir.get(filename, []))
+        if self.format == 'tif':
+            grid.saveGeoTIFF(outputName + "_grid.tif", geographic, output.crs.epsg)
+        else:
+            grid.saveASCII(outputName + "_grid.asc")
+            writePRJ(outputName + "_grid.prj", output.crs)
+        if self.holidays is not None:
+            self.holidays.save(grid, boundary, self.cellSize * self.cellSize, outputName + "_hol", output)
+        grid.close()
+
+class HolidayFinder:
+    """the holidays in the coverage grid, connected areas inside the survey boundary which have no usable coverage"""
+    def __init__(self, boundaryFile=None, minimumArea=0.0):
+        self.boundaryFile = boundaryFile
+        self.minimumArea = minimumArea
+
+    def boundary(self, swath):
+        """the outer ring of the survey boundary from the shape file, or the convex hull of all the swath footprints"""
+        if self.boundaryFile is not None:
+            shapes = shapefile.Reader(self.boundaryFile).shapes()
+            if len(shapes) > 0:
+                # use the first part of the first polygon.  Survey boundaries are a single ring
+                shape = shapes[0]
+                end = shape.parts[1] if len(shape.parts) > 1 else len(shape.points)
+                return shape.points[:end]
+            progress.message("No boundary polygon found in %s, using the convex hull of the coverage" % (self.boundaryFile))
+        return coveragegrid.convexHull([pt for outlines in swath.values() for outline in outlines for pt in outline])
+
+    def save(self, grid, boundary, cellArea, fileName, output=SHAPEFILES):
+        progress.message("finding holidays...")
+        shp = shapefile.Writer(shapefile.POLYGON)
+        shp.autoBalance = 1 #ensures geometry and attributes match
+        shp.field('AREA', 'N', 15, 1)
+        shp.field('CELLS', 'N', 10)
+        totalArea = 0.0
+        for cellCount, rings in coveragegrid.findHolidays(grid, boundary):
+            area = cellCount * cellArea
+            if area < self.minimumArea:
+                continue
+            shp.poly(parts=rings)
+            shp.record(area, cellCount)
+            totalArea += area
+        progress.message("found %d holidays, total area %.1f square metres" % (len(shp.shapes()), totalArea))
+        output.write(shp, fileName, "holiday")
+
+def footprintsByFile(shp):
+    """the outlines of the polygons in a shape file, grouped by the XTF file which created them"""
+    result = {}
+    for shape, record in zip(shp.shapes(), shp.records):
+        # drop the closing vertex added when the polygon was written
+        result.setdefault(record[0], []).append(shape.points[:-1])
+    return result
+
+class TrackLineStage:
+    """a polyline of the sensor track, one line per file"""
+    name = 'trackline'
+    def __init__(self):
+        self.shp = shapefile.Writer(shapefile.POLYLINE)
+        self.shp.autoBalance = 1
+        self.shp.field('XTFFile', 'C', 255)
+
+    def parameters(self):
+        return {}
+
+    def compute(self, track, filename):
+        return [[east, north] for east, north in zip(track['eastings'], track['northings'])]
+
+    def counters(self, result, pings):
+        return {'vertices': len(result)}
+
+    def merge(self, result, filename):
+        if len(result) > 1:
+            self.shp.line(parts=[result])
+            self.shp.record(filename)
+
+    def save(self, outputName, output=SHAPEFILES):
+        output.write(self.shp, outputName + "_tk", "track line")
+
+class TrackArrayStage:
+    """every ping of the corrected track as typed columns, saved as .npy files with a csv lookup from the file id to the XTF file"""
+    name = 'trackarrays'
+    # column name, array typecode.  The size of each value is recorded in the .npy header
+    COLUMNS = [('pingNumber', 'I'), ('time', 'd'), ('x', 'd'), ('y', 'd'), ('altitude', 'f'), ('heading', 'f'), ('fileId', 'I')]
+    def __init__(self):
+        self.columns = dict((column, array.array(typecode)) for column, typecode in self.COLUMNS)
+        self.files = []
+
+    def parameters(self):
+        return {}
+
+    def compute(self, track, filename):
+        # a missing time is NaN, so the column stays numeric
+        times = [math.nan if t is None else t for t in track['times']]
+        return {'pingNumber': track['pingNumbers'], 'time': times, 'x': track['eastings'], 'y': track['northings'], 'altitude': track['altitudes'], 'heading': track['headings']}
+
+    def counters(self, result, pings):
+        return {'pings': len(result['time'])}
+
+    def merge(self, result, filename):
+        fileId = len(self.files)
+        self.files.append(filename)
+        for column, values in result.items():
+            self.columns[column].extend(values)
+        self.columns['fileId'].extend([fileId] * len(result['time']))
+
+    def save(self, outputName, output=SHAPEFILES):
+        if len(self.columns['time']) == 0:
+            progress.message("Nothing to save in track arrays")
+            return
+        folder = outputName + "_track"
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        for column, typecode in self.COLUMNS:
+            npyfile.writeNPY(os.path.join(folder, column + ".npy"), self.columns[column])
+        with open(os.path.join(folder, "files.csv"), "w", newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['#FileId', 'XTFFile'])
+            for fileId, filename in enumerate(self.files):
+                writer.writerow([fileId, filename])
+        progress.message("saved %d pings to %s" % (len(self.columns['time']), folder))
+
+class StatisticsStage:
+    """summary statistics for each file, saved to a csv file"""
+    name = 'statistics'
+    def __init__(self):
+        self.rows = []
+
+    def parameters(self):
+        return {}
+
+    def compute(self, track, filename):
+        eastings = track['eastings']
+        northings = track['northings']
+        altitudes = track['altitudes']
+        times = track['times']
+        if len(eastings) == 0:
+            return None
+
+        # compute the track length, in metres, from either geographical or grid positions
+        length = 0.0
+        geographic = track['crs'].geographic
+        for i in range(1, len(eastings)):
+            if geographic:
+                length += geodetic.est_dist(northings[i-1], eastings[i-1], northings[i], eastings[i])
+            else:
+                length += math.hypot(eastings[i] - eastings[i-1], northings[i] - northings[i-1])
+
+        # the first and last pings with a date
+        times = [t for t in times if t is not None]
+        return {'pings': len(eastings), 'startTime': times[0] if len(times) > 0 else None, 'endTime': times[-1] if len(times) > 0 else None, 'length': length,
+                'minAltitude': min(altitudes), 'meanAltitude': sum(altitudes) / len(altitudes), 'maxAltitude': max(altitudes),
+                'minX': min(eastings), 'minY': min(northings), 'maxX': max(eastings), 'maxY': max(northings)}
+
+    def counters(self, result, pings):
+        return {}
+
+    def merge(self, result, filename):
+        if result is not None:
+            self.rows.append((filename, result))
+
+    def save(self, outputName, output=SHAPEFILES):
+        if len(self.rows) == 0:
+            progress.message("Nothing to save in statistics file")
+            return
+        columns = ['pings', 'startTime', 'endTime', 'length', 'minAltitude', 'meanAltitude', 'maxAltitude', 'minX', 'minY', 'maxX', 'maxY']
+        with open(outputName + "_st.csv", "w", newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['#XTFFile'] + columns)
+            for filename, stats in self.rows:
+                writer.writerow([filename] + [stats[column] for column in columns])
+
+# the arrays of the track with one value per ping
+TRACKPINGKEYS = ['pingNumbers', 'times', 'eastings', 'northings', 'altitudes', 'headings', 'convergences', 'slantRanges', 'portSlantRanges', 'portGroundRanges', 'starboardSlantRanges', 'starboardGroundRanges']
+
+def readTrack(filename, reporter=None, outputCRS=None, prefetch=False):
+    """decode the pings in an XTF file into arrays of time (seconds since 1970, or None if the ping has no date), position, altitude, heading and range, so products can be computed across the whole file from a single read.  Positions are converted from the CRS of the file to outputCRS, if it is given, with the headings turned to grid north, and crs.CRSError is raised if they cannot be.  If prefetch is set, the file is read ahead in blocks on a background thread while the pings are decoded"""
+    pingNumbers = []
+    times = []
+    eastings = []
+    northings = []
+    altitudes = []
+    headings = []
+    slantRanges = []
+    portSlantRanges = []
+    portGroundRanges = []
+    starboardSlantRanges = []
+    starboardGroundRanges = []
+    attitudeTimes = []
+    attitudeHeadings = []
+
+    if reporter is None:
+        reporter = progress.NullProgress()
 
     #   open the trackplot file for reading 
-    print ("Opening file:", filename)
-    r = pyXTF.XTFReader(filename)
+    r = pyXTF.XTFReader(filename, prefetch)
+    count = 0
+    nextReport = reporter.start(filename, r.fileSize)
     while r.moreData():
-        pingHdr = r.readPing()
+        # other packet types are skipped by the reader
+        pingHdr = r.readPacket(pyXTF.SONARATTITUDEPACKETS)
+        if pingHdr is None:
+            break
+        if isinstance(pingHdr, pyXTF.XTFATTITUDEDATA):
+            attitudeTime = pingHdr.time()
+            if attitudeTime is not None:
+                attitudeTimes.append(attitudeTime)
+                attitudeHeadings.append(pingHdr.Heading)
+            continue
+        pingNumbers.append(pingHdr.PingNumber)
+        # pings without a date have a time of None
+        times.append(pingHdr.time())
+        eastings.append(pingHdr.SensorXcoordinate)
+        northings.append(pingHdr.SensorYcoordinate)
+        altitudes.append(pingHdr.SensorPrimaryAltitude)
+        headings.append(pingHdr.SensorHeading)
+
+        # channel 0 is port, channel 1 is starboard.  If there is only 1 channel, use it for both sides
+        if pingHdr.NumChansToFollow > 0:
+            port = pingHdr.pingChannel[0]
+            starboard = pingHdr.pingChannel[min(1, pingHdr.NumChansToFollow - 1)]
+            slantRanges.append(port.SlantRange)
+            portSlantRanges.append(port.SlantRange)
+            portGroundRanges.append(port.GroundRange)
+            starboardSlantRanges.append(starboard.SlantRange)
+            starboardGroundRanges.append(starboard.GroundRange)
+        else:
+            slantRanges.append(0.0)
+            portSlantRanges.append(0.0)
+            portGroundRanges.append(0.0)
+            starboardSlantRanges.append(0.0)
+            starboardGroundRanges.append(0.0)
+
+        count += 1
+        if count >= nextReport:
+            nextReport = reporter.update(r.fileptr.tell(), count)
+    r.fileptr.close()
+    reporter.finish(count)
+
+    # the grid convergence of each ping, where the positions have been converted into a projection
+    convergences = [0.0] * len(eastings)
+    if len(eastings) > 0:
+        fileCRS = crs.fromXTFHeader(r.XTFFileHdr, eastings[0], northings[0])
+    else:
+        fileCRS = crs.fromXTFHeader(r.XTFFileHdr)
+    if outputCRS is None:
+        outputCRS = fileCRS
+    elif not crs.canTransform(fileCRS, outputCRS):
+        # the outputs are labelled with outputCRS, so positions which cannot be converted into it must not be merged
+        raise crs.CRSError("Positions in %s cannot be converted to %s.  Try -epsg with the projection of the XTF file" % (fileCRS, outputCRS))
+    elif fileCRS != outputCRS:
+        eastings, northings = crs.transform(fileCRS, outputCRS, eastings, northings)
+        if fileCRS.known() and not outputCRS.geographic:
+            # the headings are from true north.  The positions are now in a projection, so turn the headings to grid north, as the utm engine does
+            convergences = crs.gridConvergence(outputCRS, eastings, northings)
+            # headings of zero are missing, and are left for the course made good
+            headings = [(h - c) % 360.0 if heading.isValidHeading(h) else h for h, c in zip(headings, convergences)]
+
+    return {'crs': outputCRS, 'convergences': convergences, 'pingNumbers': pingNumbers, 'times': times, 'eastings': eastings, 'northings': northings, 'altitudes': altitudes, 'headings': headings, 'slantRanges': slantRanges,
+            'portSlantRanges': portSlantRanges, 'portGroundRanges': portGroundRanges, 'starboardSlantRanges': starboardSlantRanges, 'starboardGroundRanges': starboardGroundRanges,
+            'attitudeTimes': attitudeTimes, 'attitudeHeadings': attitudeHeadings}
+
+def calcCoverageRanges(track):
+    """compute the across track coverage on the port and starboard sides.  Use the ground range if the sonar recorded it, otherwise reduce the slant range to the seabed using the altitude"""
+    portRanges = [calcGroundRange(slantRange, groundRange, altitude) for slantRange, groundRange, altitude in zip(track['portSlantRanges'], track['portGroundRanges'], track['altitudes'])]
+    starboardRanges = [calcGroundRange(slantRange, groundRange, altitude) for slantRange, groundRange, altitude in zip(track['starboardSlantRanges'], track['starboardGroundRanges'], track['altitudes'])]
+    validRanges = [(portRange > 0) & (starboardRange > 0) for portRange, starboardRange in zip(portRanges, starboardRanges)]
+    return portRanges, starboardRanges, validRanges
+
+def calcGroundRange(slantRange, groundRange, altitude):
+    if groundRange > 0:
+        return groundRange
+    if slantRange > altitude:
+        return math.sqrt((slantRange * slantRange) - (altitude * altitude))
+    return 0.0
+
+def computeOutline(track, leftRanges, rightRanges, validRanges, repair=False, engine='vincenty'):
+    """compute the outline polygons either side of the track at the given ranges.  The polygon is split wherever the range is not valid.  If repair is set, loops in the sides are removed.
+    Geographic tracks are offset on the ellipsoid with vincenty, or if engine is utm, projected into their UTM zone, offset in the plane and the vertices unprojected"""
+    leftSide = [] #storage for the left side of the polygon
+    rightSide = [] #storage for the right side of the polygon.  This will be added to teh left side to close the polygon
+    polygons = [] #storage for the completed polygons
+
+    eastings = track['eastings']
+    northings = track['northings']
+    headings = track['headings']
+    geographic = track['crs'].geographic
+
+    projection = None
+    if geographic and engine == 'utm' and len(eastings) > 0:
+        # the heading is corrected for the grid convergence and the ranges for the scale factor, so the offsets in the plane match those on the ellipsoid
+        projection = crs.getTransverseMercator(track['crs'].datum, crs.utmZone(eastings[0]), northings[0] < 0)
+        convergences, scales = projection.convergenceScale(eastings, northings)
+        eastings, northings = projection.forward(eastings, northings)
+        headings = [h - c for h, c in zip(headings, convergences)]
+        leftRanges = [r * k for r, k in zip(leftRanges, scales)]
+        rightRanges = [r * k for r, k in zip(rightRanges, scales)]
+        geographic = False
+
+    maximumLoopSize = None
+    if repair and len(eastings) > 0:
+        # loops are no bigger than a few times the offset range.  Convert it to degrees for geographic positions
+        maximumLoopSize = max(max(leftRanges), max(rightRanges)) * polyrepair.LOOPFACTOR
+        if geographic:
+            maximumLoopSize /= 111320.0 * max(math.cos(math.radians(northings[0])), 0.01)
+
+    prevEast = 0 
+    for i in range(len(eastings)):
         if prevEast == 0:
-            prevEast = pingHdr.SensorXcoordinate
-            prevNorth = pingHdr.SensorYcoordinate
-            prevAltitude = pingHdr.SensorPrimaryAltitude
+            prevEast = eastings[i]
             continue
             
-        currEast = pingHdr.SensorXcoordinate
-        currNorth = pingHdr.SensorYcoordinate
-        currAltitude = pingHdr.SensorPrimaryAltitude
-
-        #add ping position to a shape file for QC purposes
-        shp_pt.point(currEast,currNorth)
-        shp_pt.record(filename, str(currAltitude))
- 
-        # compute the range based on the user requesting either coverage polygons or nadir gap polygins
-        currRange = calcGap(currAltitude)
+        currEast = eastings[i]
+        currNorth = northings[i]
 
-        if isValidGap(currAltitude, currRange) == False:
+        if validRanges[i] == False:
             if len(leftSide) > 2:
-                savePolygon(leftSide, rightSide, shp_pg, shp_pt, filename)
+                savePolygon(leftSide, rightSide, polygons, maximumLoopSize)
             continue
 
-        if (pingHdr.SensorXcoordinate < 180) & (pingHdr.SensorYcoordinate < 90):
+        if geographic:
             #compute with geographical data
             # rng, currBearing, backBearing = geodetic.vinc_dist(prevNorth, prevEast, currNorth, currEast )
-            currBearing = pingHdr.SensorHeading
+            currBearing = headings[i]
             # compute the left side and add to a list
-            leftSideNorthing, leftSideEasting, alpha21 = geodetic.vincentyDirect(currNorth, currEast, currBearing - 90, currRange)
+            leftSideNorthing, leftSideEasting, alpha21 = geodetic.vincentyDirect(currNorth, currEast, currBearing - 90, leftRanges[i])
             leftSide.append([leftSideEasting,leftSideNorthing])
-            # shp_pt.point(leftSideEasting,leftSideNorthing)
-            # shp_pt.record(currAltitude)
 
             # compute the right side and add to a list 
-            rightSideNorthing, rightSideEasting, alpha21 = geodetic.vincentyDirect(currNorth, currEast, currBearing + 90, currRange)
+            rightSideNorthing, rightSideEasting, alpha21 = geodetic.vincentyDirect(currNorth, currEast, currBearing + 90, rightRanges[i])
             rightSide.append([rightSideEasting,rightSideNorthing])
-            # shp_pt.point(rightSideEasting,rightSideNorthing)
-            # shp_pt.record(currAltitude)  
         else:
             # compute with grid data
-            # calculate the heading instead of using the gyro field. it is not always present! 
-            rng, currBearing = calculateRangeBearingFromPosition(prevEast, prevNorth, currEast, currNorth)
-            currBearing = pingHdr.SensorHeading
+            # the heading is the gyro, or the course made good where the gyro is not present
+            currBearing = headings[i]
             # compute the left side and add to a list
-            leftSideEasting, leftSideNorthing = calculatePositionFromRangeBearing(currEast, currNorth, currRange, currBearing - 90.0)
+            leftSideEasting, leftSideNorthing = calculatePositionFromRangeBearing(currEast, currNorth, leftRanges[i], currBearing - 90.0)
             leftSide.append([leftSideEasting,leftSideNorthing])
-            # shp_pt.point(leftSideEasting,leftSideNorthing)
-            # shp_pt.record(currAltitude)
             
             # compute the right side and add to a list
-            rightSideEasting, rightSideNorthing = calculatePositionFromRangeBearing(currEast, currNorth, currRange, currBearing + 90.0)
+            rightSideEasting, rightSideNorthing = calculatePositionFromRangeBearing(currEast, currNorth, rightRanges[i], currBearing + 90.0)
             rightSide.append([rightSideEasting,rightSideNorthing])
-            # shp_pt.point(rightSideEasting,rightSideNorthing)
-            # shp_pt.record(currAltitude)  
         
         prevEast = currEast
-        prevNorth = currNorth
-        prevAltitude = currAltitude
 
-        if pingHdr.PingNumber % 500 == 0:
-            print ("Ping: %f, X: %f, Y: %f, A: %f Range: %f Bearing %f" % (pingHdr.PingNumber, currEast, currNorth, currAltitude, currRange, currBearing))               
-    
-    print("Complete reading XTF file :-)")
+    savePolygon(leftSide, rightSide, polygons, maximumLoopSize)
 
-    savePolygon(leftSide, rightSide, shp_pg, shp_pt, filename)
+    if projection is not None:
+        for outline in polygons:
+            xs, ys = projection.inverse([pt[0] for pt in outline], [pt[1] for pt in outline])
+            outline[:] = [[x, y] for x, y in zip(xs, ys)]
 
-    # w.poly(parts=[[[1,3],[5,3]]], shapeType=shapefile.POLYLINE)
-    # w.field('FIRST_FLD','C','40')
-    # w.field('SECOND_FLD','C','40')
-    # w.record('First','Line')
-    # w.record('Second','Line')
-    # w.save('shapefiles/test/line')
+    return polygons
 
 def isHeader(row):
     for word in row:
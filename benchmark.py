@@ -0,0 +1,256 @@
+#name:          benchmark
+#created:       October 2026
+#description:   generate synthetic XTF files and time each stage of SonarCoverage on them, so performance can be tracked from run to run
+#notes:         the synthetic files have a valid file header, six channel info records, and pings with their channel headers and sample data
+#               each stage is timed on its own: decode (reading the XTF into a track), geometry (nadir and coverage outlines) and serialize (saving the shape files)
+#               on geographic files the geometry is also timed with the utm engine, and its vertices are compared against the vincenty geometry, so the accuracy is reported
+#               pings/sec and MB/s are relative to the pings and size of the XTF file, and peak memory is measured with tracemalloc, which slows the run a little
+#               typical usage:
+#               python benchmark.py -pings 20000 -channels 2 -samples 1000
+#               python benchmark.py -pings 20000 -grid -csv results.csv
+
+#DONE
+# the decode is also timed with the prefetching reader
+# added the utm geometry engine, and its accuracy against vincenty
+#initial implementation
+
+import argparse
+import contextlib
+import csv
+import io
+import math
+import os
+import shutil
+import struct
+import tempfile
+import time
+import tracemalloc
+
+import geodetic
+import gapmodel
+import pyXTF
+import SonarCoverage
+
+# record layouts, from pyXTF
+XTFFILEHDR = struct.Struct(pyXTF.XTFFileHdr_fmt)
+XTFCHANINFO = struct.Struct(pyXTF.XTFChanInfo_fmt)
+XTFPINGHEADER = struct.Struct(pyXTF.XTFPingHeader_fmt)
+XTFPINGCHANHEADER = struct.Struct(pyXTF.XTFPingChanHeader_fmt)
+XTFPACKETHEADER = struct.Struct(pyXTF.XTFPacketHeader_fmt)
+XTFATTITUDEDATA = struct.Struct(pyXTF.XTFAttitudeData_fmt)
+MAGICNUMBER = pyXTF.XTFMagicNumber
+NOTESSIZE = 256 # bytes in a notes packet
+
+def writeSyntheticXTF(fileName, pings=10000, channels=2, samples=1000, geographic=True, slantRange=150.0, notesEvery=0, attitudePerPing=0, origin=None):
+    """write a synthetic XTF file of a single survey line, with a wandering heading and an altitude which rises and falls, so the nadir polygon is split and joined along the line.  If notesEvery is set, a notes packet is written after that many pings, so the reader has to skip them.  attitudePerPing attitude packets are written between each ping.  origin is the (x, y) of the start of the line"""
+    with open(fileName, 'wb') as f:
+        header = [0] * 33
+        header[0] = 123 # FileFormat
+        header[1] = 1 # SystemType
+        header[2] = b'benchmark'
+        header[3] = b'1.00'
+        header[4] = b'SYNTHETIC'
+        header[6] = b''
+        header[7] = os.path.basename(fileName).encode('utf-8')[:64]
+        header[8] = 3 if geographic else 0 # NavUnits, 3 is latitude/longitude
+        header[9] = channels
+        # the synthetic line starts in UTM zone 55 south
+        header[18] = b'' if geographic else b'UTM 55S'
+        header[19] = b'WGS84'
+        f.write(XTFFILEHDR.pack(*header))
+        for i in range(6):
+            f.write(XTFCHANINFO.pack(i, i, 0, 0, 2, 0, ('channel%d' % (i)).encode('utf-8'), *([0.0] * 11), 0, 0, b''))
+
+        data = bytes(2 * samples)
+        recordSize = XTFPINGHEADER.size + (channels * (XTFPINGCHANHEADER.size + len(data)))
+        # start at a whole second, so the hundredths of a second are exact
+        startTime = 1451606400 # 2016-01-01
+        x = 147.0 if geographic else 500000.0
+        y = -43.0 if geographic else 5000000.0
+        if origin is not None:
+            x, y = origin
+        for i in range(pings):
+            heading = (45.0 + (30.0 * math.sin(i / 300.0))) % 360
+            step = 1.0 # metres between pings
+            if geographic:
+                y, x, az = geodetic.vincentyDirect(y, x, heading, step)
+            else:
+                x += step * math.sin(math.radians(heading))
+                y += step * math.cos(math.radians(heading))
+            altitude = 100.0 + (60.0 * math.sin(i / 50.0))
+            t = time.gmtime(startTime + (i // 2))
+            ping = [0] * 88
+            ping[0] = MAGICNUMBER
+            ping[3] = channels
+            ping[6] = recordSize
+            ping[7] = t.tm_year
+            ping[8] = t.tm_mon
+            ping[9] = t.tm_mday
+            ping[10] = t.tm_hour
+            ping[11] = t.tm_min
+            ping[12] = t.tm_sec
+            ping[13] = (i % 2) * 50 # two pings per second
+            ping[14] = t.tm_yday
+            ping[16] = i
+            ping[17] = 1500.0 # SoundVelocity
+            ping[41] = y
+            ping[42] = x
+            ping[49] = 2.0 # SensorSpeed
+            ping[51] = y
+            ping[52] = x
+            ping[60] = altitude
+            ping[64] = heading
+            f.write(XTFPINGHEADER.pack(*ping))
+            for ch in range(channels):
+                f.write(XTFPINGCHANHEADER.pack(ch, 0, slantRange, 0.0, 0.0, 0.0, 0.5, 0, 100, 0, 0, 0, 0, 0, 0, 0, samples, 0, 0.0, 0, 0, 0.0, 0, 0, 0, 0, 0))
+                f.write(data)
+            for k in range(attitudePerPing):
+                # two pings per second, so the attitude records are spread over half a second
+                fraction = k / float(attitudePerPing)
+                attitudeTime = startTime + (i * 0.5) + (fraction * 0.5)
+                a = time.gmtime(int(attitudeTime))
+                milliseconds = int(round((attitudeTime - int(attitudeTime)) * 1000))
+                attitudeHeading = (45.0 + (30.0 * math.sin((i + fraction) / 300.0))) % 360
+                f.write(XTFATTITUDEDATA.pack(MAGICNUMBER, pyXTF.XTF_HEADER_ATTITUDE, 0, 0, 0, 0, XTFATTITUDEDATA.size, 0, 0, 0, 0, 0.0, 0.0, 0.0, 0.0, 0, attitudeHeading,
+                                             a.tm_year, a.tm_mon, a.tm_mday, a.tm_hour, a.tm_min, a.tm_sec, milliseconds, 0))
+            if notesEvery > 0 and i % notesEvery == 0:
+                notes = XTFPACKETHEADER.pack(MAGICNUMBER, pyXTF.XTF_HEADER_NOTES, 0, 0, 0, 0, NOTESSIZE)
+                f.write(notes + (b'ping %d' % (i)).ljust(NOTESSIZE - len(notes), b'\x00'))
+
+class StageTimer:
+    """time a stage and measure its peak memory"""
+    def __init__(self, name, pings, fileSize):
+        self.name = name
+        self.pings = pings
+        self.fileSize = fileSize
+        self.seconds = 0.0
+        self.peakMemory = 0
+
+    def __enter__(self):
+        tracemalloc.reset_peak()
+        self.baseMemory = tracemalloc.get_traced_memory()[0]
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.seconds = time.perf_counter() - self.start
+        self.peakMemory = tracemalloc.get_traced_memory()[1] - self.baseMemory
+        return False
+
+    def row(self):
+        seconds = max(self.seconds, 1e-9)
+        return [self.name, self.pings, self.seconds, self.pings / seconds, (self.fileSize / 1048576.0) / seconds, self.peakMemory / 1048576.0]
+
+def compareOutlines(outlines, otherOutlines):
+    """the largest and mean distance in metres between the matching vertices of two sets of geographic outlines, and the number of vertices compared"""
+    largest = 0.0
+    total = 0.0
+    count = 0
+    for outline, other in zip(outlines, otherOutlines):
+        for pt, otherPt in zip(outline, other):
+            distance = math.hypot((otherPt[0] - pt[0]) * 111320.0 * math.cos(math.radians(pt[1])), (otherPt[1] - pt[1]) * 110574.0)
+            largest = max(largest, distance)
+            total += distance
+            count += 1
+    return largest, total / max(count, 1), count
+
+def benchmarkFile(fileName, outputFolder):
+    """time each stage of the processing of one XTF file.  Returns a list of rows of stage, pings, seconds, pings/sec, MB/s and peak MB, and the accuracy of the utm engine from compareOutlines, or None for grid files"""
+    fileSize = os.path.getsize(fileName)
+    stages = [SonarCoverage.NavigationQCStage(), SonarCoverage.HeadingStage(), SonarCoverage.CourseMadeGoodStage(), SonarCoverage.PointStage(), SonarCoverage.NadirStage(gapmodel.createGapModel()), SonarCoverage.CoverageStage()]
+    outputName = os.path.join(outputFolder, "benchmark")
+    rows = []
+
+    # keep the progress messages out of the results
+    with contextlib.redirect_stdout(io.StringIO()):
+        with StageTimer('decode', 0, fileSize) as timer:
+            track = SonarCoverage.readTrack(fileName)
+        pings = len(track['eastings'])
+        timer.pings = pings
+        rows.append(timer.row())
+
+        with StageTimer('decode prefetch', pings, fileSize) as timer:
+            SonarCoverage.readTrack(fileName, prefetch=True)
+        rows.append(timer.row())
+
+        with StageTimer('geometry', pings, fileSize) as timer:
+            results = [stage.compute(track, fileName) for stage in stages]
+        rows.append(timer.row())
+
+        accuracy = None
+        if track['crs'].geographic:
+            # the track has already been corrected by the stages above, so only the polygons are computed again
+            utmStages = [SonarCoverage.NadirStage(gapmodel.createGapModel(), engine='utm'), SonarCoverage.CoverageStage(engine='utm')]
+            with StageTimer('geometry utm', pings, fileSize) as timer:
+                utmResults = [stage.compute(track, fileName) for stage in utmStages]
+            rows.append(timer.row())
+            accuracy = compareOutlines([outline for result in results[-2:] for outline in result], [outline for result in utmResults for outline in result])
+
+        with StageTimer('serialize', pings, fileSize) as timer:
+            for stage, result in zip(stages, results):
+                stage.merge(result, fileName)
+            for stage in stages:
+                stage.save(outputName)
+        rows.append(timer.row())
+
+        # vincentyDirect is the inner loop of the geometry on geographic data, so time it on its own
+        with StageTimer('vincentyDirect', pings, fileSize) as timer:
+            for latitude, longitude, heading in zip(track['northings'], track['eastings'], track['headings']):
+                geodetic.vincentyDirect(latitude, longitude, heading, 100.0)
+        rows.append(timer.row())
+    return rows, accuracy
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic XTF files and time the decode, geometry and serialize stages of SonarCoverage.')
+    parser.add_argument('-pings', dest='pings', action='store', type=int, default=10000, help='-pings <count> number of pings in the synthetic file [default = 10000]')
+    parser.add_argument('-channels', dest='channels', action='store', type=int, default=2, help='-channels <count> number of sonar channels in each ping [default = 2]')
+    parser.add_argument('-samples', dest='samples', action='store', type=int, default=1000, help='-samples <count> number of samples in each channel [default = 1000]')
+    parser.add_argument('-grid', action='store_true', default=False, dest='grid', help='-grid use grid (easting, northing) coordinates rather than geographic')
+    parser.add_argument('-notes', dest='notesEvery', action='store', type=int, default=0, help='-notes <count> write a notes packet every count pings, to measure the cost of skipping other packets [default = 0, no notes]')
+    parser.add_argument('-attitude', dest='attitudePerPing', action='store', type=int, default=0, help='-attitude <count> write this many attitude packets between each ping [default = 0]')
+    parser.add_argument('-repeat', dest='repeat', action='store', type=int, default=3, help='-repeat <count> number of times to run each stage.  The fastest run is reported [default = 3]')
+    parser.add_argument('-i', dest='inputFile', action='store', help='-i <filename> benchmark an existing XTF file rather than a synthetic one')
+    parser.add_argument('-csv', dest='csvFile', action='store', help='-csv <filename> append the results to a csv file for regression tracking')
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix="benchmark")
+    try:
+        if args.inputFile is None:
+            fileName = os.path.join(folder, "synthetic.xtf")
+            writeSyntheticXTF(fileName, args.pings, args.channels, args.samples, not args.grid, notesEvery=args.notesEvery, attitudePerPing=args.attitudePerPing)
+        else:
+            fileName = args.inputFile
+
+        tracemalloc.start()
+        best = {}
+        for i in range(args.repeat):
+            rows, accuracy = benchmarkFile(fileName, folder)
+            for row in rows:
+                if row[0] not in best or row[2] < best[row[0]][2]:
+                    best[row[0]] = row
+        tracemalloc.stop()
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    description = "%d pings, %d channels, %d samples, %s" % (args.pings, args.channels, args.samples, "grid" if args.grid else "geographic")
+    if args.inputFile is not None:
+        description = args.inputFile
+    print ("benchmark: %s (best of %d)" % (description, args.repeat))
+    print ("%-16s %10s %10s %12s %10s %10s" % ("stage", "pings", "seconds", "pings/sec", "MB/s", "peak MB"))
+    for row in best.values():
+        print ("%-16s %10d %10.3f %12.0f %10.2f %10.2f" % tuple(row))
+    if accuracy is not None:
+        print ("utm engine against vincenty: largest difference %.4f m, mean %.4f m over %d vertices" % accuracy)
+
+    if args.csvFile is not None:
+        newFile = not os.path.isfile(args.csvFile)
+        with open(args.csvFile, 'a', newline='') as f:
+            writer = csv.writer(f)
+            if newFile:
+                writer.writerow(['#Date', 'Description', 'Stage', 'Pings', 'Seconds', 'PingsPerSecond', 'MBPerSecond', 'PeakMB'])
+            date = time.strftime("%Y-%m-%d %H:%M:%S")
+            for row in best.values():
+                writer.writerow([date, description] + row)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+#name:          coveragegrid
+#created:       October 2026
+#description:   rasterise swath and nadir footprints into a grid counting how many times each cell was covered, and where the nadir holes are
+#notes:         each survey line is rasterised on its own using a scanline fill of the quadrilaterals between consecutive pings, and the spans of cells are merged,
+#               so a line is only counted once in each cell, even on tight turns where its quadrilaterals overlap
+#               the grid is stored in tiles within a memory mapped temporary file, so large survey areas do not need to fit in memory
+#               counts are stored as bytes (saturating at 254), and a span of cells is incremented in one call using bytes.translate rather than a loop per cell
+#               the grid is saved as an ESRI ASCII grid (.asc) or a simple uncompressed GeoTIFF (.tif).  Cells never covered are NODATA, cells covered only by the nadir gap are 0
+#               holidays (areas missed within the survey boundary) are found by labelling the runs of uncovered cells in each row, and joining runs which overlap
+#               in consecutive rows with union find.  The outline of each holiday is traced from the edges of its runs
+
+#DONE
+#initial implementation
+
+import math
+import mmap
+import re
+import struct
+import tempfile
+import dissolve
+
+TILESIZE = 256 # cells along each side of a tile
+NODATA = 255 # byte value of cells which were never covered
+ASCIINODATA = -9999
+INCREMENT = bytes([min(i + 1, NODATA - 1) for i in range(256)]) # translation table to add 1 to every byte in a span
+NODATAMASK = bytes([NODATA] + [0] * 255) # translation table marking the cells with a swath count of zero
+
+class CoverageGrid:
+    def __init__(self, minX, minY, maxX, maxY, cellSizeX, cellSizeY=None, folder=None):
+        if cellSizeY is None:
+            cellSizeY = cellSizeX
+        self.cellSizeX = cellSizeX
+        self.cellSizeY = cellSizeY
+        self.minX = minX
+        self.maxY = maxY
+        self.cols = max(1, int(math.ceil((maxX - minX) / cellSizeX)))
+        self.rows = max(1, int(math.ceil((maxY - minY) / cellSizeY)))
+        self.minY = self.maxY - (self.rows * cellSizeY)
+        self.tilesAcross = int(math.ceil(self.cols / TILESIZE))
+        self.tilesDown = int(math.ceil(self.rows / TILESIZE))
+
+        # swath counts every line covering the cell, usable counts the lines covering the cell outside their nadir gap
+        size = self.tilesAcross * self.tilesDown * TILESIZE * TILESIZE
+        self.files = []
+        self.swath = self.createBand(size, folder)
+        self.usable = self.createBand(size, folder)
+
+    def createBand(self, size, folder):
+        """create a band of the grid in a memory mapped temporary file.  The file is sparse, so only tiles which are covered use disk space"""
+        f = tempfile.TemporaryFile(dir=folder)
+        f.truncate(size)
+        self.files.append(f)
+        return mmap.mmap(f.fileno(), size)
+
+    def close(self):
+        self.swath.close()
+        self.usable.close()
+        for f in self.files:
+            f.close()
+
+    def addLine(self, swathPolygons, nadirPolygons):
+        """add the footprint of one survey line.  Each polygon is the outline of a strip, left side followed by the right side in reverse, as built by savePolygon"""
+        swathSpans = self.rasterisePolygons(swathPolygons)
+        nadirSpans = self.rasterisePolygons(nadirPolygons)
+        for row, spans in swathSpans.items():
+            self.increment(self.swath, row, spans)
+            if row in nadirSpans:
+                spans = subtractSpans(spans, nadirSpans[row])
+            self.increment(self.usable, row, spans)
+
+    def rasterisePolygons(self, polygons):
+        """rasterise the quadrilaterals between consecutive pings of each strip.  Returns a dictionary of row: [(firstCol, lastCol)] with overlapping spans merged"""
+        rows = {}
+        for outline in polygons:
+            n = len(outline) // 2
+            for i in range(n - 1):
+                quad = (outline[i], outline[i + 1], outline[len(outline) - i - 2], outline[len(outline) - i - 1])
+                self.rasteriseRing(quad, rows)
+        for row in rows:
+            rows[row] = mergeSpans(rows[row])
+        return rows
+
+    def rasteriseRing(self, ring, rows):
+        """scanline fill of a ring, adding the spans of cells whose centres are inside the ring"""
+        ys = [pt[1] for pt in ring]
+        firstRow = max(0, int(math.ceil((self.maxY - max(ys)) / self.cellSizeY - 0.5)))
+        lastRow = min(self.rows - 1, int(math.floor((self.maxY - min(ys)) / self.cellSizeY - 0.5)))
+        for row in range(firstRow, lastRow + 1):
+            y = self.maxY - ((row + 0.5) * self.cellSizeY)
+            crossings = []
+            x0, y0 = ring[-1][0], ring[-1][1]
+            for pt in ring:
+                x1, y1 = pt[0], pt[1]
+                if (y1 > y) != (y0 > y):
+                    crossings.append(x0 + (y - y0) * (x1 - x0) / (y1 - y0))
+                x0 = x1
+                y0 = y1
+            crossings.sort()
+            for i in range(0, len(crossings) - 1, 2):
+                firstCol = max(0, int(math.ceil((crossings[i] - self.minX) / self.cellSizeX - 0.5)))
+                lastCol = min(self.cols - 1, int(math.ceil((crossings[i + 1] - self.minX) / self.cellSizeX - 0.5)) - 1)
+                if firstCol <= lastCol:
+                    if row in rows:
+                        rows[row].append((firstCol, lastCol))
+                    else:
+                        rows[row] = [(firstCol, lastCol)]
+
+    def increment(self, band, row, spans):
+        """add 1 to the cells in each span of a row.  Spans are split at tile boundaries so each piece is contiguous in the file"""
+        tileRow = row // TILESIZE
+        rowOffset = (row % TILESIZE) * TILESIZE
+        for firstCol, lastCol in spans:
+            col = firstCol
+            while col <= lastCol:
+                tileCol = col // TILESIZE
+                end = min(lastCol, (tileCol * TILESIZE) + TILESIZE - 1)
+                start = ((tileRow * self.tilesAcross + tileCol) * TILESIZE * TILESIZE) + rowOffset + (col % TILESIZE)
+                length = end - col + 1
+                band[start:start + length] = band[start:start + length].translate(INCREMENT)
+                col = end + 1
+
+    def readRow(self, band, row):
+        """read a full row of the band, gathered from each tile across the grid"""
+        tileRow = row // TILESIZE
+        rowOffset = (row % TILESIZE) * TILESIZE
+        pieces = []
+        for tileCol in range(self.tilesAcross):
+            start = ((tileRow * self.tilesAcross + tileCol) * TILESIZE * TILESIZE) + rowOffset
+            pieces.append(band[start:start + TILESIZE])
+        return b''.join(pieces)[:self.cols]
+
+    def coverageRow(self, row):
+        """the usable coverage count of each cell in the row.  Cells never covered by a swath are NODATA"""
+        swath = self.readRow(self.swath, row)
+        usable = self.readRow(self.usable, row)
+        # usable is 0 wherever swath is 0, so or'ing in the nodata mask sets just those cells
+        mask = swath.translate(NODATAMASK)
+        value = int.from_bytes(usable, 'big') | int.from_bytes(mask, 'big')
+        return value.to_bytes(len(usable), 'big')
+
+    def saveASCII(self, fileName):
+        """save the usable coverage count as an ESRI ASCII grid"""
+        labels = [str(i) for i in range(256)]
+        labels[NODATA] = str(ASCIINODATA)
+        with open(fileName, 'w') as f:
+            f.write("ncols %d\n" % (self.cols))
+            f.write("nrows %d\n" % (self.rows))
+            f.write("xllcorner %.10f\n" % (self.minX))
+            f.write("yllcorner %.10f\n" % (self.minY))
+            if self.cellSizeX == self.cellSizeY:
+                f.write("cellsize %.10f\n" % (self.cellSizeX))
+            else:
+                f.write("dx %.10f\n" % (self.cellSizeX))
+                f.write("dy %.10f\n" % (self.cellSizeY))
+            f.write("NODATA_value %d\n" % (ASCIINODATA))
+            for row in range(self.rows):
+                f.write(" ".join(map(labels.__getitem__, self.coverageRow(row))))
+                f.write("\n")
+
+    def saveGeoTIFF(self, fileName, geographic, epsg=None):
+        """save the usable coverage count as an uncompressed, single strip per row, 8 bit GeoTIFF.  epsg is the code of the CRS, if it is known"""
+        # tags must be written in ascending order
+        nodata = str(NODATA).encode('ascii') + b'\x00' # 4 bytes, so stored in the tag itself
+        if geographic:
+            geoKeys = [1, 1, 0, 3, 1024, 0, 1, 2, 1025, 0, 1, 1, 2048, 0, 1, 4326 if epsg is None else epsg] # geographic, pixel is area, WGS84 unless given
+        elif epsg is not None:
+            geoKeys = [1, 1, 0, 3, 1024, 0, 1, 1, 1025, 0, 1, 1, 3072, 0, 1, epsg] # projected, pixel is area, ProjectedCSTypeGeoKey
+        else:
+            geoKeys = [1, 1, 0, 2, 1024, 0, 1, 1, 1025, 0, 1, 1] # projected (user defined), pixel is area
+        headerSize = 8
+        ifdEntries = 15
+        ifdSize = 2 + (ifdEntries * 12) + 4
+        scaleOffset = headerSize + ifdSize
+        tiepointOffset = scaleOffset + 24
+        geoKeyOffset = tiepointOffset + 48
+        stripOffsetsOffset = geoKeyOffset + (len(geoKeys) * 2)
+        stripCountsOffset = stripOffsetsOffset + (self.rows * 4)
+        imageOffset = stripCountsOffset + (self.rows * 4)
+        stripOffsets = [imageOffset + (row * self.cols) for row in range(self.rows)]
+
+        with open(fileName, 'wb') as f:
+            f.write(b'II*\x00' + struct.pack('<L', headerSize))
+            f.write(struct.pack('<H', ifdEntries))
+            def tag(code, fieldType, count, value):
+                # values of 4 bytes or less are stored in the entry itself, larger values are an offset to the data
+                f.write(struct.pack('<HHL', code, fieldType, count))
+                if isinstance(value, bytes):
+                    f.write(value.ljust(4, b'\x00'))
+                elif fieldType == 3 and count == 1:
+                    f.write(struct.pack('<HH', value, 0))
+                else:
+                    f.write(struct.pack('<L', value))
+            tag(256, 4, 1, self.cols)                # ImageWidth
+            tag(257, 4, 1, self.rows)                # ImageLength
+            tag(258, 3, 1, 8)                        # BitsPerSample
+            tag(259, 3, 1, 1)                        # Compression = none
+            tag(262, 3, 1, 1)                        # PhotometricInterpretation = black is zero
+            tag(273, 4, self.rows, stripOffsets[0] if self.rows == 1 else stripOffsetsOffset) # StripOffsets
+            tag(277, 3, 1, 1)                        # SamplesPerPixel
+            tag(278, 4, 1, 1)                        # RowsPerStrip
+            tag(279, 4, self.rows, self.cols if self.rows == 1 else stripCountsOffset) # StripByteCounts
+            tag(284, 3, 1, 1)                        # PlanarConfiguration = contiguous
+            tag(339, 3, 1, 1)                        # SampleFormat = unsigned integer
+            tag(33550, 12, 3, scaleOffset)           # ModelPixelScaleTag
+            tag(33922, 12, 6, tiepointOffset)        # ModelTiepointTag
+            tag(34735, 3, len(geoKeys), geoKeyOffset) # GeoKeyDirectoryTag
+            tag(42113, 2, len(nodata), nodata)       # GDAL_NODATA
+            f.write(struct.pack('<L', 0))            # no more IFDs
+
+            f.write(struct.pack('<3d', self.cellSizeX, self.cellSizeY, 0.0))
+            f.write(struct.pack('<6d', 0.0, 0.0, 0.0, self.minX, self.maxY, 0.0))
+            f.write(struct.pack('<%dH' % (len(geoKeys)), *geoKeys))
+            f.write(struct.pack('<%dL' % (self.rows), *stripOffsets))
+            f.write(struct.pack('<%dL' % (self.rows), *([self.cols] * self.rows)))
+            for row in range(self.rows):
+                f.write(self.coverageRow(row))
+
+def mergeSpans(spans):
+    """merge overlapping or adjacent spans of columns"""
+    spans.sort()
+    merged = [spans[0]]
+    for first, last in spans[1:]:
+        if first <= merged[-1][1] + 1:
+            if last > merged[-1][1]:
+                merged[-1] = (merged[-1][0], last)
+        else:
+            merged.append((first, last))
+    return merged
+
+def subtractSpans(spans, holes):
+    """remove the hole spans from the merged spans"""
+    result = []
+    h = 0
+    for first, last in spans:
+        while h < len(holes) and holes[h][1] < first:
+            h += 1
+        i = h
+        while i < len(holes) and holes[i][0] <= last:
+            if holes[i][0] > first:
+                result.append((first, holes[i][0] - 1))
+            first = max(first, holes[i][1] + 1)
+            i += 1
+        if first <= last:
+            result.append((first, last))
+    return result
+
+def findHolidays(grid, boundary):
+    """find the holidays, connected regions of cells inside the boundary ring which have no usable coverage.  Returns a list of (cellCount, rings), where the rings are in world coordinates, outer rings clockwise"""
+    boundaryRows = {}
+    grid.rasteriseRing(boundary, boundaryRows)
+
+    # find the runs of uncovered cells in each row, and join runs which overlap a run in the previous row using union find
+    runRows = []
+    runFirst = []
+    runLast = []
+    parent = []
+    rowRuns = {}
+    previous = []
+    for row in range(grid.rows):
+        current = []
+        if row in boundaryRows:
+            usable = grid.readRow(grid.usable, row)
+            for firstCol, lastCol in mergeSpans(boundaryRows[row]):
+                for match in ZERORUN.finditer(usable, firstCol, lastCol + 1):
+                    run = len(runRows)
+                    runRows.append(row)
+                    runFirst.append(match.start())
+                    runLast.append(match.end() - 1)
+                    parent.append(run)
+                    current.append(run)
+        # both lists are sorted by column, so walk them together to find the overlapping runs
+        p = 0
+        for run in current:
+            while p < len(previous) and runLast[previous[p]] < runFirst[run]:
+                p += 1
+            q = p
+            while q < len(previous) and runFirst[previous[q]] <= runLast[run]:
+                union(parent, run, previous[q])
+                q += 1
+        if len(current) > 0:
+            rowRuns[row] = current
+        previous = current
+
+    components = {}
+    for run in range(len(runRows)):
+        components.setdefault(find(parent, run), []).append(run)
+
+    holidays = []
+    for runs in components.values():
+        cellCount = sum(runLast[run] - runFirst[run] + 1 for run in runs)
+        edges = []
+        for run in runs:
+            row = runRows[run]
+            first = runFirst[run]
+            last = runLast[run] + 1
+            # the edges of the run which are not shared with a run in the rows above and below.  The inside is on the left of each edge
+            for a, b in subtractSpans([(first, last - 1)], [(runFirst[r], runLast[r]) for r in rowRuns.get(row + 1, [])]):
+                edges.append(((a, row + 1), (b + 1, row + 1)))
+            edges.append(((last, row + 1), (last, row)))
+            for a, b in subtractSpans([(first, last - 1)], [(runFirst[r], runLast[r]) for r in rowRuns.get(row - 1, [])]):
+                edges.append(((b + 1, row), (a, row)))
+            edges.append(((first, row), (first, row + 1)))
+        rings = []
+        for ring in dissolve.joinPieces(edges):
+            ring = removeCollinear(ring)
+            ring.reverse()
+            rings.append([[grid.minX + (col * grid.cellSizeX), grid.maxY - (row * grid.cellSizeY)] for col, row in ring])
+        holidays.append((cellCount, rings))
+    return holidays
+
+ZERORUN = re.compile(b'\x00+')
+
+def find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+def union(parent, i, j):
+    i = find(parent, i)
+    j = find(parent, j)
+    if i != j:
+        parent[max(i, j)] = min(i, j)
+
+def removeCollinear(ring):
+    """remove vertices which lie on a straight line between their neighbours"""
+    result = []
+    n = len(ring)
+    for i in range(n):
+        x0, y0 = ring[i - 1]
+        x1, y1 = ring[i]
+        x2, y2 = ring[(i + 1) % n]
+        if (x1 - x0) * (y2 - y1) != (y1 - y0) * (x2 - x1):
+            result.append(ring[i])
+    return result
+
+def convexHull(points):
+    """the convex hull of a list of points, anticlockwise, using the monotone chain algorithm"""
+    points = sorted(set((pt[0], pt[1]) for pt in points))
+    if len(points) < 3:
+        return points
+    def cross(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+    lower = []
+    for pt in points:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], pt) <= 0:
+            lower.pop()
+        lower.append(pt)
+    upper = []
+    for pt in reversed(points):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], pt) <= 0:
+            upper.pop()
+        upper.append(pt)
+    return lower[:-1] + upper[:-1]
@@ -0,0 +1,299 @@
+#name:          crs
+#created:       October 2026
+#description:   coordinate reference systems for the XTF positions and the output files, with a dependency free transverse mercator (UTM/MGA) projection
+#notes:         the CRS of a file comes from the XTF file header.  NavUnits says if the positions are metres or latitude/longitude, and ProjectionType/SpheroidType
+#               (free text, often blank) can name the UTM or MGA zone and the datum, eg "UTM 55S" and "WGS84", or an EPSG code.  If the header is blank, the
+#               positions are tested as before, anything under 180, 90 is latitude/longitude
+#               the user can override the CRS with an EPSG code.  Positions are projected or unprojected into it, but there is no datum shift, so WGS84, GDA94
+#               and GDA2020 are treated as the same to within a couple of metres
+#               the transverse mercator is the Kruger series to n^6 (Karney 2011), which is sub millimetre within a zone.  It works on whole arrays, and the
+#               series coefficients are computed once per zone and cached
+#               each CRS writes its ESRI WKT, so the .prj files match the data
+#               the grid convergence and point scale factor let bearings and distances on the ellipsoid be used in the plane.  They use the spherical formulas, which
+#               are within a millimetre over a sonar range anywhere in a zone
+
+#DONE
+#initial implementation
+
+import cmath
+import math
+import re
+
+import progress
+import pyXTF
+
+# name, geographic WKT name, datum, spheroid, semi major axis, inverse flattening, geographic EPSG code
+DATUMS = {
+    'WGS84': ('WGS_1984', 'GCS_WGS_1984', 'D_WGS_1984', 'WGS_1984', 6378137.0, 298.257223563, 4326),
+    'GDA94': ('GDA_1994', 'GCS_GDA_1994', 'D_GDA_1994', 'GRS_1980', 6378137.0, 298.257222101, 4283),
+    'GDA2020': ('GDA2020', 'GCS_GDA2020', 'D_GDA2020', 'GRS_1980', 6378137.0, 298.257222101, 7844),
+}
+UTMSCALE = 0.9996
+UTMFALSEEASTING = 500000.0
+UTMFALSENORTHING = 10000000.0 # southern hemisphere only
+NAVUNITSMETRES = 0 # XTF file header NavUnits
+NAVUNITSLATLONG = 3
+
+class TransverseMercator:
+    """a transverse mercator projection of one ellipsoid and central meridian.  Use getTransverseMercator, which caches them"""
+    def __init__(self, semiMajor, inverseFlattening, centralMeridian, scaleFactor=UTMSCALE, falseEasting=UTMFALSEEASTING, falseNorthing=0.0):
+        f = 1.0 / inverseFlattening
+        n = f / (2.0 - f)
+        self.e = math.sqrt(f * (2.0 - f))
+        self.centralMeridian = centralMeridian
+        self.scaleFactor = scaleFactor
+        self.falseEasting = falseEasting
+        self.falseNorthing = falseNorthing
+        # the radius of the rectifying sphere, scaled
+        self.scale = scaleFactor * semiMajor / (1.0 + n) * (1.0 + (n**2 / 4.0) + (n**4 / 64.0) + (n**6 / 256.0))
+        self.alpha = [n / 2.0 - 2.0 * n**2 / 3.0 + 5.0 * n**3 / 16.0 + 41.0 * n**4 / 180.0 - 127.0 * n**5 / 288.0 + 7891.0 * n**6 / 37800.0,
+                      13.0 * n**2 / 48.0 - 3.0 * n**3 / 5.0 + 557.0 * n**4 / 1440.0 + 281.0 * n**5 / 630.0 - 1983433.0 * n**6 / 1935360.0,
+                      61.0 * n**3 / 240.0 - 103.0 * n**4 / 140.0 + 15061.0 * n**5 / 26880.0 + 167603.0 * n**6 / 181440.0,
+                      49561.0 * n**4 / 161280.0 - 179.0 * n**5 / 168.0 + 6601661.0 * n**6 / 7257600.0,
+                      34729.0 * n**5 / 80640.0 - 3418889.0 * n**6 / 1995840.0,
+                      212378941.0 * n**6 / 319334400.0]
+        self.beta = [n / 2.0 - 2.0 * n**2 / 3.0 + 37.0 * n**3 / 96.0 - n**4 / 360.0 - 81.0 * n**5 / 512.0 + 96199.0 * n**6 / 604800.0,
+                     n**2 / 48.0 + n**3 / 15.0 - 437.0 * n**4 / 1440.0 + 46.0 * n**5 / 105.0 - 1118711.0 * n**6 / 3870720.0,
+                     17.0 * n**3 / 480.0 - 37.0 * n**4 / 840.0 - 209.0 * n**5 / 4480.0 + 5569.0 * n**6 / 90720.0,
+                     4397.0 * n**4 / 161280.0 - 11.0 * n**5 / 504.0 - 830251.0 * n**6 / 7257600.0,
+                     4583.0 * n**5 / 161280.0 - 108847.0 * n**6 / 3991680.0,
+                     20648693.0 * n**6 / 638668800.0]
+
+    def forward(self, longitudes, latitudes):
+        """project arrays of longitude and latitude (degrees) to easting and northing (metres)"""
+        e = self.e
+        terms = [(2.0 * (j + 1), a) for j, a in enumerate(self.alpha)]
+        centralMeridian = self.centralMeridian
+        scale = self.scale
+        falseEasting = self.falseEasting
+        falseNorthing = self.falseNorthing
+        eastings = []
+        northings = []
+        for longitude, latitude in zip(longitudes, latitudes):
+            phi = math.radians(latitude)
+            lam = math.radians(((longitude - centralMeridian + 180.0) % 360.0) - 180.0)
+            # the conformal latitude, as a tangent
+            sinPhi = math.sin(phi)
+            tau = math.sinh(math.atanh(sinPhi) - (e * math.atanh(e * sinPhi)))
+            zeta = complex(math.atan2(tau, math.cos(lam)), math.asinh(math.sin(lam) / math.hypot(tau, math.cos(lam))))
+            result = zeta
+            for k, a in terms:
+                result += a * cmath.sin(k * zeta)
+            eastings.append(falseEasting + (scale * result.imag))
+            northings.append(falseNorthing + (scale * result.real))
+        return eastings, northings
+
+    def convergenceScale(self, longitudes, latitudes):
+        """the grid convergence (degrees, grid north from true north) and point scale factor at arrays of longitude and latitude"""
+        centralMeridian = self.centralMeridian
+        scaleFactor = self.scaleFactor
+        convergences = []
+        scales = []
+        for longitude, latitude in zip(longitudes, latitudes):
+            phi = math.radians(latitude)
+            lam = math.radians(((longitude - centralMeridian + 180.0) % 360.0) - 180.0)
+            convergences.append(math.degrees(math.atan(math.tan(lam) * math.sin(phi))))
+            b = math.cos(phi) * math.sin(lam)
+            scales.append(scaleFactor / math.sqrt(1.0 - (b * b)))
+        return convergences, scales
+
+    def inverse(self, eastings, northings):
+        """unproject arrays of easting and northing (metres) to longitude and latitude (degrees)"""
+        e = self.e
+        e2 = e * e
+        terms = [(2.0 * (j + 1), b) for j, b in enumerate(self.beta)]
+        centralMeridian = self.centralMeridian
+        scale = self.scale
+        falseEasting = self.falseEasting
+        falseNorthing = self.falseNorthing
+        longitudes = []
+        latitudes = []
+        for easting, northing in zip(eastings, northings):
+            zeta = complex((northing - falseNorthing) / scale, (easting - falseEasting) / scale)
+            result = zeta
+            for k, b in terms:
+                result -= b * cmath.sin(k * zeta)
+            xi = result.real
+            eta = result.imag
+            # the tangent of the conformal latitude, then newton iterations for the tangent of the latitude
+            tauPrime = math.sin(xi) / math.hypot(math.sinh(eta), math.cos(xi))
+            tau = tauPrime
+            for i in range(5):
+                sigma = math.sinh(e * math.atanh(e * tau / math.sqrt(1.0 + (tau * tau))))
+                tauI = (tau * math.sqrt(1.0 + (sigma * sigma))) - (sigma * math.sqrt(1.0 + (tau * tau)))
+                delta = (tauPrime - tauI) / math.sqrt(1.0 + (tauI * tauI)) * (1.0 + ((1.0 - e2) * tau * tau)) / ((1.0 - e2) * math.sqrt(1.0 + (tau * tau)))
+                tau += delta
+                if abs(delta) < 1e-12:
+                    break
+            latitudes.append(math.degrees(math.atan(tau)))
+            longitudes.append(centralMeridian + math.degrees(math.atan2(math.sinh(eta), math.cos(xi))))
+        return longitudes, latitudes
+
+TRANSVERSEMERCATORS = {}
+
+def getTransverseMercator(datum, zone, south):
+    """the transverse mercator projection of a UTM zone, which is only set up once"""
+    key = (datum, zone, south)
+    if key not in TRANSVERSEMERCATORS:
+        semiMajor, inverseFlattening = DATUMS[datum][4:6]
+        TRANSVERSEMERCATORS[key] = TransverseMercator(semiMajor, inverseFlattening, (zone * 6.0) - 183.0, UTMSCALE, UTMFALSEEASTING, UTMFALSENORTHING if south else 0.0)
+    return TRANSVERSEMERCATORS[key]
+
+def utmZone(longitude):
+    return int(((longitude + 180.0) % 360.0) // 6.0) + 1
+
+def projectedEPSG(datum, zone, south):
+    """the EPSG code of a WGS84 UTM zone or a GDA94 or GDA2020 MGA zone, the inverse of fromEPSG.  Returns None if the zone has no code"""
+    if datum == 'WGS84':
+        return (32700 if south else 32600) + zone
+    if datum == 'GDA94' and south and 48 <= zone <= 58:
+        return 28300 + zone
+    if datum == 'GDA2020' and south and 46 <= zone <= 59:
+        return 7800 + zone
+    return None
+
+class CRS:
+    """a geographic, UTM or MGA coordinate reference system.  A projected CRS with no zone is unknown, so positions are used as they are and no .prj is written"""
+    def __init__(self, datum='WGS84', geographic=True, zone=None, south=False, epsg=None):
+        self.datum = datum
+        self.geographic = geographic
+        self.zone = zone
+        self.south = south
+        self.epsg = epsg
+        if geographic:
+            self.name = DATUMS[datum][1]
+            if self.epsg is None:
+                self.epsg = DATUMS[datum][6]
+        elif zone is None:
+            self.name = "unknown projection"
+        elif datum == 'WGS84':
+            if self.epsg is None:
+                self.epsg = projectedEPSG(datum, zone, south)
+            self.name = "%s_UTM_Zone_%d%s" % (DATUMS[datum][0], zone, "S" if south else "N")
+        else:
+            if self.epsg is None:
+                self.epsg = projectedEPSG(datum, zone, south)
+            self.name = "%s_MGA_Zone_%d" % (DATUMS[datum][0], zone)
+
+    def known(self):
+        return self.geographic or self.zone is not None
+
+    def projection(self):
+        if self.geographic or self.zone is None:
+            return None
+        return getTransverseMercator(self.datum, self.zone, self.south)
+
+    def wkt(self):
+        """the ESRI WKT for a .prj file, or None if the CRS is unknown"""
+        name, geogName, datumName, spheroidName, semiMajor, inverseFlattening, geogEPSG = DATUMS[self.datum]
+        geogcs = 'GEOGCS["%s",DATUM["%s",SPHEROID["%s",%r,%r]],PRIMEM["Greenwich",0.0],UNIT["Degree",0.0174532925199433]]' % (geogName, datumName, spheroidName, semiMajor, inverseFlattening)
+        if self.geographic:
+            return geogcs
+        if self.zone is None:
+            return None
+        projection = self.projection()
+        return 'PROJCS["%s",%s,PROJECTION["Transverse_Mercator"],PARAMETER["False_Easting",%r],PARAMETER["False_Northing",%r],PARAMETER["Central_Meridian",%r],PARAMETER["Scale_Factor",%r],PARAMETER["Latitude_Of_Origin",0.0],UNIT["Meter",1.0]]' % (self.name, geogcs, projection.falseEasting, projection.falseNorthing, projection.centralMeridian, UTMSCALE)
+
+    def __eq__(self, other):
+        return isinstance(other, CRS) and self.name == other.name
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __str__(self):
+        if self.epsg is None:
+            return self.name
+        return "%s (EPSG:%d)" % (self.name, self.epsg)
+
+WGS84 = CRS('WGS84')
+
+def fromEPSG(code):
+    """the CRS of an EPSG code.  Geographic WGS84, GDA94 and GDA2020, WGS84 UTM zones and GDA94 and GDA2020 MGA zones are supported"""
+    for datum, values in DATUMS.items():
+        if code == values[6]:
+            return CRS(datum)
+    if 32601 <= code <= 32660:
+        return CRS('WGS84', False, code - 32600, False, code)
+    if 32701 <= code <= 32760:
+        return CRS('WGS84', False, code - 32700, True, code)
+    if 28348 <= code <= 28358:
+        return CRS('GDA94', False, code - 28300, True, code)
+    if 7846 <= code <= 7859:
+        return CRS('GDA2020', False, code - 7800, True, code)
+    raise ValueError("EPSG:%d is not supported.  Try 4326, 4283, 7844, a WGS84 UTM zone (326zz, 327zz) or an MGA zone (283zz, 78zz)" % (code))
+
+def looksGeographic(x, y):
+    return (x < 180) & (y < 90)
+
+def fromXTFHeader(header, x=None, y=None):
+    """the CRS of an XTF file from the NavUnits, ProjectionType and SpheroidType of its file header.  The first position (x, y) is used if the header does not agree with it"""
+    projectionType = header.ProjectionType.upper()
+    spheroidType = header.SpheroidType.upper()
+    match = re.search(r'EPSG\D*(\d{4,5})', projectionType)
+    if match is not None:
+        try:
+            return fromEPSG(int(match.group(1)))
+        except ValueError as e:
+            progress.message("%s, using the XTF NavUnits" % (e))
+
+    text = projectionType + " " + spheroidType
+    if 'GDA2020' in text:
+        datum = 'GDA2020'
+    elif 'GDA' in text or 'GRS' in text or 'MGA' in text:
+        datum = 'GDA94'
+    else:
+        datum = 'WGS84'
+
+    if header.NavUnits == NAVUNITSLATLONG:
+        geographic = True
+    elif header.NavUnits == NAVUNITSMETRES:
+        geographic = False
+    else:
+        geographic = x is not None and looksGeographic(x, y)
+    if x is not None and geographic != looksGeographic(x, y):
+        geographic = looksGeographic(x, y)
+        progress.message("XTF NavUnits %d does not match the positions, which look %s" % (header.NavUnits, "geographic" if geographic else "projected"))
+    if geographic:
+        return CRS(datum)
+
+    match = re.search(r'(UTM|MGA)\D*(\d{1,2})\s*([NS]?)', projectionType)
+    if match is None:
+        return CRS(datum, False)
+    zone = int(match.group(2))
+    if not 1 <= zone <= 60:
+        return CRS(datum, False)
+    # MGA zones are all in the southern hemisphere
+    south = match.group(1) == 'MGA' or match.group(3) == 'S'
+    return CRS(datum, False, zone, south)
+
+def fromXTFFile(fileName):
+    """the CRS of an XTF file, from its file header and first ping"""
+    r = pyXTF.XTFReader(fileName)
+    ping = r.readPacket(pyXTF.SONARPACKETS) if r.moreData() else None
+    r.fileptr.close()
+    if ping is None:
+        return fromXTFHeader(r.XTFFileHdr)
+    return fromXTFHeader(r.XTFFileHdr, ping.SensorXcoordinate, ping.SensorYcoordinate)
+
+def gridConvergence(projectedCRS, eastings, northings):
+    """the grid convergence (degrees) at arrays of positions in a known projected CRS.  Subtract it from a bearing from true north to get a bearing from grid north"""
+    projection = projectedCRS.projection()
+    longitudes, latitudes = projection.inverse(eastings, northings)
+    return projection.convergenceScale(longitudes, latitudes)[0]
+
+class CRSError(ValueError):
+    """positions cannot be converted from the CRS of a file to the output CRS"""
+
+def canTransform(fromCRS, toCRS):
+    """positions can be converted between known CRS.  Metres in an unknown projection are taken to be in the other projection, as it is the best there is"""
+    return fromCRS == toCRS or (fromCRS.known() and toCRS.known()) or (not fromCRS.geographic and not toCRS.geographic)
+
+def transform(fromCRS, toCRS, xs, ys):
+    """convert arrays of positions between two CRS.  Positions to or from an unknown projection are returned as they are"""
+    if fromCRS == toCRS or not fromCRS.known() or not toCRS.known():
+        return xs, ys
+    if not fromCRS.geographic:
+        xs, ys = fromCRS.projection().inverse(xs, ys)
+    if not toCRS.geographic:
+        xs, ys = toCRS.projection().forward(xs, ys)
+    return list(xs), list(ys)
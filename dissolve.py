@@ -0,0 +1,277 @@
+#name:          dissolve
+#created:       October 2026
+#description:   dissolve (union) many overlapping polygons, such as the nadir strips of a survey campaign, into a single multipart polygon
+#notes:         the boundary of the union is made from the pieces of each polygon edge which are not inside any other polygon
+#               edges are split where they cross the edges of other polygons.  The crossings are found using a uniform grid, so only edges which share a grid cell are tested
+#               the midpoint of a piece is tested against the polygons whose bounding box contains it.  Each polygon's edges are bucketed into horizontal bands,
+#               so a point in polygon test only visits the few edges in one band.  A piece can only move inside or outside another polygon at a crossing, so the test is
+#               only repeated after each crossing.  Pieces which are not inside any other polygon are on the boundary of the union
+#               polygons are expected to be simple (not self intersecting).  Coincident edges are handled by growing each ring outwards by a different, vanishingly
+#               small amount, so no two rings share an edge.  Polygons which touch along an edge then overlap by a sliver and are joined, and the same file processed
+#               twice gives one ring inside the other
+
+#DONE
+#initial implementation
+
+import math
+import shapefile
+
+PARALLEL = 1e-12 # edges closer to parallel than this (sine of the angle between them) are not tested for crossings
+
+def dissolvePolygons(polygons):
+    """union a list of polygons, each a list of [x, y] vertices, into a list of rings.  Outer rings are clockwise and holes are anticlockwise as required by the shapefile format"""
+    rings = []
+    for polygon in polygons:
+        ring = cleanRing(polygon)
+        if ring is not None:
+            rings.append(ring)
+    if len(rings) == 0:
+        return []
+    rings = offsetRings(rings)
+
+    # build a flat list of edges.  Each ring is anticlockwise, so the pieces of the boundary of the union are anticlockwise around each outer ring
+    edges = []
+    edgeRings = []
+    for r, ring in enumerate(rings):
+        n = len(ring)
+        for i in range(n):
+            edges.append((ring[i], ring[(i + 1) % n]))
+            edgeRings.append(r)
+
+    grid = EdgeGrid(edges)
+    splits = findCrossings(edges, edgeRings, grid)
+
+    # split each edge at its crossings, keeping the pieces which are not inside any other ring.  Along a ring, a piece can only move inside or outside
+    # another ring at a crossing, so the midpoint test is only needed for the first piece of each ring and the first piece after each crossing
+    ringIndex = RingIndex(rings)
+    pieces = []
+    previousRing = -1
+    inside = None
+    for e, (a, b) in enumerate(edges):
+        r = edgeRings[e]
+        if r != previousRing:
+            previousRing = r
+            inside = None
+        points = [a]
+        if e in splits:
+            points.extend(pt for t, pt in sorted(splits[e]))
+        points.append(b)
+        last = len(points) - 2
+        for i in range(last + 1):
+            p0 = points[i]
+            p1 = points[i + 1]
+            if p0 == p1:
+                continue
+            if inside is None:
+                inside = ringIndex.contains((p0[0] + p1[0]) * 0.5, (p0[1] + p1[1]) * 0.5, r)
+            if not inside:
+                pieces.append((p0, p1))
+            if i < last:
+                inside = None # the next piece starts at a crossing
+
+    # join the pieces into closed rings, and reverse them so outer rings are clockwise
+    result = []
+    for ring in joinPieces(pieces):
+        ring.reverse()
+        result.append([list(pt) for pt in ring])
+    return result
+
+def cleanRing(polygon):
+    """remove duplicate and closing vertices, and orient the ring anticlockwise.  Returns None for degenerate rings"""
+    ring = []
+    for pt in polygon:
+        pt = (pt[0], pt[1])
+        if len(ring) == 0 or ring[-1] != pt:
+            ring.append(pt)
+    while len(ring) > 1 and ring[0] == ring[-1]:
+        ring.pop()
+    if len(ring) < 3:
+        return None
+    area = shapefile.signed_area(ring + [ring[0]])
+    if area == 0:
+        return None
+    if area < 0:
+        ring.reverse()
+    return ring
+
+def offsetRings(rings):
+    """grow each anticlockwise ring outwards by a different tiny amount, so rings which share an edge overlap rather than touch, and identical rings are nested.
+    The offset is far below the precision of the positions"""
+    # the offset must be above the floating point resolution of the coordinates, but well below the resolution of the survey.  The resolution is shared by every
+    # ring, so each ring's offset is strictly larger than the one before and no two rings are grown by the same amount
+    resolution = max(max(abs(pt[0]), abs(pt[1])) for ring in rings for pt in ring) * 1e-13
+    result = []
+    for r, ring in enumerate(rings):
+        epsilon = resolution * (r + 1)
+        n = len(ring)
+        # the outward normal of each edge.  The ring is anticlockwise, so outwards is to the right
+        normals = []
+        for i in range(n):
+            dx = ring[(i + 1) % n][0] - ring[i][0]
+            dy = ring[(i + 1) % n][1] - ring[i][1]
+            length = math.hypot(dx, dy)
+            normals.append((dy / length, -dx / length))
+        grown = []
+        for i in range(n):
+            # move the vertex along the mitre of its two edges, so both edges move out by epsilon.  The mitre is limited at spikes
+            nx0, ny0 = normals[i - 1]
+            nx1, ny1 = normals[i]
+            scale = epsilon / max(1.0 + (nx0 * nx1) + (ny0 * ny1), 0.1)
+            grown.append((ring[i][0] + ((nx0 + nx1) * scale), ring[i][1] + ((ny0 + ny1) * scale)))
+        result.append(grown)
+    return result
+
+class EdgeGrid:
+    """a uniform grid of cells, each holding the edges which pass through the cell's bounding box"""
+    def __init__(self, edges):
+        xs = [pt[0] for edge in edges for pt in edge]
+        ys = [pt[1] for edge in edges for pt in edge]
+        self.minX = min(xs)
+        self.minY = min(ys)
+        width = max(xs) - self.minX
+        height = max(ys) - self.minY
+
+        # size the cells so each holds only a few edges, but long edges do not fill too many cells
+        meanLength = sum(abs(edge[1][0] - edge[0][0]) + abs(edge[1][1] - edge[0][1]) for edge in edges) / len(edges)
+        self.cellSize = max(meanLength, math.sqrt((width * height) / len(edges)), 1e-9)
+
+        self.cells = {}
+        for e, (a, b) in enumerate(edges):
+            col0, row0 = self.cell(min(a[0], b[0]), min(a[1], b[1]))
+            col1, row1 = self.cell(max(a[0], b[0]), max(a[1], b[1]))
+            for col in range(col0, col1 + 1):
+                for row in range(row0, row1 + 1):
+                    key = (col, row)
+                    if key in self.cells:
+                        self.cells[key].append(e)
+                    else:
+                        self.cells[key] = [e]
+
+    def cell(self, x, y):
+        return int((x - self.minX) / self.cellSize), int((y - self.minY) / self.cellSize)
+
+def findCrossings(edges, edgeRings, grid):
+    """find where edges of different rings cross.  Returns a dictionary of edge: [(t, point)] where t is the distance along the edge (0-1)"""
+    splits = {}
+    for key, cellEdges in grid.cells.items():
+        n = len(cellEdges)
+        for i in range(n):
+            e1 = cellEdges[i]
+            (x0, y0), (x1, y1) = edges[e1]
+            d1x = x1 - x0
+            d1y = y1 - y0
+            r1 = edgeRings[e1]
+            for j in range(i + 1, n):
+                e2 = cellEdges[j]
+                if edgeRings[e2] == r1:
+                    continue
+                (x2, y2), (x3, y3) = edges[e2]
+                d2x = x3 - x2
+                d2y = y3 - y2
+                den = d1x * d2y - d1y * d2x
+                if abs(den) <= PARALLEL * (abs(d1x) + abs(d1y)) * (abs(d2x) + abs(d2y)):
+                    continue # parallel edges do not cross
+                t = ((x2 - x0) * d2y - (y2 - y0) * d2x) / den
+                if t < 0 or t >= 1:
+                    continue
+                u = ((x2 - x0) * d1y - (y2 - y0) * d1x) / den
+                if u < 0 or u >= 1:
+                    continue
+                pt = (x0 + t * d1x, y0 + t * d1y)
+                # edges can share several cells, so only record the crossing in the cell which contains it
+                if grid.cell(pt[0], pt[1]) != key:
+                    continue
+                splits.setdefault(e1, []).append((t, pt))
+                splits.setdefault(e2, []).append((u, pt))
+    return splits
+
+class RingIndex:
+    """a coarse grid of ring bounding boxes, and a banded index of each ring's edges, used to test if a point is inside any ring"""
+    def __init__(self, rings):
+        self.boxes = []
+        self.bands = []
+        for ring in rings:
+            xs = [pt[0] for pt in ring]
+            ys = [pt[1] for pt in ring]
+            box = (min(xs), min(ys), max(xs), max(ys))
+            self.boxes.append(box)
+            self.bands.append(RingBands(ring, box))
+        self.minX = min(box[0] for box in self.boxes)
+        self.minY = min(box[1] for box in self.boxes)
+        width = max(box[2] for box in self.boxes) - self.minX
+        height = max(box[3] for box in self.boxes) - self.minY
+        self.cellSize = max(width, height, 1e-9) / max(1, int(math.sqrt(len(rings))))
+
+        self.cells = {}
+        for r, box in enumerate(self.boxes):
+            col0, row0 = self.cell(box[0], box[1])
+            col1, row1 = self.cell(box[2], box[3])
+            for col in range(col0, col1 + 1):
+                for row in range(row0, row1 + 1):
+                    self.cells.setdefault((col, row), []).append(r)
+
+    def cell(self, x, y):
+        return int((x - self.minX) / self.cellSize), int((y - self.minY) / self.cellSize)
+
+    def contains(self, x, y, ignoreRing):
+        """True if any ring, other than ignoreRing, contains the point"""
+        for r in self.cells.get(self.cell(x, y), []):
+            if r == ignoreRing:
+                continue
+            box = self.boxes[r]
+            if x < box[0] or x > box[2] or y < box[1] or y > box[3]:
+                continue
+            if self.bands[r].contains(x, y):
+                return True
+        return False
+
+class RingBands:
+    """the edges of a ring, bucketed into horizontal bands so a point in polygon test only visits the edges which span the point's band"""
+    def __init__(self, ring, box):
+        self.minY = box[1]
+        count = max(1, len(ring) // 4)
+        self.bandHeight = max((box[3] - box[1]) / count, 1e-300)
+        self.lastBand = count - 1
+        self.edges = [[] for i in range(count)]
+        x0, y0 = ring[-1]
+        for x1, y1 in ring:
+            first = self.band(min(y0, y1))
+            last = self.band(max(y0, y1))
+            for b in range(first, last + 1):
+                self.edges[b].append((x0, y0, x1, y1))
+            x0 = x1
+            y0 = y1
+
+    def band(self, y):
+        return min(max(int((y - self.minY) / self.bandHeight), 0), self.lastBand)
+
+    def contains(self, x, y):
+        """even-odd point in polygon test"""
+        inside = False
+        for x0, y0, x1, y1 in self.edges[self.band(y)]:
+            if (y1 > y) != (y0 > y):
+                if x < (x0 - x1) * (y - y1) / (y0 - y1) + x1:
+                    inside = not inside
+        return inside
+
+def joinPieces(pieces):
+    """join directed pieces end to start into closed rings"""
+    outgoing = {}
+    for a, b in pieces:
+        outgoing.setdefault(a, []).append(b)
+
+    rings = []
+    for start in list(outgoing.keys()):
+        while outgoing[start]:
+            ring = [start]
+            current = outgoing[start].pop()
+            while current != start:
+                ring.append(current)
+                nextPoints = outgoing.get(current)
+                if not nextPoints:
+                    ring = None # an open chain.  This only happens with degenerate input
+                    break
+                current = nextPoints.pop()
+            if ring is not None and len(ring) > 2:
+                rings.append(ring)
+    return rings
@@ -0,0 +1,157 @@
+#name:          gapmodel
+#created:       October 2026
+#description:   pluggable models of the nadir gap region beneath a sidescan sonar
+#notes:         each model is evaluated over the whole array of pings in a file in one call, so no per ping python call is made in the hot loop
+#               models are selected from the command line with a specification string, e.g.
+#               linear:0.70             gap = altitude * factor / 2
+#               table:bands.csv         gap = altitude * factor / 2, where the factor is looked up from a csv table of altitude bands
+#               slant:0.10              gap = slant range * factor (from XTFPINGCHANHEADER.SlantRange)
+#               noisy altitude can make the gap flicker around the minimum gap, splitting a line into many tiny polygons.  The altitude can be smoothed with a moving average
+#               before the gap is computed, and hysteresis can be applied to the valid flags, so a run of invalid gaps only splits the polygon once it is long enough
+
+#DONE
+# added -smoothaltitude to smooth the altitude before computing the gap, and -splitpings / -splitdistance so short runs of invalid gaps do not split the nadir polygon
+#initial implementation
+
+import bisect
+import csv
+
+GAPFACTOR = 0.70 # proportion of the altitude which is considered to be the nadir gap (across both sides)
+SLANTFACTOR = 0.10 # proportion of the slant range which is considered to be the nadir gap
+MINIMUMGAP = 50 # gaps smaller than this are not considered valid, and the polygon is split
+
+class LinearGapModel:
+    """the gap is a linear factor of the altitude, shared equally across both sides of the nadir"""
+    def __init__(self, factor=GAPFACTOR, minimumGap=MINIMUMGAP):
+        self.factor = factor
+        self.minimumGap = minimumGap
+
+    def gaps(self, altitudes, slantRanges):
+        halfFactor = self.factor / 2.0
+        return [altitude * halfFactor for altitude in altitudes]
+
+    def isValid(self, gaps):
+        minimumGap = self.minimumGap
+        return [gap >= minimumGap for gap in gaps]
+
+    def describe(self):
+        return "linear:%r:%r" % (self.factor, self.minimumGap)
+
+class AltitudeBandGapModel(LinearGapModel):
+    """the gap factor is looked up from a table of altitude bands, so different sonars and contracts can be run without code changes"""
+    def __init__(self, bands, minimumGap=MINIMUMGAP):
+        # bands are (minimumAltitude, factor) pairs.  Each band extends up to the start of the next band
+        bands = sorted(bands)
+        self.altitudes = [band[0] for band in bands]
+        self.factors = [band[1] for band in bands]
+        self.minimumGap = minimumGap
+
+    def gaps(self, altitudes, slantRanges):
+        bandAltitudes = self.altitudes
+        halfFactors = [factor / 2.0 for factor in self.factors]
+        # altitudes below the first band use the first band
+        return [altitude * halfFactors[max(bisect.bisect_right(bandAltitudes, altitude) - 1, 0)] for altitude in altitudes]
+
+    def describe(self):
+        return "table:%r:%r:%r" % (self.altitudes, self.factors, self.minimumGap)
+
+class SlantRangeGapModel(LinearGapModel):
+    """the gap is a factor of the slant range setting of the sonar"""
+    def gaps(self, altitudes, slantRanges):
+        factor = self.factor
+        return [slantRange * factor for slantRange in slantRanges]
+
+    def describe(self):
+        return "slant:%r:%r" % (self.factor, self.minimumGap)
+
+def smoothAltitudes(altitudes, window=1):
+    """centred moving average of the altitudes over a window of pings, using a running sum so the cost does not depend on the window"""
+    n = len(altitudes)
+    if window <= 1 or n == 0:
+        return altitudes
+    half = window // 2
+    sums = [0.0]
+    for altitude in altitudes:
+        sums.append(sums[-1] + altitude)
+    result = []
+    for i in range(n):
+        first = max(0, i - half)
+        last = min(n, i + half + 1)
+        result.append((sums[last] - sums[first]) / (last - first))
+    return result
+
+def findRuns(flags):
+    """the runs of equal flags, as [flag, first, end] where end is one past the last"""
+    runs = []
+    for i, flag in enumerate(flags):
+        if len(runs) > 0 and runs[-1][0] == flag:
+            runs[-1][2] = i + 1
+        else:
+            runs.append([flag, i, i + 1])
+    return runs
+
+def applyHysteresis(valid, along=None, minimumPings=1, minimumDistance=0.0):
+    """a run of invalid gaps between valid gaps only splits the polygon if it lasts at least minimumPings pings and minimumDistance metres along the track.
+    Runs of valid gaps between invalid gaps which are just as short are then dropped, so they do not make tiny polygons.  Runs at the start and end of the file, and
+    the only valid run of a file, are kept, so a short line which is valid throughout still has its polygon.  along is the distance along the track of each ping, needed if minimumDistance is set"""
+    if minimumPings <= 1 and minimumDistance <= 0:
+        return valid
+    n = len(valid)
+    def isShort(first, end):
+        if end - first < minimumPings:
+            return True
+        # measure from the ping before the run to the ping after it
+        return minimumDistance > 0 and along[min(end, n - 1)] - along[max(first - 1, 0)] < minimumDistance
+
+    result = list(valid)
+    runs = findRuns(result)
+    for r in range(1, len(runs) - 1):
+        flag, first, end = runs[r]
+        if not flag and isShort(first, end):
+            result[first:end] = [True] * (end - first)
+    runs = findRuns(result)
+    if len([run for run in runs if run[0]]) < 2:
+        return result
+    for r in range(1, len(runs) - 1):
+        flag, first, end = runs[r]
+        if flag and isShort(first, end):
+            result[first:end] = [False] * (end - first)
+    return result
+
+def readBandTable(fileName):
+    """read a csv table of altitude, factor rows.  Rows containing a '#' are treated as headers and skipped"""
+    bands = []
+    with open(fileName, 'r') as f:
+        for row in csv.reader(f):
+            if len(row) < 2 or any("#" in word for word in row):
+                continue
+            bands.append((float(row[0]), float(row[1])))
+    if len(bands) == 0:
+        raise ValueError("no altitude bands found in gap table: %s" % (fileName))
+    return bands
+
+def parseFactor(value, default, spec):
+    """the factor of a gap model specification, or the default if none is given"""
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError("the factor of the gap model is not a number: %s" % (spec))
+
+def createGapModel(spec=None, minimumGap=MINIMUMGAP):
+    """create a gap model from a specification string of the form model:value.  If no specification is given, the default linear model is used.  Raises ValueError
+    if the specification is not valid, and OSError if the gap table cannot be read"""
+    if spec is None:
+        return LinearGapModel(GAPFACTOR, minimumGap)
+    name, sep, value = spec.partition(':')
+    name = name.lower()
+    if name == 'linear':
+        return LinearGapModel(parseFactor(value, GAPFACTOR, spec), minimumGap)
+    if name == 'table':
+        if not value:
+            raise ValueError("no csv file given for the gap table: %s.  Try table:<csvfile>" % (spec))
+        return AltitudeBandGapModel(readBandTable(value), minimumGap)
+    if name == 'slant':
+        return SlantRangeGapModel(parseFactor(value, SLANTFACTOR, spec), minimumGap)
+    raise ValueError("unknown gap model: %s.  Try linear:<factor>, table:<csvfile> or slant:<factor>" % (spec))
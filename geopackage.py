@@ -0,0 +1,205 @@
+#name:          geopackage
+#created:       October 2026
+#description:   write point, line and polygon layers to an OGC GeoPackage, a single SQLite file which has no 2 GB or DBF field limits
+#notes:         only the stdlib sqlite3 module is needed.  Each layer is a feature table with a geometry blob (the GeoPackage header and envelope, then WKB) and a
+#               column for each field of the layer
+#               rows are inserted with executemany in batches of BATCHSIZE, all in one transaction per layer, so the rows are not committed one at a time
+#               each layer has an R-tree spatial index, filled from the envelopes as the rows are written, with the standard triggers so it stays in step if the
+#               layer is edited later, eg in QGIS
+#               tables without geometry, such as lookups, are written as attributes tables
+#               polygons are written as multipolygons.  In multipart shapes the clockwise rings are outers and the anticlockwise rings are holes, as in a shape file
+
+#DONE
+#initial implementation
+
+import os
+import sqlite3
+import struct
+import time
+
+import crs
+import shapefile
+
+BATCHSIZE = 10000 # rows per executemany
+APPLICATIONID = 0x47504B47 # "GPKG"
+USERVERSION = 10200 # GeoPackage 1.2
+WKBPOINT = 1
+WKBMULTILINESTRING = 5
+WKBMULTIPOLYGON = 6
+GEOMETRYTYPES = {shapefile.POINT: ('POINT', WKBPOINT), shapefile.POLYLINE: ('MULTILINESTRING', WKBMULTILINESTRING), shapefile.POLYGON: ('MULTIPOLYGON', WKBMULTIPOLYGON)}
+FIELDTYPES = {'C': 'TEXT', 'N': 'INTEGER', 'F': 'REAL', 'L': 'BOOLEAN', 'D': 'DATE'}
+
+RTREETRIGGERS = [
+    """CREATE TRIGGER "rtree_{t}_{c}_insert" AFTER INSERT ON "{t}" WHEN (new."{c}" NOT NULL AND NOT ST_IsEmpty(NEW."{c}"))
+       BEGIN INSERT OR REPLACE INTO "rtree_{t}_{c}" VALUES (NEW."{i}", ST_MinX(NEW."{c}"), ST_MaxX(NEW."{c}"), ST_MinY(NEW."{c}"), ST_MaxY(NEW."{c}")); END""",
+    """CREATE TRIGGER "rtree_{t}_{c}_update1" AFTER UPDATE OF "{c}" ON "{t}" WHEN OLD."{i}" = NEW."{i}" AND (NEW."{c}" NOTNULL AND NOT ST_IsEmpty(NEW."{c}"))
+       BEGIN INSERT OR REPLACE INTO "rtree_{t}_{c}" VALUES (NEW."{i}", ST_MinX(NEW."{c}"), ST_MaxX(NEW."{c}"), ST_MinY(NEW."{c}"), ST_MaxY(NEW."{c}")); END""",
+    """CREATE TRIGGER "rtree_{t}_{c}_update2" AFTER UPDATE OF "{c}" ON "{t}" WHEN OLD."{i}" = NEW."{i}" AND (NEW."{c}" ISNULL OR ST_IsEmpty(NEW."{c}"))
+       BEGIN DELETE FROM "rtree_{t}_{c}" WHERE id = OLD."{i}"; END""",
+    """CREATE TRIGGER "rtree_{t}_{c}_update3" AFTER UPDATE ON "{t}" WHEN OLD."{i}" != NEW."{i}" AND (NEW."{c}" NOTNULL AND NOT ST_IsEmpty(NEW."{c}"))
+       BEGIN DELETE FROM "rtree_{t}_{c}" WHERE id = OLD."{i}"; INSERT OR REPLACE INTO "rtree_{t}_{c}" VALUES (NEW."{i}", ST_MinX(NEW."{c}"), ST_MaxX(NEW."{c}"), ST_MinY(NEW."{c}"), ST_MaxY(NEW."{c}")); END""",
+    """CREATE TRIGGER "rtree_{t}_{c}_update4" AFTER UPDATE ON "{t}" WHEN OLD."{i}" != NEW."{i}" AND (NEW."{c}" ISNULL OR ST_IsEmpty(NEW."{c}"))
+       BEGIN DELETE FROM "rtree_{t}_{c}" WHERE id IN (OLD."{i}", NEW."{i}"); END""",
+    """CREATE TRIGGER "rtree_{t}_{c}_delete" AFTER DELETE ON "{t}" WHEN OLD."{c}" NOT NULL
+       BEGIN DELETE FROM "rtree_{t}_{c}" WHERE id = OLD."{i}"; END""",
+]
+
+class GeoPackage:
+    """a GeoPackage file, with every layer in the same coordinate reference system.  An existing file is replaced"""
+    def __init__(self, fileName, outputCRS):
+        if os.path.exists(fileName):
+            os.remove(fileName)
+        self.fileName = fileName
+        self.connection = sqlite3.connect(fileName)
+        self.connection.execute("PRAGMA application_id = %d" % (APPLICATIONID))
+        self.connection.execute("PRAGMA user_version = %d" % (USERVERSION))
+        self.srsID = -1 if outputCRS.epsg is None else outputCRS.epsg
+        with self.connection:
+            self.connection.execute("""CREATE TABLE gpkg_spatial_ref_sys (srs_name TEXT NOT NULL, srs_id INTEGER NOT NULL PRIMARY KEY, organization TEXT NOT NULL,
+                organization_coordsys_id INTEGER NOT NULL, definition TEXT NOT NULL, description TEXT)""")
+            self.connection.execute("""CREATE TABLE gpkg_contents (table_name TEXT NOT NULL PRIMARY KEY, data_type TEXT NOT NULL, identifier TEXT UNIQUE, description TEXT DEFAULT '',
+                last_change DATETIME NOT NULL, min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE, srs_id INTEGER, CONSTRAINT fk_gc_r_srs_id FOREIGN KEY (srs_id) REFERENCES gpkg_spatial_ref_sys(srs_id))""")
+            self.connection.execute("""CREATE TABLE gpkg_geometry_columns (table_name TEXT NOT NULL, column_name TEXT NOT NULL, geometry_type_name TEXT NOT NULL, srs_id INTEGER NOT NULL,
+                z TINYINT NOT NULL, m TINYINT NOT NULL, CONSTRAINT pk_geom_cols PRIMARY KEY (table_name, column_name), CONSTRAINT fk_gc_tn FOREIGN KEY (table_name) REFERENCES gpkg_contents(table_name),
+                CONSTRAINT fk_gc_srs FOREIGN KEY (srs_id) REFERENCES gpkg_spatial_ref_sys (srs_id))""")
+            self.connection.execute("""CREATE TABLE gpkg_extensions (table_name TEXT, column_name TEXT, extension_name TEXT NOT NULL, definition TEXT NOT NULL, scope TEXT NOT NULL,
+                CONSTRAINT ge_tce UNIQUE (table_name, column_name, extension_name))""")
+            # the three systems every GeoPackage must define, and the output CRS
+            systems = [('Undefined cartesian SRS', -1, 'NONE', -1, 'undefined', 'undefined cartesian coordinate reference system'),
+                       ('Undefined geographic SRS', 0, 'NONE', 0, 'undefined', 'undefined geographic coordinate reference system'),
+                       ('WGS 84 geodetic', 4326, 'EPSG', 4326, crs.WGS84.wkt(), 'longitude/latitude coordinates in decimal degrees on the WGS 84 spheroid')]
+            if self.srsID not in (-1, 4326):
+                systems.append((outputCRS.name, self.srsID, 'EPSG', self.srsID, outputCRS.wkt(), outputCRS.name))
+            self.connection.executemany("INSERT INTO gpkg_spatial_ref_sys VALUES (?, ?, ?, ?, ?, ?)", systems)
+
+    def addLayer(self, name, shapeType, fields, shapes, records, description=""):
+        """write a layer from lists of pyshp shapes and their records.  fields are (name, type, size, decimal) as in a shape file"""
+        geometryName, wkbType = GEOMETRYTYPES[shapeType]
+        columns = createColumns(fields)
+        placeholders = ", ".join(["?"] * (len(fields) + 2))
+        bounds = [float('inf'), float('inf'), float('-inf'), float('-inf')]
+
+        def rows(spatialIndex):
+            # each row is encoded as it is inserted, so the layer is never held twice in memory
+            for fid, (shape, record) in enumerate(zip(shapes, records), 1):
+                blob, envelope = encodeGeometry(shape, wkbType, self.srsID)
+                bounds[0] = min(bounds[0], envelope[0])
+                bounds[1] = min(bounds[1], envelope[2])
+                bounds[2] = max(bounds[2], envelope[1])
+                bounds[3] = max(bounds[3], envelope[3])
+                spatialIndex.append((fid,) + envelope)
+                yield [fid, blob] + list(record)
+
+        with self.connection:
+            self.connection.execute('CREATE TABLE "%s" (fid INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL, geom %s%s)' % (name, geometryName, "".join(", " + column for column in columns)))
+            self.connection.execute('CREATE VIRTUAL TABLE "rtree_%s_geom" USING rtree(id, minx, maxx, miny, maxy)' % (name))
+            spatialIndex = []
+            batch = []
+            for row in rows(spatialIndex):
+                batch.append(row)
+                if len(batch) >= BATCHSIZE:
+                    self.connection.executemany('INSERT INTO "%s" VALUES (%s)' % (name, placeholders), batch)
+                    self.connection.executemany('INSERT INTO "rtree_%s_geom" VALUES (?, ?, ?, ?, ?)' % (name), spatialIndex)
+                    batch = []
+                    del spatialIndex[:]
+            if len(batch) > 0:
+                self.connection.executemany('INSERT INTO "%s" VALUES (%s)' % (name, placeholders), batch)
+                self.connection.executemany('INSERT INTO "rtree_%s_geom" VALUES (?, ?, ?, ?, ?)' % (name), spatialIndex)
+            # the triggers are added after the rows, so they do not fire on the bulk insert
+            for trigger in RTREETRIGGERS:
+                self.connection.execute(trigger.format(t=name, c='geom', i='fid'))
+
+            if bounds[0] > bounds[2]:
+                bounds = [None, None, None, None]
+            lastChange = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            self.connection.execute("INSERT INTO gpkg_contents VALUES (?, 'features', ?, ?, ?, ?, ?, ?, ?, ?)", [name, name, description, lastChange] + bounds + [self.srsID])
+            self.connection.execute("INSERT INTO gpkg_geometry_columns VALUES (?, 'geom', ?, ?, 0, 0)", (name, geometryName, self.srsID))
+            self.connection.execute("INSERT INTO gpkg_extensions VALUES (?, 'geom', 'gpkg_rtree_index', 'http://www.geopackage.org/spec120/#extension_rtree', 'write-only')", (name,))
+
+    def addTable(self, name, fields, records, description=""):
+        """write a table of records without geometry"""
+        columns = createColumns(fields)
+        placeholders = ", ".join(["?"] * (len(fields) + 1))
+        with self.connection:
+            self.connection.execute('CREATE TABLE "%s" (fid INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL%s)' % (name, "".join(", " + column for column in columns)))
+            for start in range(0, len(records), BATCHSIZE):
+                self.connection.executemany('INSERT INTO "%s" VALUES (%s)' % (name, placeholders), [[fid] + list(record) for fid, record in enumerate(records[start:start + BATCHSIZE], start + 1)])
+            lastChange = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            self.connection.execute("INSERT INTO gpkg_contents (table_name, data_type, identifier, description, last_change) VALUES (?, 'attributes', ?, ?, ?)", (name, name, description, lastChange))
+
+    def close(self):
+        self.connection.close()
+
+def createColumns(fields):
+    """the column definitions of the fields of a shape file"""
+    columns = []
+    for fieldName, fieldType, size, decimal in fields:
+        if fieldType == 'N' and decimal > 0:
+            fieldType = 'F'
+        columns.append('"%s" %s' % (fieldName, FIELDTYPES.get(fieldType, 'TEXT')))
+    return columns
+
+def encodeGeometry(shape, wkbType, srsID):
+    """the GeoPackage geometry blob of a pyshp shape, and its envelope (minx, maxx, miny, maxy)"""
+    points = shape.points
+    xs = [pt[0] for pt in points]
+    ys = [pt[1] for pt in points]
+    envelope = (min(xs), max(xs), min(ys), max(ys))
+    if wkbType == WKBPOINT:
+        wkb = struct.pack('<BIdd', 1, WKBPOINT, points[0][0], points[0][1])
+    else:
+        parts = [[(pt[0], pt[1]) for pt in points[start:end]] for start, end in zip(shape.parts, list(shape.parts[1:]) + [len(points)])]
+        if wkbType == WKBMULTILINESTRING:
+            wkb = struct.pack('<BII', 1, WKBMULTILINESTRING, len(parts)) + b"".join(encodeLineString(part) for part in parts)
+        else:
+            polygons = groupRings(parts)
+            wkb = struct.pack('<BII', 1, WKBMULTIPOLYGON, len(polygons)) + b"".join(encodePolygon(rings) for rings in polygons)
+    # the header is the magic, version, flags (little endian, xy envelope) and srs id, then the envelope
+    return struct.pack('<2sBBi4d', b'GP', 0, 0x03, srsID, *envelope) + wkb, envelope
+
+def encodeLineString(points):
+    return struct.pack('<BII', 1, 2, len(points)) + struct.pack('<%dd' % (2 * len(points)), *[value for pt in points for value in pt])
+
+def encodePolygon(rings):
+    data = [struct.pack('<BII', 1, 3, len(rings))]
+    for ring in rings:
+        data.append(struct.pack('<I', len(ring)) + struct.pack('<%dd' % (2 * len(ring)), *[value for pt in ring for value in pt]))
+    return b"".join(data)
+
+def groupRings(parts):
+    """group the rings of a shape into polygons of an outer ring and its holes"""
+    if len(parts) == 1:
+        return [parts]
+    polygons = []
+    holes = []
+    for ring in parts:
+        if signedArea(ring) <= 0:
+            polygons.append([ring])
+        else:
+            holes.append(ring)
+    for hole in holes:
+        # a hole belongs to the innermost outer ring around it, which is the smallest, so an island in a hole keeps its own holes
+        containing = [rings for rings in polygons if pointInRing(hole[0], rings[0])]
+        if len(containing) > 0:
+            min(containing, key=lambda rings: abs(signedArea(rings[0]))).append(hole)
+        else:
+            # a hole outside every outer ring is really an outer ring with the wrong orientation
+            polygons.append([hole])
+    return polygons
+
+def signedArea(ring):
+    """twice the signed area of a ring, positive when it is anticlockwise"""
+    area = 0.0
+    for i in range(len(ring) - 1):
+        area += (ring[i][0] * ring[i + 1][1]) - (ring[i + 1][0] * ring[i][1])
+    return area
+
+def pointInRing(point, ring):
+    x, y = point
+    inside = False
+    for i in range(len(ring) - 1):
+        x0, y0 = ring[i]
+        x1, y1 = ring[i + 1]
+        if (y0 > y) != (y1 > y) and x < x0 + ((y - y0) * (x1 - x0) / (y1 - y0)):
+            inside = not inside
+    return inside
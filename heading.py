@@ -0,0 +1,129 @@
+#name:          heading
+#created:       October 2026
+#description:   heading sources for the polygon geometry, computed across the whole file in one pass
+#notes:         attitude packets usually record the heading at a higher rate than the pings.  The attitude headings are unwrapped so they are continuous across north,
+#               interpolated onto the ping times, then wrapped back into 0-360
+#               the ping and attitude times are both in time order, so the interpolation walks the two arrays together, and only falls back to a binary search if the ping times go backwards
+#               course made good (CMG) is used where the heading is missing.  Duplicate fixes are collapsed first, as they make CMG wobble, then the CMG at each fix is the
+#               bearing from the fix half the smoothing distance behind to the fix half the smoothing distance ahead.  Both fixes are found by walking the along track distance, so it is one pass
+
+#DONE
+#initial implementation
+
+import bisect
+import math
+
+MAXIMUMGAP = 2.0 # seconds.  Pings further than this from an attitude record are not interpolated
+CMGDISTANCE = 20.0 # metres of track over which the course made good is smoothed
+
+def unwrapAngles(angles):
+    """remove the jumps of 360 degrees from a sequence of angles, so they can be interpolated"""
+    result = []
+    if len(angles) == 0:
+        return result
+    previous = angles[0]
+    current = previous
+    for angle in angles:
+        current += ((angle - previous + 180.0) % 360.0) - 180.0
+        previous = angle
+        result.append(current)
+    return result
+
+def sortSeries(times, values):
+    """sort a time series and drop records with duplicate times, so the times are strictly increasing"""
+    if all(times[i] < times[i + 1] for i in range(len(times) - 1)):
+        return times, values
+    sortedTimes = []
+    sortedValues = []
+    for t, value in sorted(zip(times, values)):
+        if len(sortedTimes) > 0 and t == sortedTimes[-1]:
+            continue
+        sortedTimes.append(t)
+        sortedValues.append(value)
+    return sortedTimes, sortedValues
+
+def interpolateAngles(times, angles, queryTimes, maximumGap=MAXIMUMGAP):
+    """interpolate angles (degrees) at the query times.  Query times outside the series, or in a gap longer than maximumGap, are None"""
+    times, angles = sortSeries(times, angles)
+    n = len(times)
+    if n == 0:
+        return [None] * len(queryTimes)
+    unwrapped = unwrapAngles(angles)
+    firstTime = times[0]
+    lastTime = times[-1]
+    result = []
+    append = result.append
+    j = 1 # index of the record after the query time
+    for t in queryTimes:
+        if t is None or t < firstTime or t > lastTime:
+            append(None)
+            continue
+        if n == 1:
+            append(angles[0] % 360.0)
+            continue
+        if j < n and times[j - 1] <= t:
+            while j < n - 1 and times[j] < t:
+                j += 1
+        else:
+            j = min(max(bisect.bisect_left(times, t), 1), n - 1)
+        t0 = times[j - 1]
+        t1 = times[j]
+        if t1 - t0 > maximumGap:
+            append(None)
+            continue
+        a0 = unwrapped[j - 1]
+        append((a0 + (unwrapped[j] - a0) * (t - t0) / (t1 - t0)) % 360.0)
+    return result
+
+def isValidHeading(heading):
+    """a heading of exactly zero is what most systems record when there is no gyro, so it is treated as missing"""
+    return 0.0 < heading <= 360.0
+
+def courseMadeGood(eastings, northings, geographic, distance=CMGDISTANCE):
+    """the smoothed course made good at each ping, in degrees.  Returns None for every ping if the track does not move"""
+    # collapse duplicate fixes, and remember which fix each ping uses
+    xs = []
+    ys = []
+    fixIndex = []
+    for x, y in zip(eastings, northings):
+        if len(xs) == 0 or x != xs[-1] or y != ys[-1]:
+            xs.append(x)
+            ys.append(y)
+        fixIndex.append(len(xs) - 1)
+    n = len(xs)
+    if n < 2:
+        return [None] * len(eastings)
+
+    if geographic:
+        # work in local metres, which is plenty accurate over the smoothing distance
+        def delta(i, j):
+            return (xs[j] - xs[i]) * 111320.0 * math.cos(math.radians((ys[i] + ys[j]) * 0.5)), (ys[j] - ys[i]) * 110574.0
+    else:
+        def delta(i, j):
+            return xs[j] - xs[i], ys[j] - ys[i]
+
+    along = [0.0]
+    for i in range(1, n):
+        dx, dy = delta(i - 1, i)
+        along.append(along[-1] + math.hypot(dx, dy))
+
+    half = distance * 0.5
+    headings = []
+    back = 0
+    ahead = 0
+    for k in range(n):
+        # back is the last fix at least half the distance behind, ahead is the first fix at least half the distance ahead.  Both only move forward
+        while back < k and along[k] - along[back + 1] >= half:
+            back += 1
+        ahead = max(ahead, k)
+        while ahead < n - 1 and along[ahead] - along[k] < half:
+            ahead += 1
+        first = back
+        last = ahead
+        if first == last:
+            # the ends of the track, use the neighbouring fix
+            first = max(k - 1, 0)
+            last = min(k + 1, n - 1)
+        dx, dy = delta(first, last)
+        headings.append(math.degrees(math.atan2(dx, dy)) % 360.0)
+    return [headings[i] for i in fixIndex]
@@ -0,0 +1,122 @@
+#name:          metrics
+#created:       October 2026
+#description:   optional timers and counters for each file and stage of a SonarCoverage run, written as JSON lines
+#notes:         each line is a JSON object with an "event" of file, save or run.  File events hold the read time and, for each stage, its compute and merge times and counters
+#               when metrics are not requested, a NullMetrics is used so the pipeline does not need to test for it
+#               the lines can be loaded into a spreadsheet or pandas, e.g. pandas.read_json("metrics.jsonl", lines=True)
+
+#DONE
+# added addTimes, so the timers of a file computed in a worker process can be added to the file record in the main process
+#initial implementation
+
+import json
+import sys
+import time
+
+class Metrics:
+    """collect timers and counters, and write them as JSON lines to a file, or stdout if the file name is '-'.  If the file name is None, they are only collected"""
+    def __init__(self, fileName):
+        if fileName is None:
+            self.output = None
+        elif fileName == '-':
+            self.output = sys.stdout
+        else:
+            self.output = open(fileName, 'w')
+        self.startTime = time.perf_counter()
+        self.files = 0
+        self.pings = 0
+        self.record = None
+
+    def startFile(self, filename):
+        self.record = {'event': 'file', 'file': filename, 'cached': False, 'read': 0.0, 'pings': 0, 'stages': {}}
+        self.fileStart = time.perf_counter()
+
+    def timer(self, name, stage=None):
+        """a context manager which adds the elapsed time to the current file record, either for the file or one of its stages"""
+        if stage is None:
+            return Timer(self.record, name)
+        return Timer(self.record['stages'].setdefault(stage, {}), name)
+
+    def count(self, stage, counters):
+        self.record['stages'].setdefault(stage, {}).update(counters)
+
+    def addTimes(self, record, seconds):
+        """add the timers of a file record made elsewhere, eg by a worker process, to the current file.  seconds is the time the file took there"""
+        self.record['read'] += record['read']
+        for stage, timers in record['stages'].items():
+            stageRecord = self.record['stages'].setdefault(stage, {})
+            for name, value in timers.items():
+                stageRecord[name] = stageRecord.get(name, 0.0) + value
+        self.fileStart -= seconds
+
+    def endFile(self, pings, cached):
+        seconds = time.perf_counter() - self.fileStart
+        self.record['pings'] = pings
+        self.record['cached'] = cached
+        self.record['seconds'] = seconds
+        self.record['pingsPerSecond'] = pings / max(seconds, 1e-9)
+        self.files += 1
+        self.pings += pings
+        self.emit(self.record)
+        self.record = None
+
+    def save(self, stage, seconds):
+        self.emit({'event': 'save', 'stage': stage, 'seconds': seconds})
+
+    def close(self):
+        seconds = time.perf_counter() - self.startTime
+        self.emit({'event': 'run', 'files': self.files, 'pings': self.pings, 'seconds': seconds, 'pingsPerSecond': self.pings / max(seconds, 1e-9)})
+        if self.output is not None and self.output is not sys.stdout:
+            self.output.close()
+
+    def emit(self, record):
+        if self.output is None:
+            return
+        self.output.write(json.dumps(record) + "\n")
+        self.output.flush()
+
+class Timer:
+    """add the elapsed time of a block to a key in a dictionary"""
+    def __init__(self, record, name):
+        self.record = record
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.record[self.name] = self.record.get(self.name, 0.0) + time.perf_counter() - self.start
+        return False
+
+class NullMetrics:
+    """does nothing, so the pipeline can always be instrumented"""
+    def startFile(self, filename):
+        return
+
+    def timer(self, name, stage=None):
+        return NULLTIMER
+
+    def count(self, stage, counters):
+        return
+
+    def addTimes(self, record, seconds):
+        return
+
+    def endFile(self, pings, cached):
+        return
+
+    def save(self, stage, seconds):
+        return
+
+    def close(self):
+        return
+
+class NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+NULLTIMER = NullTimer()
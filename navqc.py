@@ -0,0 +1,134 @@
+#name:          navqc
+#created:       October 2026
+#description:   quality control of the navigation and altitude of a track before the polygon geometry is computed
+#notes:         bad fixes and duplicated positions create self intersecting polygons, so they are removed before the geometry is computed
+#               fixes which imply a speed above the threshold from the last good fix are rejected.  If too many fixes in a row are rejected, the last good fix was probably
+#               the bad one, so the track is re-anchored on the current fix
+#               repeated positions (the navigation updating slower than the pings) are interpolated in time between the fixes on either side.  This is done before the
+#               speed check, as the jump at the end of a run of repeated positions looks like a speed spike
+#               altitude spikes are found by comparing each altitude against a rolling median of a fixed window, which is kept as a sorted list, so each step is a binary search
+#               every check is a single pass over the arrays
+#               some systems record the ping time to the whole second, so several pings share a time.  The resolution of the times is found from the data, and the
+#               interval between two fixes is never taken as less than it, so pings in the same second are not rejected as speed spikes
+
+#DONE
+#initial implementation
+
+import bisect
+import math
+
+MAXIMUMSPEED = 10.0 # metres per second.  Fixes implying a faster speed are rejected
+MAXIMUMREJECTS = 10 # consecutive rejected fixes before the track is re-anchored
+MINIMUMINTERVAL = 0.01 # seconds, the finest resolution of the ping time
+MEDIANWINDOW = 11 # pings in the rolling median of the altitude
+SPIKETHRESHOLD = 5.0 # metres.  Altitudes further than this, and SPIKEFRACTION of the median, from the rolling median are spikes
+SPIKEFRACTION = 0.2
+
+def metres(geographic):
+    """a function to compute the distance in metres between two positions"""
+    if geographic:
+        def distance(x0, y0, x1, y1):
+            return math.hypot((x1 - x0) * 111320.0 * math.cos(math.radians((y0 + y1) * 0.5)), (y1 - y0) * 110574.0)
+    else:
+        def distance(x0, y0, x1, y1):
+            return math.hypot(x1 - x0, y1 - y0)
+    return distance
+
+def alongTrack(eastings, northings, geographic):
+    """the distance in metres along the track of each ping"""
+    distance = metres(geographic)
+    along = []
+    total = 0.0
+    lastX = eastings[0] if len(eastings) > 0 else 0.0
+    lastY = northings[0] if len(northings) > 0 else 0.0
+    for x, y in zip(eastings, northings):
+        total += distance(lastX, lastY, x, y)
+        along.append(total)
+        lastX = x
+        lastY = y
+    return along
+
+def timeResolution(times):
+    """the resolution of the ping times, MINIMUMINTERVAL if any time has hundredths of a second, or 1 second if they are all whole seconds"""
+    for t in times:
+        if t is not None and abs(t - round(t)) > MINIMUMINTERVAL * 0.5:
+            return MINIMUMINTERVAL
+    return 1.0
+
+def findSpeedSpikes(times, eastings, northings, geographic, maximumSpeed=MAXIMUMSPEED):
+    """flag the fixes which imply a speed above maximumSpeed from the last good fix.  Pings without a time are kept.  Returns a list of True for good fixes"""
+    distance = metres(geographic)
+    good = []
+    if len(eastings) == 0:
+        return good
+    minimumInterval = timeResolution(times)
+    lastTime = times[0]
+    lastX = eastings[0]
+    lastY = northings[0]
+    rejects = 0
+    for t, x, y in zip(times, eastings, northings):
+        # the speed cannot be checked if either ping has no time
+        if t is not None and lastTime is not None and distance(lastX, lastY, x, y) > maximumSpeed * max(abs(t - lastTime), minimumInterval) and rejects < MAXIMUMREJECTS:
+            good.append(False)
+            rejects += 1
+            continue
+        good.append(True)
+        rejects = 0
+        lastTime = t
+        lastX = x
+        lastY = y
+    return good
+
+def interpolateDuplicates(times, eastings, northings):
+    """replace runs of repeated positions by interpolating in time between the first ping of the run and the next new fix.  Returns the new positions and the number of pings moved"""
+    n = len(eastings)
+    xs = list(eastings)
+    ys = list(northings)
+    count = 0
+    start = 0
+    for i in range(1, n + 1):
+        if i < n and eastings[i] == eastings[start] and northings[i] == northings[start]:
+            continue
+        # pings start to i - 1 share a position.  The run at the end of the file has no next fix, so it is left alone
+        if i - start > 1 and i < n:
+            t0 = times[start]
+            t1 = times[i]
+            for j in range(start + 1, i):
+                if t0 is not None and t1 is not None and times[j] is not None and t1 > t0:
+                    f = (times[j] - t0) / (t1 - t0)
+                else:
+                    f = (j - start) / float(i - start)
+                xs[j] = eastings[start] + ((eastings[i] - eastings[start]) * f)
+                ys[j] = northings[start] + ((northings[i] - northings[start]) * f)
+                count += 1
+        start = i
+    return xs, ys, count
+
+def rollingMedian(values, window=MEDIANWINDOW):
+    """the median of a centred window around each value.  The window is kept sorted, so each step is an insert and a remove"""
+    n = len(values)
+    half = window // 2
+    result = []
+    ordered = sorted(values[:min(half, n)])
+    for i in range(n):
+        # add the value entering the window, and drop the one leaving it
+        if i + half < n:
+            bisect.insort(ordered, values[i + half])
+        if i - half - 1 >= 0:
+            del ordered[bisect.bisect_left(ordered, values[i - half - 1])]
+        result.append(ordered[len(ordered) // 2])
+    return result
+
+def findAltitudeSpikes(altitudes, window=MEDIANWINDOW, threshold=SPIKETHRESHOLD, fraction=SPIKEFRACTION):
+    """replace altitude spikes with the rolling median.  Returns the new altitudes and the number of spikes"""
+    medians = rollingMedian(altitudes, window)
+    result = []
+    count = 0
+    for altitude, median in zip(altitudes, medians):
+        difference = abs(altitude - median)
+        if difference > threshold and difference > fraction * abs(median):
+            result.append(median)
+            count += 1
+        else:
+            result.append(altitude)
+    return result, count
@@ -0,0 +1,58 @@
+#name:          npyfile
+#created:       October 2026
+#description:   read and write typed arrays as NumPy .npy files using only the stdlib, so analysts can load or memory map them with numpy.load(fileName, mmap_mode='r')
+#notes:         a .npy file is a magic string, a version, a header length and a python dict literal describing the array, padded so the data starts on a 64 byte
+#               boundary, then the raw little endian values.  Version 1.0 is written, which every numpy can read
+#               the arrays are python array.array objects, which hold the values packed, so a column of a million doubles is 8 MB rather than a list of floats
+
+#DONE
+#initial implementation
+
+import array
+import ast
+import struct
+import sys
+
+MAGIC = b'\x93NUMPY'
+ALIGNMENT = 64
+KINDS = {'b': 'i', 'B': 'u', 'h': 'i', 'H': 'u', 'i': 'i', 'I': 'u', 'l': 'i', 'L': 'u', 'q': 'i', 'Q': 'u', 'f': 'f', 'd': 'f'}
+
+def descr(values):
+    """the numpy dtype string of an array.array, eg '<f8'"""
+    return '<%s%d' % (KINDS[values.typecode], values.itemsize)
+
+def writeNPY(fileName, values):
+    """write an array.array as a one dimensional .npy file"""
+    header = "{'descr': '%s', 'fortran_order': False, 'shape': (%d,), }" % (descr(values), len(values))
+    # pad the header with spaces and a newline, so the data is aligned
+    padding = ALIGNMENT - ((len(MAGIC) + 4 + len(header) + 1) % ALIGNMENT)
+    header = (header + (' ' * (padding % ALIGNMENT)) + '\n').encode('latin1')
+    if sys.byteorder == 'big':
+        values = array.array(values.typecode, values)
+        values.byteswap()
+    with open(fileName, 'wb') as f:
+        f.write(MAGIC + b'\x01\x00' + struct.pack('<H', len(header)))
+        f.write(header)
+        values.tofile(f)
+
+def readNPY(fileName):
+    """read a one dimensional .npy file written by writeNPY into an array.array"""
+    with open(fileName, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("not a .npy file: %s" % (fileName))
+        major, minor = struct.unpack('<BB', f.read(2))
+        if major == 1:
+            headerLength = struct.unpack('<H', f.read(2))[0]
+        else:
+            headerLength = struct.unpack('<L', f.read(4))[0]
+        header = ast.literal_eval(f.read(headerLength).decode('latin1'))
+        for typecode, kind in KINDS.items():
+            values = array.array(typecode)
+            if header['descr'] == descr(values):
+                break
+        else:
+            raise ValueError("unsupported dtype %s in %s" % (header['descr'], fileName))
+        values.frombytes(f.read())
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
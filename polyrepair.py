@@ -0,0 +1,102 @@
+#name:          polyrepair
+#created:       October 2026
+#description:   remove the loops which form in the offset lines either side of the track on tight turns, so the polygons do not bow tie
+#notes:         on a turn tighter than the offset range, the offset line on the inside of the turn folds back on itself and makes a small loop (a swallowtail)
+#               self intersections are found with a sweep along the longer axis of the line.  Segments are sorted by their start along the axis, and each is only tested
+#               against the active segments which overlap it, so a line which does not fold back is O(n log n)
+#               a loop is removed by moving all its vertices onto the crossing point, so the number of vertices is unchanged and each left vertex still pairs with its right vertex
+#               only loops smaller than a maximum size are removed, so a track which crosses its own path further along the line is not cut short
+
+#DONE
+#initial implementation
+
+import heapq
+
+MAXIMUMPASSES = 5 # loops are removed in passes, as removing one loop can expose another
+LOOPFACTOR = 4.0 # loops larger than this multiple of the largest offset range are real crossings of the track, not loops
+
+def repairLine(points, maximumSize):
+    """move the vertices of each small loop in a line onto the point where the line crosses itself.  points is a list of [x, y], and is modified in place.  Returns the number of loops removed"""
+    removed = 0
+    for p in range(MAXIMUMPASSES):
+        # drop repeated vertices, which come from loops already removed, remembering where each came from
+        compact = []
+        index = []
+        for i, pt in enumerate(points):
+            if len(compact) == 0 or pt[0] != compact[-1][0] or pt[1] != compact[-1][1]:
+                compact.append(pt)
+                index.append(i)
+        loops = selectLoops(compact, findCrossings(compact), maximumSize)
+        if len(loops) == 0:
+            break
+        for first, last, crossing in loops:
+            # vertices first + 1 to last of the compact line form the loop.  Move every original vertex in that range onto the crossing
+            end = index[last + 1] if last + 1 < len(index) else len(points)
+            for i in range(index[first + 1], end):
+                points[i] = [crossing[0], crossing[1]]
+        removed += len(loops)
+    return removed
+
+def findCrossings(points):
+    """find where segments which are not neighbours cross.  Returns a list of (first, last, point) where first < last are segment indices"""
+    n = len(points) - 1
+    if n < 3:
+        return []
+    xs = [pt[0] for pt in points]
+    ys = [pt[1] for pt in points]
+    # sweep along the longer axis, so a straight line has few active segments
+    if max(ys) - min(ys) > max(xs) - min(xs):
+        xs, ys = ys, xs
+    order = sorted(range(n), key=lambda s: min(xs[s], xs[s + 1]))
+    active = []
+    crossings = []
+    for s in order:
+        x0 = xs[s]
+        y0 = ys[s]
+        x1 = xs[s + 1]
+        y1 = ys[s + 1]
+        start = min(x0, x1)
+        # drop the segments which end before this one starts
+        while len(active) > 0 and active[0][0] < start:
+            heapq.heappop(active)
+        lowY = min(y0, y1)
+        highY = max(y0, y1)
+        for end, t in active:
+            if abs(s - t) < 2:
+                continue
+            x2 = xs[t]
+            y2 = ys[t]
+            x3 = xs[t + 1]
+            y3 = ys[t + 1]
+            if max(y2, y3) < lowY or min(y2, y3) > highY:
+                continue
+            d1x = x1 - x0
+            d1y = y1 - y0
+            d2x = x3 - x2
+            d2y = y3 - y2
+            den = d1x * d2y - d1y * d2x
+            if den == 0:
+                continue
+            a = ((x2 - x0) * d2y - (y2 - y0) * d2x) / den
+            b = ((x2 - x0) * d1y - (y2 - y0) * d1x) / den
+            if 0 <= a <= 1 and 0 <= b <= 1:
+                point = [points[s][0] + a * (points[s + 1][0] - points[s][0]), points[s][1] + a * (points[s + 1][1] - points[s][1])]
+                crossings.append((min(s, t), max(s, t), point))
+        heapq.heappush(active, (max(x0, x1), s))
+    return crossings
+
+def selectLoops(points, crossings, maximumSize):
+    """choose the loops to remove.  The outermost loop starting at each segment is taken, and loops which start inside a loop already taken are left for the next pass"""
+    loops = []
+    end = -1
+    for first, last, crossing in sorted(crossings, key=lambda c: (c[0], -c[1])):
+        if first <= end:
+            continue
+        loop = points[first + 1:last + 1]
+        xs = [pt[0] for pt in loop]
+        ys = [pt[1] for pt in loop]
+        if max(xs) - min(xs) > maximumSize or max(ys) - min(ys) > maximumSize:
+            continue
+        loops.append((first, last, crossing))
+        end = last
+    return loops
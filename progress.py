@@ -0,0 +1,96 @@
+#name:          progress
+#created:       October 2026
+#description:   time based progress reporting while reading XTF files, showing the bytes read against the file size, the rate and an estimated time to completion
+#notes:         the reading loop only compares a ping counter against the next check returned by the reporter, so the cost per ping is a single integer comparison
+#               the clock is read every CHECKEVERY pings, and a line is only written once the interval has passed
+#               NullProgress never asks to be checked, so when progress is disabled the loop does no work at all
+#               lines can be printed to the console, or routed to the python logging module so they can be filtered or written to a log file
+#               code which is not passed a reporter, such as the stages saving their outputs and the XTF reader, calls message(), which goes to the reporter from createProgress
+
+#DONE
+#initial implementation
+
+import logging
+import sys
+import time
+
+CHECKEVERY = 100 # number of pings between reads of the clock
+INTERVAL = 5.0 # seconds between progress lines
+
+class ProgressReporter:
+    """write progress lines to the console, or to a logger, at most once per interval"""
+    def __init__(self, interval=INTERVAL, logger=None):
+        self.interval = interval
+        self.logger = logger
+        self.fileName = ""
+        self.fileSize = 0
+
+    def message(self, text):
+        if self.logger is None:
+            print (text)
+        else:
+            self.logger.info(text)
+
+    def start(self, fileName, fileSize):
+        """start reading a file.  Returns the ping count at which update should next be called"""
+        self.fileName = fileName
+        self.fileSize = fileSize
+        self.startTime = time.perf_counter()
+        self.lastReport = self.startTime
+        self.message("Opening file: %s (%.1f MB)" % (fileName, fileSize / 1048576.0))
+        return CHECKEVERY
+
+    def update(self, position, count):
+        """report progress if the interval has passed since the last report.  Returns the ping count at which update should next be called"""
+        now = time.perf_counter()
+        if now - self.lastReport >= self.interval:
+            self.lastReport = now
+            elapsed = now - self.startTime
+            rate = position / max(elapsed, 1e-9)
+            eta = (self.fileSize - position) / max(rate, 1e-9)
+            self.message("%s: %5.1f%% %.1f of %.1f MB, %d pings, %.1f MB/s, ETA %s" % (self.fileName, 100.0 * position / max(self.fileSize, 1), position / 1048576.0, self.fileSize / 1048576.0, count, rate / 1048576.0, formatSeconds(eta)))
+        return count + CHECKEVERY
+
+    def finish(self, count):
+        elapsed = time.perf_counter() - self.startTime
+        self.message("Complete reading XTF file: %d pings in %.1f seconds" % (count, elapsed))
+
+class NullProgress:
+    """reports nothing, and never asks to be updated"""
+    def message(self, text):
+        return
+
+    def start(self, fileName, fileSize):
+        return sys.maxsize
+
+    def update(self, position, count):
+        return sys.maxsize
+
+    def finish(self, count):
+        return
+
+def formatSeconds(seconds):
+    seconds = int(seconds + 0.5)
+    return "%02d:%02d:%02d" % (seconds // 3600, (seconds // 60) % 60, seconds % 60)
+
+def createProgress(mode='console', interval=INTERVAL):
+    """create a progress reporter.  mode is console, log (python logging) or none.  It also receives the messages sent to message()"""
+    global REPORTER
+    if mode == 'none':
+        REPORTER = NullProgress()
+    elif mode == 'log':
+        logger = logging.getLogger('SonarCoverage')
+        if not logging.getLogger().handlers:
+            logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+        logger.setLevel(logging.INFO)
+        REPORTER = ProgressReporter(interval, logger)
+    else:
+        REPORTER = ProgressReporter(interval)
+    return REPORTER
+
+# the reporter of message().  Messages go to the console until createProgress is called
+REPORTER = ProgressReporter()
+
+def message(text):
+    """report a message to the reporter chosen with createProgress"""
+    REPORTER.message(text)
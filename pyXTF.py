@@ -13,162 +13,330 @@
 # char = 1 byte = "c"
 
 #DONE
+# added scanPackets, which walks the common packet headers and seeks past the data, so the packets of a file can be counted and indexed without decoding them.  Added XTFPINGHEADER.time()
+# added PrefetchFile, a background thread which reads the file ahead in large blocks into a bounded queue while the caller decodes.  XTFReader(fileName, prefetch=True) uses it
+# fixed the file header layout, ProjectionType and SpheroidType are text, so the fields after them are no longer shifted.  Added NumberOfEchoStrengthChannels
+# added XTFATTITUDEDATA to decode attitude packets (type 3)
+# added readPacket to dispatch on the packet type in the common header, decoding the packets the caller wants and seeking past the rest
+# ping and channel headers keep the unpacked tuple in __slots__ and look up fields lazily.  The record layouts are compiled once at module level
 #initial implementation
 
+import calendar
 import pprint
+import queue
 import struct
 import os.path
+import threading
+import progress
+
+# the record layouts are compiled once, rather than for every record
+XTFPingHeader_fmt = '=h2b3hLh6bh2L2fL21f2d2h 4b2f2d4h10flfl4b2hB11b'
+XTFPingHeader_len = struct.calcsize(XTFPingHeader_fmt)
+XTFPingHeader_unpack = struct.Struct(XTFPingHeader_fmt).unpack_from
+
+XTFPingChanHeader_fmt = '=2h5f5hLh2bLhf2bfh4b'
+XTFPingChanHeader_len = struct.calcsize(XTFPingChanHeader_fmt)
+XTFPingChanHeader_unpack = struct.Struct(XTFPingChanHeader_fmt).unpack_from
+
+XTFChanInfo_fmt = '=bb3hl16s11fhb53s'
+XTFChanInfo_len = struct.calcsize(XTFChanInfo_fmt)
+XTFChanInfo_unpack = struct.Struct(XTFChanInfo_fmt).unpack_from
+
+XTFFileHdr_fmt = '=bb8s8s16sh64s64s3hbbhbbHf12s10sl12f'
+XTFFileHdr_len = struct.calcsize(XTFFileHdr_fmt)
+XTFFileHdr_unpack = struct.Struct(XTFFileHdr_fmt).unpack_from
+
+# every packet starts with the same 14 byte header: MagicNumber, HeaderType, SubChannelNumber, NumChansToFollow, Reserved1[2], NumBytesThisRecord
+XTFPacketHeader_fmt = '=hBBh2hL'
+XTFPacketHeader_len = struct.calcsize(XTFPacketHeader_fmt)
+XTFPacketHeader_unpack = struct.Struct(XTFPacketHeader_fmt).unpack_from
+XTFMagicNumber = -1330 # 0xFACE, read as a signed XTFWORD
+XTFMagicBytes = b'\xce\xfa'
+
+# packet types, from the HeaderType field of the common header
+XTF_HEADER_SONAR = 0
+XTF_HEADER_NOTES = 1
+XTF_HEADER_BATHY = 2
+XTF_HEADER_ATTITUDE = 3
+XTF_HEADER_FORWARD = 4
+XTF_HEADER_ELAC = 5
+XTF_HEADER_RAW_SERIAL = 6
+XTF_HEADER_EMBED_HEAD = 7
+XTF_HEADER_HIDDEN_SONAR = 8
+XTF_HEADER_SEAVIEW_PROCESSED_BATHY = 9
+XTF_HEADER_SEAVIEW_DEPTHS = 10
+XTF_HEADER_RSVD_HIGHSPEED_SENSOR = 11
+XTF_HEADER_ECHOSTRENGTH = 12
+XTF_HEADER_GEOREC = 13
+XTF_HEADER_KLEIN_RAW_BATHY = 14
+XTF_HEADER_HIGHSPEED_SENSOR2 = 15
+XTF_HEADER_ELAC_XSE = 16
+XTF_HEADER_BATHY_XYZA = 17
+XTF_HEADER_K5000_BATHY_IQ = 18
+XTF_HEADER_BATHY_SNIPPET = 19
+XTF_HEADER_GPS = 20
+XTF_HEADER_STAT = 21
+XTF_HEADER_SINGLEBEAM = 22
+XTF_HEADER_GYRO = 23
+XTF_HEADER_TRACKPOINT = 24
+XTF_HEADER_MULTIBEAM = 25
+XTF_HEADER_Q_SINGLEBEAM = 26
+XTF_HEADER_Q_MULTITARGET = 27
+XTF_HEADER_Q_MULTIBEAM = 28
+XTF_HEADER_TIME = 50
+XTF_HEADER_BENTHOS_CAATI_SARA = 60
+XTF_HEADER_7125 = 61
+XTF_HEADER_7125_SNIPPET = 62
+XTF_HEADER_QINSY_R2SONIC_BATHY = 65
+XTF_HEADER_QINSY_R2SONIC_FTS = 66
+XTF_HEADER_R2SONIC_BATHY = 68
+XTF_HEADER_R2SONIC_FTS = 69
+XTF_HEADER_CODA_ECHOSCOPE_DATA = 70
+XTF_HEADER_CODA_ECHOSCOPE_CONFIG = 71
+XTF_HEADER_CODA_ECHOSCOPE_IMAGE = 72
+XTF_HEADER_EDGETECH_4600 = 73
+XTF_HEADER_RESON_7018_WATERCOLUMN = 78
+XTF_HEADER_R2SONIC_WATERCOLUMN = 79
+XTF_HEADER_USERDEFINED = 200
+XTF_HEADER_CUSTOM = 199
+XTF_HEADER_POSITION = 107
+
+XTFAttitudeData_fmt = '=hBBh2hL2L2L4fLfh5BhB'
+XTFAttitudeData_len = struct.calcsize(XTFAttitudeData_fmt)
+XTFAttitudeData_unpack = struct.Struct(XTFAttitudeData_fmt).unpack_from
+
+# the names of the fields in the ping and channel header tuples.  Where a name is repeated, the last one is used, as it was when each field was an attribute
+XTFPingHeader_fields = (
+    'MagicNumber',                       # 0
+    'HeaderType',                        # 1
+    'SubChannelNumber',                  # 2
+    'NumChansToFollow',                  # 3
+    'Reserved1',                         # 4
+    'Reserved2',                         # 5
+    'NumBytesThisRecord',                # 6
+    'Year',                              # 7
+    'Month',                             # 8
+    'Day',                               # 9
+    'Hour',                              # 10
+    'Minute',                            # 11
+    'Second',                            # 12
+    'HSeconds',                          # 13
+    'JulianDays',                        # 14
+    'EventNumber',                       # 15
+    'PingNumber',                        # 16
+    'SoundVelocity',                     # 17
+    'OceanTide',                         # 18
+    'Reserved2',                         # 19
+    'ConductivityFreq',                  # 20
+    'TemperatureFreq',                   # 21
+    'PressureFreq',                      # 22
+    'PressureTemp',                      # 23
+    'Conductivity',                      # 24
+    'WaterTemperature',                  # 25
+    'Pressure',                          # 26
+    'ComputedSoundVelocity',             # 27
+    'MagX',                              # 28
+    'MagY',                              # 29
+    'MagZ',                              # 30
+    'AuxVal1',                           # 31
+    'AuxVal2',                           # 32
+    'AuxVal3',                           # 33
+    'AuxVal4',                           # 34
+    'AuxVal5',                           # 35
+    'AuxVal6',                           # 36
+    'SpeedLog',                          # 37
+    'Turbidity',                         # 38
+    'ShipSpeed',                         # 39
+    'ShipGyro',                          # 40
+    'ShipYcoordinate',                   # 41
+    'ShipXcoordinate',                   # 42
+    'ShipAltitiude',                     # 43
+    'ShipDepth',                         # 44
+    'FixTimeHour',                       # 45
+    'FixTimeMinute',                     # 46
+    'FixTimeSecond',                     # 47
+    'FixTimeHsecond',                    # 48
+    'SensorSpeed',                       # 49
+    'KP',                                # 50
+    'SensorYcoordinate',                 # 51
+    'SensorXcoordinate',                 # 52
+    'SonarStatus',                       # 53
+    'RangeToTowFish',                    # 54
+    'BearingToTowFish',                  # 55
+    'CableOut',                          # 56
+    'Layback',                           # 57
+    'CableTension',                      # 58
+    'SensorDepth',                       # 59
+    'SensorPrimaryAltitude',             # 60
+    'SensorAuxAltitude',                 # 61
+    'SensorPitch',                       # 62
+    'SensorRoll',                        # 63
+    'SensorHeading',                     # 64
+    'Heave',                             # 65
+    'Yaw',                               # 66
+    'AttitudeTimeTag',                   # 67
+    'DOT',                               # 68
+    'NavFixMilliseconds',                # 69
+    'ComputerClockHour',                 # 70
+    'ComputerClockMinute',               # 71
+    'ComputerClockSecond',               # 72
+    'ComputerClockHSecond',              # 73
+    'FishPositionDeltaX',                # 74
+    'FishPositionDeltaY',                # 75
+    'FishPositionErrorCode',             # 76
+    'ReservedSpace2',                    # 77
+    )
+
+XTFPingChanHeader_fields = (
+    'ChannelNumber',                     # 0
+    'DownsampleMethod',                  # 1
+    'SlantRange',                        # 2
+    'GroundRange',                       # 3
+    'TimeDelay',                         # 4
+    'TimeDuration',                      # 5
+    'SecondsPerPing',                    # 6
+    'ProcessingFlags',                   # 7
+    'Frequency',                         # 8
+    'InitialGainCode',                   # 9
+    'GainCode',                          # 10
+    'BandWidth',                         # 11
+    'ContactNumber',                     # 12
+    'ContactClassification',             # 13
+    'ContactSubNumber',                  # 14
+    'ContactType',                       # 15
+    'NumSamples',                        # 16
+    'MillivoltScale',                    # 17
+    'ContactTimeOffTrack',               # 18
+    'ContactCloseNumber',                # 19
+    'Reserved2',                         # 20
+    'FixedVSOP',                         # 21
+    'Weight',                            # 22
+    'ReservedSpace1',                    # 23
+    'ReservedSpace2',                    # 24
+    'ReservedSpace3',                    # 25
+    'ReservedSpace4',                    # 26
+    )
+
+XTFAttitudeData_fields = (
+    'MagicNumber',                       # 0
+    'HeaderType',                        # 1
+    'SubChannelNumber',                  # 2
+    'NumChansToFollow',                  # 3
+    'Reserved1',                         # 4
+    'Reserved1b',                        # 5
+    'NumBytesThisRecord',                # 6
+    'Reserved2',                         # 7
+    'Reserved2b',                        # 8
+    'EpochMicroseconds',                 # 9
+    'SourceEpoch',                       # 10
+    'Pitch',                             # 11
+    'Roll',                              # 12
+    'Heave',                             # 13
+    'Yaw',                               # 14
+    'TimeTag',                           # 15
+    'Heading',                           # 16
+    'Year',                              # 17
+    'Month',                             # 18
+    'Day',                               # 19
+    'Hour',                              # 20
+    'Minutes',                           # 21
+    'Seconds',                           # 22
+    'Milliseconds',                      # 23
+    'Reserved3',                         # 24
+    )
+
+def isValidDate(year, month, day):
+    """a date is often left as zero when the clock was not set"""
+    return year > 0 and 1 <= month <= 12 and 1 <= day <= 31
+
+def fieldProperty(index):
+    """a read only attribute which looks up one field of the unpacked record"""
+    return property(lambda self: self.s[index])
 
 class XTFPINGHEADER:
+    """a sonar ping header and its channels.  The header is kept as the unpacked tuple, and each field is only looked up when it is used"""
+    __slots__ = ('s', 'pingChannel')
     def __init__(self, fileptr):
-        XTFPingHeader_fmt = '=h2b3hLh6bh2L2fL21f2d2h 4b2f2d4h10flfl4b2hB11b'
-        XTFPingHeader_len = struct.calcsize(XTFPingHeader_fmt)
-        XTFPingHeader_unpack = struct.Struct(XTFPingHeader_fmt).unpack_from
-
-        data = fileptr.read(XTFPingHeader_len)
-        s = XTFPingHeader_unpack(data)
-
-        self.MagicNumber                    = s[0]
-        self.HeaderType                     = s[1]
-        self.SubChannelNumber               = s[2]
-        self.NumChansToFollow               = s[3]
-        self.Reserved1                      = s[4]
-        self.Reserved2                      = s[5]
-        self.NumBytesThisRecord             = s[6]
-        self.Year                           = s[7]
-        self.Month                          = s[8]
-        self.Day                            = s[9]
-        self.Hour                           = s[10]
-        self.Minute                         = s[11]
-        self.Second                         = s[12]
-        self.HSeconds                       = s[13]
-        self.JulianDays                     = s[14]
-        self.EventNumber                    = s[15]
-        self.PingNumber                     = s[16]
-        self.SoundVelocity                  = s[17]
-        self.OceanTide                      = s[18]
-        self.Reserved2                      = s[19]
-        self.ConductivityFreq               = s[20]
-        self.TemperatureFreq                = s[21]
-        self.PressureFreq                   = s[22]
-        self.PressureTemp                   = s[23]
-        self.Conductivity                   = s[24]
-        self.WaterTemperature               = s[25]
-        self.Pressure                       = s[26]
-        self.ComputedSoundVelocity          = s[27]
-        self.MagX                           = s[28]
-        self.MagY                           = s[29]
-        self.MagZ                           = s[30]
-        self.AuxVal1                        = s[31]
-        self.AuxVal2                        = s[32]
-        self.AuxVal3                        = s[33]
-        self.AuxVal4                        = s[34]
-        self.AuxVal5                        = s[35]
-        self.AuxVal6                        = s[36]
-        self.SpeedLog                       = s[37]
-        self.Turbidity                      = s[38]
-        self.ShipSpeed                      = s[39]
-        self.ShipGyro                       = s[40]
-        self.ShipYcoordinate                = s[41]                        
-        self.ShipXcoordinate                = s[42]
-        self.ShipAltitiude                  = s[43]
-        self.ShipDepth                      = s[44]
-        self.FixTimeHour                    = s[45]
-        self.FixTimeMinute                  = s[46]
-        self.FixTimeSecond                  = s[47]
-        self.FixTimeHsecond                 = s[48]
-        self.SensorSpeed                    = s[49]
-        self.KP                             = s[50]
-        self.SensorYcoordinate              = s[51]
-        self.SensorXcoordinate              = s[52]
-        self.SonarStatus                    = s[53]
-        self.RangeToTowFish                 = s[54]
-        self.BearingToTowFish               = s[55]
-        self.CableOut                       = s[56]
-        self.Layback                        = s[57]
-        self.CableTension                   = s[58]
-        self.SensorDepth                    = s[59]
-        self.SensorPrimaryAltitude          = s[60]
-        self.SensorAuxAltitude              = s[61]
-        self.SensorPitch                    = s[62]
-        self.SensorRoll                     = s[63]
-        self.SensorHeading                  = s[64]
-        self.Heave                          = s[65]
-        self.Yaw                            = s[66]
-        self.AttitudeTimeTag                = s[67]
-        self.DOT                            = s[68]
-        self.NavFixMilliseconds             = s[69]
-        self.ComputerClockHour              = s[70]
-        self.ComputerClockMinute            = s[71]
-        self.ComputerClockSecond            = s[72]
-        self.ComputerClockHSecond           = s[73]
-        self.FishPositionDeltaX             = s[74]
-        self.FishPositionDeltaY             = s[75]
-        self.FishPositionErrorCode          = s[76]
-        self.ReservedSpace2                 = s[77]
+        self.s = XTFPingHeader_unpack(fileptr.read(XTFPingHeader_len))
 
-        # now read the chaninfo records.  This is more complex than it needs to be, but for now, read six channels
-        self.pingChannel =[]
-        for i in range(self.NumChansToFollow):
-            ping = XTFPINGCHANHEADER(fileptr)
-            self.pingChannel.append(ping)
+        # now read the channel records
+        self.pingChannel = [XTFPINGCHANHEADER(fileptr) for i in range(self.s[3])]
+
+    def time(self):
+        """the time of the ping in seconds since 1970.  Returns None if the date is not recorded"""
+        s = self.s
+        if not isValidDate(s[7], s[8], s[9]):
+            return None
+        return calendar.timegm((s[7], s[8], s[9], s[10], s[11], s[12], 0, 0, 0)) + (s[13] / 100.0)
+
+    def fields(self):
+        return dict(zip(XTFPingHeader_fields, self.s))
 
     def __str__(self):
-        return (pprint.pformat(vars(self)))        
-                
+        return (pprint.pformat(self.fields()))
+
 class XTFPINGCHANHEADER:
+    """a sonar channel header, followed by its samples.  Each field is only looked up from the unpacked tuple when it is used"""
+    __slots__ = ('s', 'data')
     def __init__(self, fileptr):
-        XTFPingChanHeader_fmt = '=2h5f5hLh2bLhf2bfh4b'
-        XTFPingChanHeader_len = struct.calcsize(XTFPingChanHeader_fmt)
-        XTFPingChanHeader_unpack = struct.Struct(XTFPingChanHeader_fmt).unpack_from
-
-        hdr = fileptr.read(XTFPingChanHeader_len)
-        s = XTFPingChanHeader_unpack(hdr)
-        self.ChannelNumber                    = s[0]
-        self.DownsampleMethod                 = s[1]
-        self.SlantRange                       = s[2]
-        self.GroundRange                      = s[3]
-        self.TimeDelay                        = s[4]
-        self.TimeDuration                     = s[5]
-        self.SecondsPerPing                   = s[6]
-        self.ProcessingFlags                  = s[7]
-        self.Frequency                        = s[8]
-        self.InitialGainCode                  = s[9]
-        self.GainCode                         = s[10]
-        self.BandWidth                        = s[11]
-        self.ContactNumber                    = s[12]
-        self.ContactClassification            = s[13]
-        self.ContactSubNumber                 = s[14]
-        self.ContactType                      = s[15]
-        self.NumSamples                       = s[16]
-        self.MillivoltScale                   = s[17]
-        self.ContactTimeOffTrack              = s[18]
-        self.ContactCloseNumber               = s[19]
-        self.Reserved2                        = s[20]
-        self.FixedVSOP                        = s[21]
-        self.Weight                           = s[22]
-        self.ReservedSpace1                   = s[23]
-        self.ReservedSpace2                   = s[24]
-        self.ReservedSpace3                   = s[25]
-        self.ReservedSpace4                   = s[26]
-        
-        #now read the sonar data
-        XTFdata_fmt = '=' + str(self.NumSamples) + 'h'
-        XTFdata_len = struct.calcsize(XTFdata_fmt)
-        XTFdata_unpack = struct.Struct(XTFdata_fmt).unpack_from
-        self.data = fileptr.read(XTFdata_len)
+        s = XTFPingChanHeader_unpack(fileptr.read(XTFPingChanHeader_len))
+        self.s = s
+        #now read the sonar data, 2 bytes per sample
+        self.data = fileptr.read(s[16] * 2)
+
+    def fields(self):
+        return dict(zip(XTFPingChanHeader_fields, self.s))
 
-        return
-        
     def __str__(self):
-        return (pprint.pformat(vars(self)))        
-        
-class XTFCHANINFO:
+        return (pprint.pformat(self.fields()))
+
+class XTFATTITUDEDATA:
+    """an attitude packet, usually recorded at a higher rate than the pings"""
+    __slots__ = ('s',)
     def __init__(self, fileptr):
-        XTFChanInfo_fmt = '=bb3hl16s11fhb53s'
-        XTFChanInfo_len = struct.calcsize(XTFChanInfo_fmt)
-        XTFChanInfo_unpack = struct.Struct(XTFChanInfo_fmt).unpack_from
+        self.s = XTFAttitudeData_unpack(fileptr.read(XTFAttitudeData_len))
+
+    def time(self):
+        """the time of the record in seconds since 1970.  Returns None if the date is not recorded"""
+        s = self.s
+        if not isValidDate(s[17], s[18], s[19]):
+            return None
+        return calendar.timegm((s[17], s[18], s[19], s[20], s[21], s[22], 0, 0, 0)) + (s[23] / 1000.0)
+
+    def fields(self):
+        return dict(zip(XTFAttitudeData_fields, self.s))
 
+    def __str__(self):
+        return (pprint.pformat(self.fields()))
+
+for index, name in enumerate(XTFPingHeader_fields):
+    setattr(XTFPINGHEADER, name, fieldProperty(index))
+for index, name in enumerate(XTFPingChanHeader_fields):
+    setattr(XTFPINGCHANHEADER, name, fieldProperty(index))
+for index, name in enumerate(XTFAttitudeData_fields):
+    setattr(XTFATTITUDEDATA, name, fieldProperty(index))
+
+class XTFPACKET:
+    """a packet which has no decoder, holding the fields of the common header and the raw bytes of the whole packet"""
+    __slots__ = ('HeaderType', 'SubChannelNumber', 'NumChansToFollow', 'NumBytesThisRecord', 'data')
+    def __init__(self, fileptr, header):
+        self.HeaderType = header[1]
+        self.SubChannelNumber = header[2]
+        self.NumChansToFollow = header[3]
+        self.NumBytesThisRecord = header[6]
+        self.data = fileptr.read(header[6])
+
+    def __str__(self):
+        return "XTFPACKET type %d, %d bytes" % (self.HeaderType, self.NumBytesThisRecord)
+
+# the decoder for each packet type.  Each is called with the file positioned at the start of the packet.  Packet types without a decoder are read as an XTFPACKET
+PACKETDECODERS = {
+    XTF_HEADER_SONAR: XTFPINGHEADER,
+    XTF_HEADER_ATTITUDE: XTFATTITUDEDATA,
+    }
+
+class XTFCHANINFO:
+    def __init__(self, fileptr):
         data = fileptr.read(XTFChanInfo_len)
         s = XTFChanInfo_unpack(data)
         self.TypeOfChannel                    = s[0]
@@ -198,10 +366,6 @@ class XTFCHANINFO:
 
 class XTFFILEHDR:
     def __init__(self, fileptr):
-        XTFFileHdr_fmt = '=bb8s8s16sh64s64s3hbbhbbHf12b10bl12f'
-        XTFFileHdr_len = struct.calcsize(XTFFileHdr_fmt)
-        XTFFileHdr_unpack = struct.Struct(XTFFileHdr_fmt).unpack_from
-
         data = fileptr.read(XTFFileHdr_len)
         s = XTFFileHdr_unpack(data)
         self.FileFormat                         = s[0]
@@ -217,25 +381,27 @@ class XTFFILEHDR:
         self.NumberOfBathymetryChannels         = s[10]
         self.NumberOfSnippetChannels            = s[11]
         self.NumberOfForwardLookArrays          = s[12]
-        self.NumberOfInterferometryChannels     = s[13]
-        self.Reserved1                          = s[14]
-        self.Reserved2                          = s[15]
-        self.ReferencePointHeight               = s[16]
-        self.ProjectionType                     = s[17]
-        self.SpheroidType                       = s[18]
-        self.NavigationLatency                  = s[19]
-        self.OriginX                            = s[20]
+        self.NumberOfEchoStrengthChannels       = s[13]
+        self.NumberOfInterferometryChannels     = s[14]
+        self.Reserved1                          = s[15]
+        self.Reserved2                          = s[16]
+        self.ReferencePointHeight               = s[17]
+        # the projection and spheroid are free text, and usually blank
+        self.ProjectionType                     = s[18].decode('ascii', 'ignore').rstrip('\x00').strip()
+        self.SpheroidType                       = s[19].decode('ascii', 'ignore').rstrip('\x00').strip()
+        self.NavigationLatency                  = s[20]
         self.Originy                            = s[21]
-        self.NavoffsetX                         = s[22]
+        self.OriginX                            = s[22]
         self.NavoffsetY                         = s[23]
-        self.NavoffsetZ                         = s[24]
-        self.NavoffsetYaw                       = s[25]
-        self.NavoffsetX                         = s[26]
+        self.NavoffsetX                         = s[24]
+        self.NavoffsetZ                         = s[25]
+        self.NavoffsetYaw                       = s[26]
         self.MRUoffsetY                         = s[27]
-        self.MRUoffsetZ                         = s[28]
-        self.MRUoffsetYaw                       = s[29]
-        self.MRUoffsetPitch                     = s[30]
-        self.MRUoffsetRoll                      = s[31]
+        self.MRUoffsetX                         = s[28]
+        self.MRUoffsetZ                         = s[29]
+        self.MRUoffsetYaw                       = s[30]
+        self.MRUoffsetPitch                     = s[31]
+        self.MRUoffsetRoll                      = s[32]
 
         # now read the chaninfo records.  This is more complex than it needs to be, but for now, read six channels
         self.XTFChanInfo =[]
@@ -246,15 +412,132 @@ class XTFFILEHDR:
     def __str__(self):
         return (pprint.pformat(vars(self)))
     
+PREFETCHBLOCKSIZE = 4 * 1024 * 1024 # bytes read by the prefetch thread at a time
+PREFETCHDEPTH = 4 # blocks the prefetch thread may read ahead of the decoder
+
+class PrefetchFile:
+    """a read only file which a background thread reads ahead in large blocks, so on a slow or network disk the next block is being read while the current one is decoded.
+    It supports the read, seek and tell the reader uses.  Seeking inside the current block, or forward, is served from the blocks already read.  Seeking back before the
+    current block restarts the thread"""
+    def __init__(self, fileName, blockSize=PREFETCHBLOCKSIZE, depth=PREFETCHDEPTH):
+        self.fileName = fileName
+        self.blockSize = blockSize
+        self.depth = depth
+        self.thread = None
+        self.startReading(0)
+
+    def startReading(self, position):
+        self.stopReading()
+        self.queue = queue.Queue(self.depth)
+        self.stopped = threading.Event()
+        self.block = b''
+        self.blockStart = position
+        self.offset = 0
+        self.endOfFile = False
+        self.thread = threading.Thread(target=self.readAhead, args=(position, self.queue, self.stopped), daemon=True)
+        self.thread.start()
+
+    def readAhead(self, position, blocks, stopped):
+        """the background thread.  An empty block marks the end of the file, and an error is passed on to be raised by the decoder"""
+        try:
+            with open(self.fileName, 'rb') as f:
+                f.seek(position)
+                while not stopped.is_set():
+                    data = f.read(self.blockSize)
+                    self.putBlock(data, blocks, stopped)
+                    if len(data) == 0:
+                        return
+        except Exception as e:
+            self.putBlock(e, blocks, stopped)
+
+    def putBlock(self, data, blocks, stopped):
+        """queue a block, or an error, waiting while the queue is full unless the reader is stopped"""
+        while not stopped.is_set():
+            try:
+                blocks.put(data, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def stopReading(self):
+        if self.thread is not None:
+            self.stopped.set()
+            self.thread.join()
+            self.thread = None
+
+    def nextBlock(self):
+        """move on to the next block.  Returns False at the end of the file"""
+        if self.endOfFile:
+            return False
+        data = self.queue.get()
+        if isinstance(data, Exception):
+            raise data
+        self.blockStart += len(self.block)
+        self.block = data
+        self.offset = 0
+        if len(data) == 0:
+            self.endOfFile = True
+            return False
+        return True
+
+    def read(self, size=-1):
+        if size < 0:
+            size = float('inf')
+        # most reads are inside the current block, so are a single slice
+        end = self.offset + size
+        if end <= len(self.block):
+            data = self.block[self.offset:end]
+            self.offset = end
+            return data
+        pieces = []
+        while size > 0:
+            available = len(self.block) - self.offset
+            if available == 0:
+                if not self.nextBlock():
+                    break
+                continue
+            take = min(size, available)
+            pieces.append(self.block[self.offset:self.offset + take])
+            self.offset += take
+            size -= take
+        return b''.join(pieces)
+
+    def tell(self):
+        return self.blockStart + self.offset
+
+    def seek(self, position, whence=0):
+        if whence == 1:
+            position += self.tell()
+        elif whence == 2:
+            position += os.path.getsize(self.fileName)
+        if position < self.blockStart:
+            self.startReading(position)
+            return position
+        while position > self.blockStart + len(self.block):
+            if not self.nextBlock():
+                # past the end of the file
+                self.offset = 0
+                return self.blockStart
+        self.offset = position - self.blockStart
+        return position
+
+    def close(self):
+        self.stopReading()
+
+SONARPACKETS = frozenset([XTF_HEADER_SONAR])
+SONARATTITUDEPACKETS = frozenset([XTF_HEADER_SONAR, XTF_HEADER_ATTITUDE])
+
 class XTFReader:
-    def __init__(self, XTFfileName):
+    def __init__(self, XTFfileName, prefetch=False, blockSize=PREFETCHBLOCKSIZE):
+        """open an XTF file and read its file header.  If prefetch is set, the file is read ahead in blocks by a background thread"""
         if not os.path.isfile(XTFfileName):
-            print ("file not found:", XTFfileName)
+            progress.message("file not found: %s" % (XTFfileName))
         self.fileName = XTFfileName
-        self.fileptr = open(XTFfileName, 'rb')        
-        self.fileSize = self.fileptr.seek(0, 2)
-        # go back to start of file
-        self.fileptr.seek(0, 0)
+        self.fileSize = os.path.getsize(XTFfileName)
+        if prefetch:
+            self.fileptr = PrefetchFile(XTFfileName, blockSize)
+        else:
+            self.fileptr = open(XTFfileName, 'rb')        
                 
         self.XTFFileHdr = XTFFILEHDR(self.fileptr)
             
@@ -266,8 +549,83 @@ class XTFReader:
         return bytesRemaining
                 
     def readPing(self):
-        ping = XTFPINGHEADER(self.fileptr)
-        return ping
+        """read the next sonar ping, skipping any other packets.  Returns None at the end of the file"""
+        return self.readPacket(SONARPACKETS)
+
+    def readPacket(self, wantedTypes=None):
+        """read the next packet whose type is in wantedTypes (or any packet if wantedTypes is None), seeking past the others using the size in their common header.  Returns None at the end of the file"""
+        fileptr = self.fileptr
+        while True:
+            start = fileptr.tell()
+            data = fileptr.read(XTFPacketHeader_len)
+            if len(data) < XTFPacketHeader_len:
+                return None
+            header = XTFPacketHeader_unpack(data)
+            size = header[6]
+            if header[0] != XTFMagicNumber or size < XTFPacketHeader_len:
+                if not self.resync(start + 1):
+                    return None
+                continue
+            end = start + size
+            if end > self.fileSize:
+                # a truncated packet at the end of the file
+                fileptr.seek(self.fileSize)
+                return None
+            packetType = header[1]
+            if wantedTypes is not None and packetType not in wantedTypes:
+                fileptr.seek(end)
+                continue
+
+            fileptr.seek(start)
+            decoder = PACKETDECODERS.get(packetType)
+            if decoder is None:
+                return XTFPACKET(fileptr, header)
+            packet = decoder(fileptr)
+            # the packet may be padded beyond the data we decoded
+            if fileptr.tell() != end:
+                fileptr.seek(end)
+            return packet
+
+    def scanPackets(self):
+        """walk the packets from the current position without decoding them, seeking past the data using the size in their common header.  Yields the offset and
+        common header tuple of each packet.  The caller may seek to an offset to decode a packet, but must seek back to where it was before asking for the next one"""
+        fileptr = self.fileptr
+        while True:
+            start = fileptr.tell()
+            data = fileptr.read(XTFPacketHeader_len)
+            if len(data) < XTFPacketHeader_len:
+                return
+            header = XTFPacketHeader_unpack(data)
+            size = header[6]
+            if header[0] != XTFMagicNumber or size < XTFPacketHeader_len:
+                if not self.resync(start + 1):
+                    return
+                continue
+            end = start + size
+            if end > self.fileSize:
+                # a truncated packet at the end of the file
+                fileptr.seek(self.fileSize)
+                return
+            fileptr.seek(end)
+            yield start, header
+
+    def resync(self, position):
+        """search forward from position for the next magic number, after finding a corrupt packet.  Returns False if there are no more packets"""
+        fileptr = self.fileptr
+        fileptr.seek(position)
+        skipped = 0
+        while True:
+            block = fileptr.read(65536)
+            if len(block) < 2:
+                return False
+            found = block.find(XTFMagicBytes)
+            if found >= 0:
+                fileptr.seek(position + skipped + found)
+                progress.message("skipped %d bytes of corrupt data at offset %d" % (skipped + found + 1, position - 1))
+                return True
+            # keep the last byte, in case the magic number spans two blocks
+            skipped += len(block) - 1
+            fileptr.seek(position + skipped)
     
     def readChannel(self):        
         return XTFPINGCHANHEADER(self.fileptr)
@@ -281,6 +639,8 @@ if __name__ == "__main__":
 
     while r.moreData():
         pingHdr = r.readPing()
+        if pingHdr is None:
+            break
         print (pingHdr.PingNumber,  pingHdr.SensorXcoordinate, pingHdr.SensorYcoordinate)
             
     print("Complete reading XTF file :-)")
\ No newline at end of file
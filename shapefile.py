@@ -909,7 +909,9 @@ class Writer:
                 fieldType = fieldType.upper()
                 size = int(size)
                 if fieldType.upper() == "N":
-                    value = str(value).rjust(size)
+                    # a missing number is left blank, which is null in a dbf
+                    value = "" if value is None else str(value)
+                    value = value.rjust(size)
                 elif fieldType == 'L':
                     value = str(value)[0].upper()
                 else:
@@ -0,0 +1,183 @@
+#name:          survey
+#created:       October 2026
+#description:   a quick survey of a set of XTF files before a batch run: the sonar, channels, nav units, ping count, time span and extents of each file
+#notes:         run as python SonarCoverage.py survey -i "*.xtf"
+#               the file header is decoded, then the packets are walked using the size in their common header without decoding them, so the pings are counted from an
+#               index of their offsets.  Only a sample of the pings (every -sample pings, and always the first and last) are decoded for their time and position, so the
+#               extents are approximate unless -sample 1
+#               bytes which are not part of a packet are counted, so corrupt or truncated files show up.  A file which cannot be read is reported rather than stopping the survey
+#               files are surveyed in parallel in a process pool
+
+#DONE
+#initial implementation
+
+import argparse
+import concurrent.futures
+import csv
+import math
+import os
+import sys
+import time
+from glob import glob
+import pyXTF
+import crs
+
+SAMPLE = 100 # decode every this many pings for the time and extents
+FILEHEADERSIZE = 1024 # the file header and the first 6 channel info records.  Each further block of 1024 bytes holds 8 more
+NAVUNITS = {0: 'grid', 3: 'geographic'}
+COLUMNS = ['file', 'sonar', 'channels', 'navUnits', 'crs', 'pings', 'start', 'end', 'minutes', 'minX', 'minY', 'maxX', 'maxY', 'MB', 'badBytes', 'notes']
+
+def surveyFile(fileName, sample=SAMPLE):
+    """survey one XTF file.  Returns a dictionary of the COLUMNS, with the problems found in notes"""
+    row = {'file': fileName, 'sonar': '', 'channels': 0, 'navUnits': '', 'crs': '', 'pings': 0, 'start': None, 'end': None, 'minutes': 0.0,
+        'minX': None, 'minY': None, 'maxX': None, 'maxY': None, 'MB': 0.0, 'badBytes': 0, 'notes': ''}
+    notes = []
+    try:
+        row['MB'] = os.path.getsize(fileName) / (1024.0 * 1024.0)
+        r = pyXTF.XTFReader(fileName)
+        header = r.XTFFileHdr
+        row['sonar'] = header.SonarName
+        row['channels'] = header.NumberOfSonarChannels
+        row['navUnits'] = NAVUNITS.get(header.NavUnits, str(header.NavUnits))
+
+        channels = header.NumberOfSonarChannels + header.NumberOfBathymetryChannels + header.NumberOfSnippetChannels + header.NumberOfForwardLookArrays + header.NumberOfEchoStrengthChannels + header.NumberOfInterferometryChannels
+        headerSize = FILEHEADERSIZE + (FILEHEADERSIZE * int(math.ceil(max(channels - 6, 0) / 8.0)))
+        r.fileptr.seek(min(headerSize, r.fileSize))
+
+        pings = []
+        packetBytes = 0
+        for offset, packet in r.scanPackets():
+            packetBytes += packet[6]
+            if packet[1] == pyXTF.XTF_HEADER_SONAR:
+                pings.append(offset)
+        r.fileptr.seek(0, os.SEEK_END)
+        row['pings'] = len(pings)
+        row['badBytes'] = r.fileSize - min(headerSize, r.fileSize) - packetBytes
+
+        # decode a sample of the pings, always including the first and last
+        sampled = pings[::max(sample, 1)]
+        if len(pings) > 0 and sampled[-1] != pings[-1]:
+            sampled.append(pings[-1])
+        xs = []
+        ys = []
+        times = []
+        pingChannels = set()
+        for offset in sampled:
+            r.fileptr.seek(offset)
+            ping = pyXTF.XTFPINGHEADER(r.fileptr)
+            xs.append(ping.SensorXcoordinate)
+            ys.append(ping.SensorYcoordinate)
+            if ping.time() is not None:
+                times.append(ping.time())
+            pingChannels.add(ping.NumChansToFollow)
+        r.fileptr.close()
+
+        if len(pings) == 0:
+            notes.append("no pings")
+            row['crs'] = crs.fromXTFHeader(header).name
+        else:
+            row['crs'] = crs.fromXTFHeader(header, xs[0], ys[0]).name
+            if len(times) > 0:
+                row['start'] = times[0]
+                row['end'] = times[-1]
+                row['minutes'] = (times[-1] - times[0]) / 60.0
+                if times[-1] < times[0]:
+                    notes.append("time runs backwards")
+            if len(times) < len(sampled):
+                notes.append("%d of %d sampled pings have no date" % (len(sampled) - len(times), len(sampled)))
+            row['minX'] = min(xs)
+            row['minY'] = min(ys)
+            row['maxX'] = max(xs)
+            row['maxY'] = max(ys)
+            if len(pingChannels) > 1 or header.NumberOfSonarChannels not in pingChannels:
+                notes.append("pings have %s channels" % ("/".join(str(c) for c in sorted(pingChannels))))
+        if row['badBytes'] > 0:
+            notes.append("%d bytes corrupt or truncated" % (row['badBytes']))
+    except Exception as e:
+        notes.append("unreadable: %s" % (e))
+    row['notes'] = "; ".join(notes)
+    return row
+
+def surveyFiles(fileNames, sample=SAMPLE, workers=None):
+    """survey a list of files in a pool of worker processes.  Returns the rows in the order of the files"""
+    if workers is not None and workers <= 1:
+        return [surveyFile(fileName, sample) for fileName in fileNames]
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(surveyFile, fileNames, [sample] * len(fileNames)))
+
+def formatTime(seconds):
+    if seconds is None:
+        return ''
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(seconds))
+
+def formatRow(row):
+    """the text of each column of a row"""
+    decimals = 6 if row['navUnits'] == 'geographic' else 1
+    text = {}
+    for column in COLUMNS:
+        value = row[column]
+        if column == 'file':
+            text[column] = os.path.basename(value)
+        elif column in ('start', 'end'):
+            text[column] = formatTime(value)
+        elif column in ('minX', 'minY', 'maxX', 'maxY'):
+            text[column] = '' if value is None else "%.*f" % (decimals, value)
+        elif column in ('minutes', 'MB'):
+            text[column] = "%.1f" % (value)
+        else:
+            text[column] = str(value)
+    return text
+
+def printTable(rows, output=sys.stdout):
+    """print the rows as a table with a column per field, and a total for the files"""
+    texts = [formatRow(row) for row in rows]
+    widths = [max([len(column)] + [len(text[column]) for text in texts]) for column in COLUMNS]
+    output.write("  ".join(column.ljust(width) for column, width in zip(COLUMNS, widths)).rstrip() + "\n")
+    output.write("  ".join('-' * width for width in widths) + "\n")
+    for text in texts:
+        output.write("  ".join(text[column].ljust(width) for column, width in zip(COLUMNS, widths)).rstrip() + "\n")
+
+    starts = [row['start'] for row in rows if row['start'] is not None]
+    ends = [row['end'] for row in rows if row['end'] is not None]
+    problems = len([row for row in rows if row['notes'] != ''])
+    output.write("\n%d files, %d pings, %.1f MB, %.1f minutes of data" % (len(rows), sum(row['pings'] for row in rows), sum(row['MB'] for row in rows), sum(row['minutes'] for row in rows)))
+    if len(starts) > 0:
+        output.write(" from %s to %s" % (formatTime(min(starts)), formatTime(max(ends))))
+    output.write(", %d files with problems\n" % (problems))
+
+def saveCSV(rows, fileName):
+    """save the rows to a csv file, with times as text"""
+    with open(fileName, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for row in rows:
+            writer.writerow([formatTime(row[column]) if column in ('start', 'end') else row[column] for column in COLUMNS])
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='SonarCoverage.py survey', description='Survey the XTF file headers and pings of a set of files before a batch run, and print a summary table.')
+    parser.add_argument('-i', dest='inputFile', action='store', help='-i <filename> input sonar XTF filename, or a wildcard such as "*.xtf"')
+    parser.add_argument('-sample', dest='sample', action='store', type=int, default=SAMPLE, help='-sample <pings> decode every this many pings for the time span and extents, as well as the first and last.  Use 1 for exact extents [default = 100]')
+    parser.add_argument('-workers', dest='workers', action='store', type=int, help='-workers <count> survey the files in this many worker processes [default = the number of processors]')
+    parser.add_argument('-csv', dest='csvFile', action='store', help='-csv <filename> also save the table to a csv file')
+
+    if len(argv) == 0:
+        parser.print_help()
+        sys.exit(1)
+
+    args = parser.parse_args(argv)
+    if args.inputFile is None:
+        print ("Please select the XTF files to survey with '-i'")
+        exit (0)
+
+    fileNames = glob(args.inputFile)
+    if len(fileNames) == 0:
+        print ("No XTF files found: %s" % (args.inputFile))
+        exit (0)
+
+    start_time = time.time()
+    rows = surveyFiles(fileNames, args.sample, args.workers)
+    printTable(rows)
+    if args.csvFile is not None:
+        saveCSV(rows, args.csvFile)
+        print ("Saved survey to: %s" % (args.csvFile))
+    print("--- %s seconds ---" % (time.time() - start_time)) # print the processing time.
@@ -0,0 +1,43 @@
+#name:          test_crs
+#created:       October 2026
+#description:   converting a geographic file into a projection gives the same polygons as computing them on the ellipsoid
+
+import math
+import os
+
+import benchmark
+import crs
+import gapmodel
+import SonarCoverage
+
+def outlines(fileName, outputCRS):
+    """the nadir and coverage outlines of a file, with its positions converted to outputCRS"""
+    track = SonarCoverage.readTrack(fileName, outputCRS=outputCRS)
+    stages = [SonarCoverage.NavigationQCStage(), SonarCoverage.HeadingStage(), SonarCoverage.CourseMadeGoodStage(), SonarCoverage.NadirStage(gapmodel.createGapModel()), SonarCoverage.CoverageStage()]
+    results = [stage.compute(track, fileName) for stage in stages]
+    return [outline for result in results[-2:] for outline in result]
+
+def largestDistance(fileName):
+    """the largest distance in metres between the vertices of the geographic outlines projected into UTM zone 55 south, and the outlines computed in the projection"""
+    utm = crs.fromEPSG(32755)
+    geographic = outlines(fileName, crs.WGS84)
+    projected = outlines(fileName, utm)
+    assert len(geographic) == len(projected)
+    largest = 0.0
+    for outline, other in zip(geographic, projected):
+        xs, ys = crs.transform(crs.WGS84, utm, [pt[0] for pt in outline], [pt[1] for pt in outline])
+        assert len(xs) == len(other)
+        for x, y, pt in zip(xs, ys, other):
+            largest = max(largest, math.hypot(pt[0] - x, pt[1] - y))
+    return largest
+
+def testProjectedGeometryNearZoneEdge(tmp_path):
+    # 2.8 degrees east of the central meridian of zone 55, where the grid convergence is nearly 2 degrees
+    fileName = os.path.join(str(tmp_path), "edge.xtf")
+    benchmark.writeSyntheticXTF(fileName, pings=2000, samples=10, origin=(149.8, -43.0))
+    assert largestDistance(fileName) < 0.1
+
+def testProjectedGeometryWithAttitudeHeadings(tmp_path):
+    fileName = os.path.join(str(tmp_path), "attitude.xtf")
+    benchmark.writeSyntheticXTF(fileName, pings=2000, samples=10, attitudePerPing=2, origin=(149.8, -43.0))
+    assert largestDistance(fileName) < 0.1
@@ -0,0 +1,48 @@
+#name:          test_dissolve
+#created:       October 2026
+#description:   the union of polygons which are nested, share edges or are the same
+
+import shapefile
+
+import dissolve
+
+def square(x, y, size):
+    return [[x, y], [x + size, y], [x + size, y + size], [x, y + size], [x, y]]
+
+def area(rings):
+    """outer rings are clockwise, so their signed area is negative"""
+    return -sum(shapefile.signed_area(ring + [ring[0]]) for ring in rings)
+
+def testNestedSharingCorner():
+    rings = dissolve.dissolvePolygons([square(0, 0, 10), square(0, 0, 5)])
+    assert len(rings) == 1
+    assert abs(area(rings) - 100.0) < 1e-6
+
+def testNestedSharingCornerSmallerFirst():
+    rings = dissolve.dissolvePolygons([square(0, 0, 5), square(0, 0, 10)])
+    assert len(rings) == 1
+    assert abs(area(rings) - 100.0) < 1e-6
+
+def testSharedEdge():
+    rings = dissolve.dissolvePolygons([square(0, 0, 10), square(10, 0, 10)])
+    assert len(rings) == 1
+    assert abs(area(rings) - 200.0) < 1e-6
+
+def testSharedEdgeOfDifferentSizes():
+    rings = dissolve.dissolvePolygons([square(0, 0, 10), square(10, 0, 5)])
+    assert len(rings) == 1
+    assert abs(area(rings) - 125.0) < 1e-6
+
+def testCoincident():
+    rings = dissolve.dissolvePolygons([square(0, 0, 10), square(0, 0, 10), square(0, 0, 10)])
+    assert len(rings) == 1
+    assert abs(area(rings) - 100.0) < 1e-6
+
+def testTiles():
+    rings = dissolve.dissolvePolygons([square(x * 10, y * 10, 10) for x in range(3) for y in range(3)])
+    assert len(rings) == 1
+    assert abs(area(rings) - 900.0) < 1e-6
+
+def testApart():
+    rings = dissolve.dissolvePolygons([square(0, 0, 10), square(20, 0, 10)])
+    assert len(rings) == 2
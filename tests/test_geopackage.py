@@ -0,0 +1,31 @@
+#name:          test_geopackage
+#created:       October 2026
+#description:   the grouping of the rings of a multipart polygon into outer rings and their holes
+
+import geopackage
+
+def square(x, y, size, clockwise=True):
+    ring = [(x, y), (x, y + size), (x + size, y + size), (x + size, y), (x, y)]
+    return ring if clockwise else ring[::-1]
+
+def testHoleInIsland():
+    outer = square(0, 0, 100)
+    hole = square(10, 10, 80, clockwise=False)
+    island = square(20, 20, 60)
+    islandHole = square(30, 30, 40, clockwise=False)
+    polygons = geopackage.groupRings([outer, hole, island, islandHole])
+    assert polygons == [[outer, hole], [island, islandHole]]
+
+def testHolesInOrderOfOuterRings():
+    island = square(20, 20, 60)
+    islandHole = square(30, 30, 40, clockwise=False)
+    outer = square(0, 0, 100)
+    hole = square(10, 10, 80, clockwise=False)
+    polygons = geopackage.groupRings([island, islandHole, outer, hole])
+    assert polygons == [[island, islandHole], [outer, hole]]
+
+def testHoleOutsideEveryOuterRing():
+    outer = square(0, 0, 10)
+    apart = square(20, 0, 10, clockwise=False)
+    polygons = geopackage.groupRings([outer, apart])
+    assert polygons == [[outer], [apart]]
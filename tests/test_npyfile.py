@@ -0,0 +1,42 @@
+#name:          test_npyfile
+#created:       October 2026
+#description:   .npy files written by writeNPY read back the same, with readNPY and with numpy when it is installed
+
+import array
+
+import pytest
+
+import npyfile
+
+COLUMNS = [array.array('d', [0.0, -1.5, 1e300]), array.array('f', [0.25, 3.0]), array.array('l', [1, -2, 3]), array.array('H', [0, 65535]), array.array('B')]
+
+def testRoundTrip(tmp_path):
+    for i, values in enumerate(COLUMNS):
+        fileName = str(tmp_path / ("column%d.npy" % (i)))
+        npyfile.writeNPY(fileName, values)
+        result = npyfile.readNPY(fileName)
+        assert npyfile.descr(result) == npyfile.descr(values)
+        assert list(result) == list(values)
+
+def testDataIsAligned(tmp_path):
+    fileName = str(tmp_path / "column.npy")
+    npyfile.writeNPY(fileName, COLUMNS[0])
+    with open(fileName, 'rb') as f:
+        data = f.read()
+    assert (len(data) - (COLUMNS[0].itemsize * len(COLUMNS[0]))) % npyfile.ALIGNMENT == 0
+
+def testNotNPY(tmp_path):
+    fileName = str(tmp_path / "column.npy")
+    with open(fileName, 'wb') as f:
+        f.write(b'not a numpy file')
+    with pytest.raises(ValueError):
+        npyfile.readNPY(fileName)
+
+def testNumpyLoad(tmp_path):
+    numpy = pytest.importorskip('numpy')
+    for i, values in enumerate(COLUMNS):
+        fileName = str(tmp_path / ("column%d.npy" % (i)))
+        npyfile.writeNPY(fileName, values)
+        loaded = numpy.load(fileName, mmap_mode='r')
+        assert loaded.dtype == numpy.dtype(npyfile.descr(values))
+        assert loaded.tolist() == list(values)
@@ -0,0 +1,94 @@
+#name:          xtfcache
+#created:       October 2026
+#description:   on-disk cache of per-file results computed from an XTF file, so unchanged files do not need to be recomputed
+#notes:         the cache key is the file size, modification time, a fast content hash of the start and end of the file, and the processing parameters
+#               the cache is evicted on a least recently used basis once it exceeds the maximum size
+#               entries may be loaded, saved and evicted by several threads or processes at once, so an entry which disappears part way through is treated as a miss
+
+#DONE
+#initial implementation
+
+import hashlib
+import os
+import pickle
+import threading
+
+CACHEVERSION = 5 # increment this if the structure of the cached results changes, so old entries are ignored
+HASHBLOCKSIZE = 65536 # number of bytes at the start and end of the file used for the fast content hash
+
+class XTFCache:
+    def __init__(self, folder, maxSizeMB=1024):
+        self.folder = folder
+        self.maxSize = maxSizeMB * 1024 * 1024
+        if not os.path.isdir(self.folder):
+            os.makedirs(self.folder)
+
+    def key(self, fileName, params):
+        """compute the cache key for a file and set of processing parameters"""
+        st = os.stat(fileName)
+        h = hashlib.sha1()
+        h.update(("%d|%d|%d|%s" % (CACHEVERSION, st.st_size, st.st_mtime_ns, sorted(params.items()))).encode('utf-8'))
+        with open(fileName, 'rb') as f:
+            h.update(f.read(HASHBLOCKSIZE))
+            if st.st_size > HASHBLOCKSIZE:
+                f.seek(max(HASHBLOCKSIZE, st.st_size - HASHBLOCKSIZE))
+                h.update(f.read(HASHBLOCKSIZE))
+        return h.hexdigest()
+
+    def entryName(self, key):
+        return os.path.join(self.folder, key + ".pkl")
+
+    def load(self, fileName, params):
+        """return the cached results for the file, or None if the file has not been cached with these parameters"""
+        entry = self.entryName(self.key(fileName, params))
+        if not os.path.isfile(entry):
+            return None
+        try:
+            with open(entry, 'rb') as f:
+                result = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        # touch the entry so it is the most recently used.  Another thread may have evicted it since it was read
+        try:
+            os.utime(entry, None)
+        except FileNotFoundError:
+            pass
+        return result
+
+    def save(self, fileName, params, result):
+        """store the results for the file, then evict old entries if the cache is too large"""
+        entry = self.entryName(self.key(fileName, params))
+        # each writer has its own temporary file, so two threads saving the same entry do not collide
+        tmp = "%s.%d.%d.tmp" % (entry, os.getpid(), threading.get_ident())
+        with open(tmp, 'wb') as f:
+            pickle.dump(result, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, entry)
+        self.evict()
+
+    def evict(self):
+        """remove the least recently used entries until the cache is below the maximum size"""
+        entries = []
+        totalSize = 0
+        for name in os.listdir(self.folder):
+            if not name.endswith(".pkl"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.folder, name))
+            except FileNotFoundError:
+                # evicted by another thread since the folder was listed
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+            totalSize += st.st_size
+        entries.sort()
+        # always keep the most recent entry, even if it is larger than the cache
+        for mtime, size, name in entries[:-1]:
+            if totalSize <= self.maxSize:
+                break
+            try:
+                os.remove(os.path.join(self.folder, name))
+            except FileNotFoundError:
+                pass
+            totalSize -= size
+
+    def __str__(self):
+        return "XTFCache: %s (max %d bytes)" % (self.folder, self.maxSize)